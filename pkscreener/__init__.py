@@ -33,4 +33,5 @@ Imports = {
     "keras": find_spec("keras") is not None,
     "yfinance": find_spec("yfinance") is not None,
     "vectorbt": find_spec("vectorbt") is not None,
+    "numba": find_spec("numba") is not None,
 }
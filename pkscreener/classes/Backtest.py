@@ -27,11 +27,12 @@ import warnings
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
 import pandas as pd
-from PKDevTools.classes.ColorText import colorText
 from PKDevTools.classes.PKDateUtilities import PKDateUtilities
 from PKDevTools.classes.log import default_logger
 from pkscreener.classes import Utility
 from pkscreener.classes.ConfigManager import parser, tools
+from pkscreener.classes.PKForwardReturns import PKForwardReturns
+from pkscreener.classes.PKScanRecord import PKScanRecord
 
 configManager = tools()
 configManager.getConfig(parser)
@@ -53,8 +54,6 @@ def backtest(
     if screenedDict is None or len(screenedDict) == 0:
         default_logger().debug(f"{(stock)}No backtesting strategy or screened dictionary received!")
         return
-    calcPeriods = configManager.periodsRange
-    allStockBacktestData = []
     # Take the data based on which the result set for a strategy may have been arrived at
     # The results must have been arrived at with data based on configManager.backtestPeriod -sampleDays
     # but we also need the periods days to be able to calculate the next few days' returns
@@ -64,99 +63,37 @@ def backtest(
     # s1    d3  ^
     #   ....    |
     # s1    dn  |----------------We need to make calculations upto 30 day period from d2
-    previous_recent = data.head(
-        1
-    )  # This is the row which has the date for which the recommendation is valid
-    if len(previous_recent) <= 0:
+    # The returns for all the periods are calculated together by the accumulator
+    # when the results are needed. Callers collecting many results should pass
+    # the same PKForwardReturns instance for each of them.
+    forwardReturns = (
+        backTestedData
+        if isinstance(backTestedData, PKForwardReturns)
+        else PKForwardReturns(configManager.periodsRange)
+    )
+    # data is either the stock's data or the PKScanRecord of a worker's result.
+    # The first close is the one on the date for which the recommendation is valid.
+    closes = PKScanRecord.closesOf(data, forwardReturns.window)
+    if len(closes) <= 0:
         return backTestedData
-    data = data.head(max(calcPeriods) + 1)
-    # Let's check the returns for the given strategy over a period ranging from 1 period to 30 periods.
-    # columns=['Stock', 'Date', 'Volume', 'Trend', 'MA-Signal', 'LTP', '52Wk-H',
-    #          '52Wk-L', '1-Pd', '2-Pd', '3-Pd', '4-Pd', '5-Pd', '10-Pd', '15-Pd',
-    #          '22-Pd', '30-Pd', 'Consol.', 'Breakout', 'RSI', 'Pattern', 'CCI',
-    #          'LTP1', 'Growth1', 'LTP2', 'Growth2', 'LTP3', 'Growth3', 'LTP4',
-    #          'Growth4', 'LTP5', 'Growth5', 'LTP10', 'Growth10', 'LTP15', 'Growth15',
-    #          'LTP22', 'Growth22', 'LTP30', 'Growth30']
-    
-    # incoming = list(saveDict.keys())
-    # for prd in calcPeriods:
-    #     colNames = [f"LTP{prd}",f"Growth{prd}",f"{prd}-Pd"]
-    #     if colNames[0] not in incoming:
-    #         for col in colNames:
-    #             columns.remove(col)
-    # if backTestedData is None:
-    #     backTestedData = pd.DataFrame(columns=columns)
-    # df = pd.DataFrame([screenedDict],columns=columns)
-    # df[f"LTP{prd}"] = saveDict[f"LTP{prd}"]
-    # df[f"Growth{prd}"] = saveDict[f"Growth{prd}"]
-    columns=[
-                "Stock",
-                "Date",
-                "Volume",
-                "Trend",
-                "MA-Signal",
-                "LTP",
-                "52Wk-H",
-                "52Wk-L"
-            ]
     backTestedStock = {
-        "Stock": "",
-        "Date": "",
-        "Volume": "",
-        "Trend": "",
-        "MA-Signal": "",
-        "LTP": "",
-        "52Wk-H": "",
-        "52Wk-L": ""
+        "Stock": stock,
+        "Date": saveDict["Date"],
     }
-    for prd in calcPeriods:
-        columns.append(f"{prd}-Pd")
-        backTestedStock[f"{prd}-Pd"] = ""
+    for col in ["Volume", "Trend", "MA-Signal", "LTP", "52Wk-H", "52Wk-L"] + PKForwardReturns.TRAILING_COLUMNS:
+        backTestedStock[col] = screenedDict[col]
+    # Let's capture the portfolio data, if available
+    for prd in forwardReturns.periods:
+        backTestedStock[f"LTP{prd}"] = saveDict.get(f"LTP{prd}", "")
+        backTestedStock[f"Growth{prd}"] = saveDict.get(f"Growth{prd}", "")
+    forwardReturns.add(backTestedStock, closes)
+    if forwardReturns is backTestedData:
+        return backTestedData
+    # sellSignal only changes how the returns are colored, which happens when
+    # the results are shown. See PKForwardReturns.formatted.
+    df = forwardReturns.toDataFrame()
     if backTestedData is None:
-        backTestedData = pd.DataFrame(columns=columns)
-    backTestedStock["Stock"] = stock
-    backTestedStock["Date"] = saveDict["Date"]
-    backTestedStock["Consol."] = screenedDict["Consol."]
-    backTestedStock["Breakout"] = screenedDict["Breakout"]
-    backTestedStock["MA-Signal"] = screenedDict["MA-Signal"]
-    backTestedStock["Volume"] = screenedDict["Volume"]
-    backTestedStock["LTP"] = screenedDict["LTP"]
-    backTestedStock["52Wk-H"] = screenedDict["52Wk-H"]
-    backTestedStock["52Wk-L"] = screenedDict["52Wk-L"]
-    backTestedStock["RSI"] = screenedDict["RSI"]
-    backTestedStock["Trend"] = screenedDict["Trend"]
-    backTestedStock["Pattern"] = screenedDict["Pattern"]
-    backTestedStock["CCI"] = screenedDict["CCI"]
-    for prd in calcPeriods:
-        try:
-            backTestedStock[f"{abs(prd)}-Pd"] = ""
-            backTestedStock[f"LTP{prd}"] = ""
-            backTestedStock[f"Growth{prd}"] = ""
-            rolling_pct = data["Close"].pct_change(periods=prd) * 100
-            pct_change = rolling_pct.iloc[prd]
-            if not sellSignal:
-                colored_pct = colorText.GREEN if pct_change >= 0 else colorText.FAIL
-            else:
-                colored_pct = colorText.FAIL if pct_change >= 0 else colorText.GREEN
-            backTestedStock[f"{abs(prd)}-Pd"] = (
-                colored_pct + "%.2f%%" % pct_change + colorText.END
-            )
-        except Exception:# pragma: no cover
-            pass
-        # Let's capture the portfolio data, if available
-        try:
-            backTestedStock[f"LTP{prd}"] = saveDict[f"LTP{prd}"]
-            backTestedStock[f"Growth{prd}"] = saveDict[f"Growth{prd}"]
-        except Exception:# pragma: no cover
-            pass
-        # else:
-        #     del backTestedStock[f"{abs(prd)}-Pd"]
-        #     try:
-        #         backTestedData = backTestedData.drop(f"{abs(prd)}-Pd", axis=1)
-        #     except Exception:
-        #         continue
-    allStockBacktestData.append(backTestedStock)
-    df = pd.DataFrame(allStockBacktestData)  # , columns=backTestedData.columns)
+        return df
     try:
         backTestedData = pd.concat([backTestedData, df])
     except Exception:# pragma: no cover
@@ -164,85 +101,71 @@ def backtest(
     return backTestedData
 
 
-def backtestSummary(df):
-    summary = {}
-    overall = {}
-    summaryList = []
-    net_positives = 0
-    net_negatives = 0
-    if df is None:
+def backtestSummary(df, sellSignal=False):
+    stats = backtestStatistics(df, sellSignal)
+    if stats is None:
         return
-    df.drop_duplicates(inplace=True)
-    df_grouped = df.groupby("Stock")
-    for col in df.keys():
-        if str(col).endswith("-Pd"):
-            overall[col] = [0, 0]
-    # iterate over each group of stock rows
-    for stock_name, df_group in df_grouped:
-        # for row_index, row in df_group.iterrows():
-        group_positives = 0
-        group_negatives = 0
-        summary["Stock"] = stock_name
-        for col in df_group.keys():
-            if str(col).endswith("-Pd"):
-                col_positives = (
-                    df_group[col]
-                    .astype(str)
-                    .str.count(colorText.GREEN.replace("[", "\["))
-                    .sum()
-                )
-                col_negatives = (
-                    df_group[col]
-                    .astype(str)
-                    .str.count(colorText.FAIL.replace("[", "\["))
-                    .sum()
-                )
-                group_positives += col_positives
-                group_negatives += col_negatives
-                overall[col] = [
-                    overall[col][0] + col_positives,
-                    overall[col][1] + col_negatives,
-                ]
-                overAllPeriodPrediction = (
-                    col_positives * 100 / (col_positives + col_negatives)
-                )
-                if col_positives + col_negatives == 0:
-                    summary[col] = "-"
-                else:
-                    summary[
-                        col
-                    ] = f"{Utility.tools.formattedBacktestOutput(overAllPeriodPrediction)} of ({col_positives+col_negatives})"
-        overAllRowPrediction = (
-            group_positives * 100 / (group_positives + group_negatives)
+    periodColumns = [col for col in df.columns if str(col).endswith("-Pd")]
+    # Render the win rates as "xx.xx% of (count)", same as the report always had
+    cells = [
+        f"{Utility.tools.formattedBacktestOutput(winRate)} of ({count})"
+        for winRate, count in zip(stats["WinRate"], stats["Count"])
+    ]
+    summary_df = (
+        pd.Series(cells, index=stats.index, dtype=object)
+        .unstack("Period")
+        .reindex(
+            index=sorted(df["Stock"].drop_duplicates()) + ["SUMMARY"],
+            columns=periodColumns + ["Overall"],
         )
-        if group_positives + group_negatives == 0:
-            summary["Overall"] = "-"
-        else:
-            summary[
-                "Overall"
-            ] = f"{Utility.tools.formattedBacktestOutput(overAllRowPrediction)} of ({group_positives+group_negatives})"
-        summaryList.append(summary)
-        summary = {}
-        net_positives += group_positives
-        net_negatives += group_negatives
+        .fillna("-")
+    )
+    summary_df.index.name = "Stock"
+    summary_df.columns.name = None
+    return summary_df.reset_index()
+
+
+# Numeric statistics of the -Pd returns for each stock and period. The
+# "SUMMARY" stock and the "Overall" period aggregate over all the stocks and
+# all the periods respectively. A return is a win when it is in the direction
+# of the strategy: a rise, or a fall for sell signals. MaxDrawdown is the
+# worst return against the strategy (0 if there was none).
+def backtestStatistics(df, sellSignal=False):
+    if df is None:
+        return
+    df = df.drop_duplicates()
+    periodColumns = [col for col in df.columns if str(col).endswith("-Pd")]
+    returns = df[periodColumns].apply(numericReturns)
+    if sellSignal:
+        returns = -returns
+    returns.insert(0, "Stock", df["Stock"].values)
+    returns = returns.melt(id_vars="Stock", var_name="Period", value_name="Return")
+    returns = returns.dropna(subset=["Return"])
+    returns["Win"] = returns["Return"] >= 0
+    returns["Drawdown"] = returns["Return"].clip(upper=0)
+    returns = pd.concat(
+        [
+            returns,
+            returns.assign(Period="Overall"),
+            returns.assign(Stock="SUMMARY"),
+            returns.assign(Stock="SUMMARY", Period="Overall"),
+        ]
+    )
+    stats = returns.groupby(["Stock", "Period"], sort=False).agg(
+        Count=("Return", "count"),
+        Wins=("Win", "sum"),
+        Mean=("Return", "mean"),
+        Median=("Return", "median"),
+        MaxDrawdown=("Drawdown", "min"),
+    )
+    stats.insert(2, "WinRate", stats["Wins"] * 100 / stats["Count"])
+    return stats
+
 
-    # Now prepare overall summary
-    summary["Stock"] = "SUMMARY"
-    for col in overall.keys():
-        col_positives = overall[col][0]
-        col_negatives = overall[col][1]
-        if col_positives + col_negatives == 0:
-            summary[col] = "-"
-        else:
-            summary[
-                col
-            ] = f"{Utility.tools.formattedBacktestOutput((col_positives*100/(col_positives+col_negatives)))} of ({col_positives+col_negatives})"
-    if net_positives + net_negatives == 0:
-        summary["Overall"] = "-"
-    else:
-        summary[
-            "Overall"
-        ] = f"{Utility.tools.formattedBacktestOutput(net_positives*100/(net_positives+net_negatives))} of ({net_positives+net_negatives})"
-    summaryList.append(summary)
-    summary_df = pd.DataFrame(summaryList, columns=summary.keys())
-    return summary_df
+# The -Pd columns are numeric, but older results may still have them as
+# (colored) "1.23%" strings.
+def numericReturns(values):
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    values = values.apply(Utility.tools.removeAllColorStyles).str.replace("%", "", regex=False)
+    return pd.to_numeric(values, errors="coerce")
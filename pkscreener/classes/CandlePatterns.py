@@ -23,9 +23,13 @@
 
 """
 
+import numpy as np
+import pandas as pd
 from PKDevTools.classes.ColorText import colorText
+from PKDevTools.classes.log import default_logger
 
 from pkscreener.classes.Pktalib import pktalib
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
 # from PKDevTools.classes.log import measure_time
 
 class CandlePatterns:
@@ -52,8 +56,50 @@ class CandlePatterns:
         "Gravestone Doji",
     ]
 
+    # Number of latest candles the patterns are evaluated on
+    CANDLES = 4
+    OHLC = ["Open", "High", "Low", "Close"]
+    # Arranged with max priority from top to bottom:
+    # (pktalib function, (name, color, saved name) if bullish,
+    # (name, color, saved name) if bearish or None if it's the same either way)
+    PATTERNS = [
+        ("CDLDOJI", ("Doji", "", "Doji"), None),
+        ("CDLMORNINGSTAR", ("Morning Star", colorText.GREEN, "Morning Star"), None),
+        ("CDLMORNINGDOJISTAR", ("Morning Doji Star", colorText.GREEN, "Morning Doji Star"), None),
+        ("CDLEVENINGSTAR", ("Evening Star", colorText.FAIL, "Evening Star"), None),
+        ("CDLEVENINGDOJISTAR", ("Evening Doji Star", colorText.FAIL, "Evening Doji Star"), None),
+        ("CDLLADDERBOTTOM", ("Bullish Ladder Bottom", colorText.GREEN, "Bullish Ladder Bottom"),
+            ("Bearish Ladder Bottom", colorText.FAIL, "Bearish Ladder Bottom")),
+        ("CDL3LINESTRIKE", ("3 Line Strike", colorText.GREEN, "3 Line Strike"),
+            ("3 Line Strike", colorText.FAIL, "3 Line Strike")),
+        ("CDL3BLACKCROWS", ("3 Black Crows", colorText.FAIL, "3 Black Crows"), None),
+        ("CDL3INSIDE", ("3 Inside Up", colorText.GREEN, "3 Outside Up"),
+            ("3 Inside Down", colorText.FAIL, "3 Inside Down")),
+        ("CDL3OUTSIDE", ("3 Outside Up", colorText.GREEN, "3 Outside Up"),
+            ("3 Outside Down", colorText.FAIL, "3 Outside Down")),
+        ("CDL3WHITESOLDIERS", ("3 White Soldiers", colorText.GREEN, "3 White Soldiers"), None),
+        ("CDLHARAMI", ("Bullish Harami", colorText.GREEN, "Bullish Harami"),
+            ("Bearish Harami", colorText.FAIL, "Bearish Harami")),
+        ("CDLHARAMICROSS", ("Bullish Harami Cross", colorText.GREEN, "Bullish Harami Cross"),
+            ("Bearish Harami Cross", colorText.FAIL, "Bearish Harami Cross")),
+        ("CDLMARUBOZU", ("Bullish Marubozu", colorText.GREEN, "Bullish Marubozu"),
+            ("Bearish Marubozu", colorText.FAIL, "Bearish Marubozu")),
+        ("CDLHANGINGMAN", ("Hanging Man", colorText.FAIL, "Hanging Man"), None),
+        ("CDLHAMMER", ("Hammer", colorText.GREEN, "Hammer"), None),
+        ("CDLINVERTEDHAMMER", ("Inverted Hammer", colorText.GREEN, "Inverted Hammer"), None),
+        ("CDLSHOOTINGSTAR", ("Shooting Star", colorText.FAIL, "Shooting Star"), None),
+        ("CDLDRAGONFLYDOJI", ("Dragonfly Doji", colorText.GREEN, "Dragonfly Doji"), None),
+        ("CDLGRAVESTONEDOJI", ("Gravestone Doji", colorText.FAIL, "Gravestone Doji"), None),
+        ("CDLENGULFING", ("Bullish Engulfing", colorText.GREEN, "Bullish Engulfing"),
+            ("Bearish Engulfing", colorText.FAIL, "Bearish Engulfing")),
+    ]
+
     def __init__(self):
-        pass
+        # Set by precomputePatterns()
+        self._patternRows = None
+        self._candles = None
+        self._patternHits = None
+        self._bullishPatterns = None
 
     def findCurrentSavedValue(self, screenDict, saveDict, key):
         existingScreen = screenDict.get(key)
@@ -65,283 +111,112 @@ class CandlePatterns:
     #@measure_time
     # Find candle-stick patterns
     # Arrange if statements with max priority from top to bottom
-    def findPattern(self, data, dict, saveDict):
-        data = data.head(4)
-        data = data[::-1]
-        hasCandleStickPattern = False
+    def findPattern(self, data, dict, saveDict, stock=None):
         if "Pattern" not in saveDict.keys():
             saveDict["Pattern"] = ""
             dict["Pattern"] = ""
-        # Only 'doji' and 'inside' is internally implemented by pandas_ta.
-        # Otherwise, for the rest of the candle patterns, they also need
-        # TA-Lib.
-        check = pktalib.CDLDOJI(data["Open"], data["High"], data["Low"], data["Close"])
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + colorText.BOLD + f"Doji" + colorText.END 
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Doji"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLMORNINGSTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.GREEN + f"Morning Star" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Morning Star"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLMORNINGDOJISTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.GREEN + f"Morning Doji Star" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Morning Doji Star"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLEVENINGSTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.FAIL + f"Evening Star" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Evening Star"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLEVENINGDOJISTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.FAIL + f"Evening Doji Star" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Evening Doji Star"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLLADDERBOTTOM(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.GREEN + f"Bullish Ladder Bottom" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bullish Ladder Bottom"
-            else:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.FAIL + f"Bearish Ladder Bottom" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bearish Ladder Bottom"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDL3LINESTRIKE(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.GREEN + f"3 Line Strike" + colorText.END 
-                )
-            else:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.FAIL + f"3 Line Strike" + colorText.END 
-                )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"3 Line Strike"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDL3BLACKCROWS(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.FAIL + f"3 Black Crows" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"3 Black Crows"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDL3INSIDE(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.GREEN + f"3 Inside Up" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"3 Outside Up"
-            else:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.FAIL + f"3 Inside Down" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"3 Inside Down"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDL3OUTSIDE(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.GREEN + f"3 Outside Up" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"3 Outside Up"
-            else:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.FAIL + f"3 Outside Down" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"3 Outside Down"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDL3WHITESOLDIERS(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.GREEN + f"3 White Soldiers" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"3 White Soldiers"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLHARAMI(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.GREEN + f"Bullish Harami" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bullish Harami"
-            else:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD + colorText.FAIL + f"Bearish Harami" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bearish Harami"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLHARAMICROSS(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD
-                    + colorText.GREEN
-                    + f"Bullish Harami Cross" 
-                    + colorText.END
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bullish Harami Cross"
-            else:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD
-                    + colorText.FAIL
-                    + f"Bearish Harami Cross" 
-                    + colorText.END
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bearish Harami Cross"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLMARUBOZU(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD
-                    + colorText.GREEN
-                    + f"Bullish Marubozu" 
-                    + colorText.END
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bullish Marubozu"
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.FAIL + f"Bearish Marubozu" + colorText.END 
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bearish Marubozu"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLHANGINGMAN(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.FAIL + f"Hanging Man" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Hanging Man"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLHAMMER(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.GREEN + f"Hammer" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Hammer"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLINVERTEDHAMMER(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.GREEN + f"Inverted Hammer" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Inverted Hammer"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLSHOOTINGSTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.FAIL + f"Shooting Star" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Shooting Star"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLDRAGONFLYDOJI(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.GREEN + f"Dragonfly Doji" + colorText.END 
-            )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Dragonfly Doji"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLGRAVESTONEDOJI(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
+        signs = self.precomputedPatternsFor(stock, data)
+        if signs is None:
+            data = data.head(CandlePatterns.CANDLES)
+            data = data[::-1]
+            signs = []
+            # Only 'doji' and 'inside' is internally implemented by pandas_ta.
+            # Otherwise, for the rest of the candle patterns, they also need
+            # TA-Lib.
+            for function, _, _ in CandlePatterns.PATTERNS:
+                check = getattr(pktalib, function)(
+                    data["Open"], data["High"], data["Low"], data["Close"]
+                )
+                signs.append(0 if check is None else check.tail(1).item())
+        hasCandleStickPattern = False
+        for sign, (_, bullish, bearish) in zip(signs, CandlePatterns.PATTERNS):
+            if sign == 0:
+                continue
+            name, color, savedName = bullish if (sign > 0 or bearish is None) else bearish
             dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                colorText.BOLD + colorText.FAIL + f"Gravestone Doji" + colorText.END 
+                colorText.BOLD + color + name + colorText.END 
             )
-            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Gravestone Doji"
-            hasCandleStickPattern = True
-
-        check = pktalib.CDLENGULFING(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD
-                    + colorText.GREEN
-                    + f"Bullish Engulfing" 
-                    + colorText.END
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bullish Engulfing"
+            saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] + savedName
+            hasCandleStickPattern = True
+        return hasCandleStickPattern
+
+    # Evaluates all patterns for the latest candles of every stock in one go.
+    # The candles of all stocks are laid end to end in one series per OHLC
+    # column, so each pktalib function is called once for the whole universe.
+    # The value at the last candle of a stock only depends on the candles of
+    # that stock as long as the lookback of the function is shorter than
+    # CANDLES. Functions with a longer lookback can never find anything in
+    # CANDLES candles anyway, so those are not evaluated at all.
+    # The results are kept as bitmasks per stock: one bit per pattern for a
+    # hit and one for a bullish hit.
+    def precomputePatterns(self, stockDict):
+        self._patternRows = None
+        try:
+            symbols, candles = CandlePatterns._latestCandles(stockDict)
+            if len(symbols) == 0:
+                return False
+            hits = np.zeros(len(symbols), dtype=np.uint32)
+            bullish = np.zeros(len(symbols), dtype=np.uint32)
+            ohlc = [pd.Series(candles[:, :, i].ravel()) for i in range(len(CandlePatterns.OHLC))]
+            for bit, (function, _, _) in enumerate(CandlePatterns.PATTERNS):
+                if pktalib.lookback(function) >= CandlePatterns.CANDLES:
+                    continue
+                check = getattr(pktalib, function)(*ohlc)
+                if check is None:
+                    continue
+                latest = np.asarray(check, dtype=np.float64).reshape(-1, CandlePatterns.CANDLES)[:, -1]
+                hits |= (latest != 0).astype(np.uint32) << np.uint32(bit)
+                bullish |= (latest > 0).astype(np.uint32) << np.uint32(bit)
+        except Exception as e:
+            default_logger().debug(e, exc_info=True)
+            return False
+        self._candles = candles
+        self._patternHits = hits
+        self._bullishPatterns = bullish
+        self._patternRows = {symbol: i for i, symbol in enumerate(symbols)}
+        return True
+
+    # Returns the (chronological) OHLC values of the latest CANDLES candles
+    # as a (symbols x CANDLES x OHLC) matrix
+    def _latestCandles(stockDict):
+        symbols = []
+        candles = []
+        isStore = isinstance(stockDict, PKStockDataStore)
+        for symbol in list(stockDict.keys()):
+            stored = stockDict.columnValues(symbol, CandlePatterns.OHLC) if isStore else None
+            if stored is not None:
+                values = stored[1][-CandlePatterns.CANDLES:]
             else:
-                dict["Pattern"] = (self.findCurrentSavedValue(dict,saveDict,"Pattern")[0] + 
-                    colorText.BOLD
-                    + colorText.FAIL
-                    + f"Bearish Engulfing" 
-                    + colorText.END
-                )
-                saveDict["Pattern"] = self.findCurrentSavedValue(dict,saveDict,"Pattern")[1] +  f"Bearish Engulfing"
-            hasCandleStickPattern = True
-        if hasCandleStickPattern:
-            return True
-        return False
+                splitDict = stockDict.get(symbol)
+                try:
+                    stockColumns = list(splitDict["columns"])
+                    values = np.asarray(splitDict["data"][-CandlePatterns.CANDLES:], dtype=np.float64)
+                    values = values[:, [stockColumns.index(col) for col in CandlePatterns.OHLC]]
+                except Exception as e:
+                    default_logger().debug(e, exc_info=True)
+                    continue
+            if len(values) < CandlePatterns.CANDLES:
+                continue
+            symbols.append(symbol)
+            candles.append(values)
+        if len(symbols) == 0:
+            return symbols, None
+        return symbols, np.stack(candles)
+
+    # Returns the direction of each of the PATTERNS for the latest candles
+    # of the stock or None if these candles were not precomputed.
+    def precomputedPatternsFor(self, stock, data):
+        row = self._patternRows.get(stock) if (stock is not None and self._patternRows is not None) else None
+        if row is None or len(data) < CandlePatterns.CANDLES:
+            return None
+        latestCandles = np.column_stack(
+            [data[col].to_numpy()[:CandlePatterns.CANDLES] for col in CandlePatterns.OHLC]
+        )[::-1]
+        if not np.array_equal(latestCandles, self._candles[row]):
+            return None
+        hits = int(self._patternHits[row])
+        bullish = int(self._bullishPatterns[row])
+        return [
+            ((1 if (bullish >> bit) & 1 else -1) if (hits >> bit) & 1 else 0)
+            for bit in range(len(CandlePatterns.PATTERNS))
+        ]
@@ -26,6 +26,7 @@
 import configparser
 import glob
 import os
+import shutil
 import sys
 
 from PKDevTools.classes import Archiver
@@ -145,6 +146,9 @@ class tools(SingletonMixin, metaclass=SingletonType):
                     except Exception as e:
                         self.default_logger.debug(e, exc_info=True)
                         pass
+                if f.endswith(".pkl") and (excludeFile is None or not f.endswith(excludeFile)):
+                    # Also remove the columnar copy of the stock data, if any.
+                    shutil.rmtree(f"{os.path.splitext(f if os.sep in f else os.path.join(dir,f))[0]}.pkcol", ignore_errors=True)
 
     # Handle user input and save config
 
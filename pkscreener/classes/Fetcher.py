@@ -40,6 +40,7 @@ from PKDevTools.classes.Fetcher import StockDataEmptyException
 from PKDevTools.classes.log import default_logger
 from PKDevTools.classes.SuppressOutput import SuppressOutput
 from PKNSETools.PKNSEStockDataFetcher import nseStockDataFetcher
+from pkscreener.classes.PKDataSource import PKDataSource
 from pkscreener.classes.PKTask import PKTask
 from PKDevTools.classes.OutputControls import OutputControls
 # This Class Handles Fetching of Stock Data over the internet
@@ -112,19 +113,17 @@ class screenerStockDataFetcher(nseStockDataFetcher):
         data = None
         with SuppressOutput(suppress_stdout=(not printCounter), suppress_stderr=(not printCounter)):
             try:
-                data = yf.download(
-                    tickers=stockCode,
-                    period=period,
-                    interval=duration,
-                    proxy=proxyServer,
-                    progress=False,
-                    rounding = True,
-                    group_by='ticker',
-                    timeout=self.configManager.generalTimeout/4,
+                dataSource = PKDataSource.current()
+                data = dataSource.fetchStockData(
+                    stockCode,
+                    period,
+                    duration,
+                    proxyServer=proxyServer,
                     start=start,
-                    end=end
+                    end=end,
+                    timeout=self.configManager.generalTimeout/4,
                 )
-                if (data is None or data.empty) and isinstance(stockCode,str):
+                if isinstance(stockCode,str) and not dataSource.isOffline and (data is None or data.empty):
                     for ticker in shared._ERRORS:
                         err = shared._ERRORS.get(ticker)
                         # Maybe this stock is recently listed. Let's try and fetch for the last month
@@ -23,6 +23,7 @@
 
 """
 import os
+import re
 import sys
 import pandas as pd
 import numpy as np
@@ -35,6 +36,11 @@ from PKDevTools.classes.SuppressOutput import SuppressOutput
 from PKDevTools.classes.log import default_logger
 
 class MarketMonitor(SingletonMixin, metaclass=SingletonType):
+    # Cycled through in place of the "+" corners of the grid
+    BORDER_CHARACTERS = "PKSCREENER"
+    # Colours and hyperlinks (the stock names)
+    INVISIBLE_CODES = re.compile(r"\x1b\[[0-9;]*m|\x1b\]8;[^\x1b]*;[^\x1b]*\x1b\\")
+
     def __init__(self,monitors=[], maxNumResultsPerRow=3,maxNumColsInEachResult=6,maxNumRowsInEachResult=10,maxNumResultRowsInMonitor=2,pinnedIntervalWaitSeconds=30,alertOptions=[]):
         super(MarketMonitor, self).__init__()
         if monitors is not None and len(monitors) > 0:
@@ -71,6 +77,16 @@ class MarketMonitor(SingletonMixin, metaclass=SingletonType):
                 colNameIndex += 1
             self.monitor_df = pd.DataFrame(columns=columns)
             self.isPinnedSingleMonitorMode = len(self.monitorPositions.keys()) == 1
+            # The cells of the dashboard, where every widget has its block of
+            # maxNumRowsInEachResult rows x maxNumColsInEachResult columns,
+            # with their widths on the screen. Only the rows that a widget has
+            # written so far are shown.
+            numRows = max(position[0] for position in self.monitorPositions.values()) + self.maxNumRowsInEachResult
+            self.monitorCells = np.full((numRows, len(columns)), "-", dtype=object)
+            self.monitorCellWidths = np.ones((numRows, len(columns)), dtype=int)
+            self.rowsInUse = np.zeros(numRows, dtype=bool)
+            self.columnWidths = None
+            self.previousFrame = None
 
     def currentMonitorOption(self):
         try:
@@ -84,6 +100,15 @@ class MarketMonitor(SingletonMixin, metaclass=SingletonType):
             pass
         return option
 
+    # The key that the results of the monitor running now are saved under (see
+    # saveMonitorResultStocks) and its option string. None outside of the
+    # monitors.
+    def runningMonitor(self):
+        monitors = getattr(self, "monitors", None)
+        if not monitors:
+            return None
+        return str(self.monitorIndex), str(monitors[(self.monitorIndex - 1) % len(monitors)])
+
     def saveMonitorResultStocks(self, results_df):
         if results_df is None or results_df.empty:
             prevOutput_results = "NONE"
@@ -124,50 +149,28 @@ class MarketMonitor(SingletonMixin, metaclass=SingletonType):
             )
             screen_monitor_df.rename(columns={"%Chng": "Ch%","Volume":"Vol","52Wk-H":"52WkH", "RSI":"RSI/i"}, inplace=True)
             telegram_df = self.updateDataFrameForTelegramMode(telegram, screen_monitor_df)
-        
-        
-        if monitorPosition is not None:
-            startRowIndex, startColIndex = monitorPosition
-            if not self.monitor_df.empty:
-                for _ in range(self.lines):
-                    sys.stdout.write("\x1b[1A")  # cursor up one line
-                    sys.stdout.write("\x1b[2K")  # delete the last line
-            if not self.isPinnedSingleMonitorMode:
-                firstColIndex = startColIndex
-                rowIndex = 0
-                colIndex = 0
-                highlightRows = [startRowIndex]
-                highlightCols = []
-                while rowIndex <= len(screen_monitor_df):
-                    for col in screen_monitor_df.columns:
-                        if rowIndex == 0:
-                            # Column names to be repeated for each refresh in respective headers
-                            cleanedScreenOptions = screenOptions.replace(":D","")
-                            if cleanedScreenOptions.startswith("|"):
-                                cleanedScreenOptions = cleanedScreenOptions.replace("|","")
-                                pipedFrom = ""
-                                if cleanedScreenOptions.startswith("{"):
-                                    pipedFrom = cleanedScreenOptions.split("}")[0] + "}:"
-                                cleanedScreenOptions = pipedFrom + ":".join(cleanedScreenOptions.split(":")[2:])
-                                cleanedScreenOptions = cleanedScreenOptions.replace(">X:0:","")
-                            widgetHeader = ":".join(cleanedScreenOptions.split(":")[:4])
-                            if "i " in screenOptions:
-                                widgetHeader = f'{":".join(widgetHeader.split(":")[:3])}:i:{cleanedScreenOptions.split("i ")[-1]}'
-                            self.monitor_df.loc[startRowIndex,[f"A{startColIndex+1}"]] = colorText.BOLD+colorText.HEAD+(widgetHeader if startColIndex==firstColIndex else col)+colorText.END
-                            highlightCols.append(startColIndex)
-                        else:
-                            self.monitor_df.loc[startRowIndex, [f"A{startColIndex+1}"]] = screen_monitor_df.iloc[rowIndex-1,colIndex]
-                            colIndex += 1
-                        startColIndex += 1
-                    _, startColIndex= monitorPosition
-                    rowIndex += 1
-                    colIndex = 0
-                    highlightRows.append(startRowIndex+1)
-                    startRowIndex += 1
+            if monitorPosition is not None:
+                highlightRows, highlightCols = self.updateWidget(screen_monitor_df, screenOptions, monitorPosition)
 
-        self.monitor_df = self.monitor_df.replace(np.nan, "-", regex=True)
         # self.monitorNames[screenOptions] = f"(Dashboard) > {chosenMenu}"
         latestScanMenuOption = f"[+] {dbTimestamp} (Dashboard) > " + f"{chosenMenu} [{screenOptions}]"
+        if self.isPinnedSingleMonitorMode:
+            numRecords = self.drawPinnedMonitor(monitorPosition, latestScanMenuOption)
+        else:
+            columnWidths = self.dashboardColumnWidths()
+            frame = self.dashboardFrame(highlightRows, highlightCols, columnWidths)
+            numRecords = self.drawDashboard(frame, columnWidths, monitorPosition, latestScanMenuOption)
+        self.lines = numRecords + 1 # 1 for the progress bar at the bottom and 1 for the chosenMenu option
+        
+        if not self.isPinnedSingleMonitorMode:
+            if telegram:
+                self.updateIfRunningInTelegramBotMode(screenOptions, chosenMenu, dbTimestamp, telegram, telegram_df)
+            elif screenOptions in self.alertOptions and numRecords > 1: # RSI conditions met? Sound alert!
+                Utility.tools.alertSound(beeps=5)
+        else:
+            sleep(self.pinnedIntervalWaitSeconds)
+
+    def printMenuOption(self, latestScanMenuOption):
         OutputControls().printOutput(
             colorText.BOLD
             + colorText.FAIL
@@ -175,40 +178,158 @@ class MarketMonitor(SingletonMixin, metaclass=SingletonType):
             + colorText.END
             , enableMultipleLineOutput=True
         )
+
+    def clearLines(self):
+        for _ in range(self.lines):
+            sys.stdout.write("\x1b[1A")  # cursor up one line
+            sys.stdout.write("\x1b[2K")  # delete the last line
+
+    def drawPinnedMonitor(self, monitorPosition, latestScanMenuOption):
+        from pkscreener.classes import Utility
+
+        if monitorPosition is not None and not self.monitor_df.empty:
+            self.clearLines()
+        self.monitor_df = self.monitor_df.replace(np.nan, "-", regex=True)
+        self.printMenuOption(latestScanMenuOption)
         tabulated_results = colorText.miniTabulator().tabulate(
             self.monitor_df, tablefmt=colorText.No_Pad_GridFormat,
-            headers="keys" if self.isPinnedSingleMonitorMode else (),
+            headers="keys",
             highlightCharacter=colorText.HEAD+"="+colorText.END,
-            showindex=self.isPinnedSingleMonitorMode,
-            highlightedRows=highlightRows,
-            highlightedColumns=highlightCols,
+            showindex=True,
             maxcolwidths=Utility.tools.getMaxColumnWidths(self.monitor_df)
         )
-        console_results = ""
-        if self.isPinnedSingleMonitorMode:
-            copyScreenResults = self.monitor_df.copy()
-            hiddenColumns = self.hiddenColumns.split(",")
-            for col in copyScreenResults.columns:
-                if col in hiddenColumns:
-                    copyScreenResults.drop(col, axis=1, inplace=True, errors="ignore")
-            try:
-                console_results = colorText.miniTabulator().tabulate(
-                        copyScreenResults, headers="keys", tablefmt=colorText.No_Pad_GridFormat,
-                        maxcolwidths=Utility.tools.getMaxColumnWidths(copyScreenResults)
-                    )
-            except:
-                console_results = tabulated_results
-        numRecords = len(tabulated_results.splitlines())
-        self.lines = numRecords + 1 # 1 for the progress bar at the bottom and 1 for the chosenMenu option
-        OutputControls().printOutput(tabulated_results if not self.isPinnedSingleMonitorMode else console_results, enableMultipleLineOutput=True)
-        
-        if not self.isPinnedSingleMonitorMode:
-            if telegram:
-                self.updateIfRunningInTelegramBotMode(screenOptions, chosenMenu, dbTimestamp, telegram, telegram_df)
-            elif screenOptions in self.alertOptions and numRecords > 1: # RSI conditions met? Sound alert!
-                Utility.tools.alertSound(beeps=5)
-        else:
-            sleep(self.pinnedIntervalWaitSeconds)
+        copyScreenResults = self.monitor_df.copy()
+        hiddenColumns = self.hiddenColumns.split(",")
+        for col in copyScreenResults.columns:
+            if col in hiddenColumns:
+                copyScreenResults.drop(col, axis=1, inplace=True, errors="ignore")
+        try:
+            console_results = colorText.miniTabulator().tabulate(
+                    copyScreenResults, headers="keys", tablefmt=colorText.No_Pad_GridFormat,
+                    maxcolwidths=Utility.tools.getMaxColumnWidths(copyScreenResults)
+                )
+        except:
+            console_results = tabulated_results
+        OutputControls().printOutput(console_results, enableMultipleLineOutput=True)
+        return len(tabulated_results.splitlines())
+
+    def widgetHeader(self, screenOptions):
+        cleanedScreenOptions = screenOptions.replace(":D","")
+        if cleanedScreenOptions.startswith("|"):
+            cleanedScreenOptions = cleanedScreenOptions.replace("|","")
+            pipedFrom = ""
+            if cleanedScreenOptions.startswith("{"):
+                pipedFrom = cleanedScreenOptions.split("}")[0] + "}:"
+            cleanedScreenOptions = pipedFrom + ":".join(cleanedScreenOptions.split(":")[2:])
+            cleanedScreenOptions = cleanedScreenOptions.replace(">X:0:","")
+        widgetHeader = ":".join(cleanedScreenOptions.split(":")[:4])
+        if "i " in screenOptions:
+            widgetHeader = f'{":".join(widgetHeader.split(":")[:3])}:i:{cleanedScreenOptions.split("i ")[-1]}'
+        return widgetHeader
+
+    # Writes the results into the block of cells of the widget: the header row
+    # (widget name and column names) and a row per stock. Rows left over from
+    # its previous results are cleared. Returns the rows and columns of the
+    # widget to highlight.
+    def updateWidget(self, screen_monitor_df, screenOptions, monitorPosition):
+        startRowIndex, startColIndex = monitorPosition
+        numCols = min(len(screen_monitor_df.columns), self.monitorCells.shape[1] - startColIndex)
+        values = screen_monitor_df.to_numpy(dtype=object)[:, :numCols]
+        block = np.full((self.maxNumRowsInEachResult, numCols), "-", dtype=object)
+        block[0, :] = [colorText.BOLD+colorText.HEAD+header+colorText.END for header in [self.widgetHeader(screenOptions)] + list(screen_monitor_df.columns[1:numCols])]
+        block[1:1+len(values)] = values
+        block[pd.isna(block)] = "-"
+        cells = [str(cell) for cell in block.flat]
+        self.monitorCells[startRowIndex:startRowIndex+len(block), startColIndex:startColIndex+numCols] = np.array(cells, dtype=object).reshape(block.shape)
+        self.monitorCellWidths[startRowIndex:startRowIndex+len(block), startColIndex:startColIndex+numCols] = np.array([MarketMonitor.visibleWidth(cell) for cell in cells]).reshape(block.shape)
+        self.rowsInUse[startRowIndex:startRowIndex + 1 + len(values)] = True
+        return list(range(startRowIndex, startRowIndex + len(values) + 1)), list(range(startColIndex, startColIndex + numCols))
+
+    # Width of the text on the terminal, without the colours and hyperlinks
+    def visibleWidth(text):
+        return len(MarketMonitor.INVISIBLE_CODES.sub("", text))
+
+    # The columns only ever widen, so that the segments of the lines of the
+    # dashboard stay where they were on the screen.
+    def dashboardColumnWidths(self):
+        columnWidths = self.monitorCellWidths[self.rowsInUse].max(axis=0, initial=1)
+        if self.columnWidths is not None:
+            columnWidths = np.maximum(columnWidths, self.columnWidths)
+        return columnWidths
+
+    # The grid of the dashboard (as colorText.miniTabulator would draw it) as a
+    # list of lines, each a list of segments: a border character followed by a
+    # cell, and the last border character. The grid lines above and below the
+    # highlighted rows are highlighted.
+    def dashboardFrame(self, highlightRows, highlightCols, columnWidths):
+        rows = np.flatnonzero(self.rowsInUse)
+        cells = self.monitorCells[rows]
+        cellWidths = self.monitorCellWidths[rows]
+        numCols = cells.shape[1]
+        isHighlighted = len(highlightRows) > 0 and len(highlightCols) > 0
+        borders = MarketMonitor.BORDER_CHARACTERS
+        frame = []
+        for rowIndex in range(len(cells) + 1):
+            # The border characters run on from one line to the next
+            firstBorder = rowIndex * (numCols + 1)
+            rowHighlighted = isHighlighted and (
+                (rowIndex > 0 and rows[rowIndex - 1] in highlightRows)
+                or (rowIndex < len(rows) and rows[rowIndex] in highlightRows)
+            )
+            line = []
+            for colIndex in range(numCols):
+                fill = colorText.HEAD+"="+colorText.END if rowHighlighted and colIndex in highlightCols else "-"
+                line.append(borders[(firstBorder + colIndex) % len(borders)] + fill * columnWidths[colIndex])
+            line.append(borders[(firstBorder + numCols) % len(borders)])
+            frame.append(line)
+            if rowIndex < len(cells):
+                line = [f"|{cells[rowIndex, colIndex]}{' ' * (columnWidths[colIndex] - cellWidths[rowIndex, colIndex])}" for colIndex in range(numCols)]
+                line.append("|")
+                frame.append(line)
+        return frame
+
+    # Draws the whole dashboard the first time, when its layout changed and
+    # once every cycle of the monitors (in case anything wrote over it).
+    # Otherwise only the segments that changed since the last frame are
+    # written over the previous ones. Returns the number of lines drawn.
+    def drawDashboard(self, frame, columnWidths, monitorPosition, latestScanMenuOption):
+        previousFrame = self.previousFrame
+        previousColumnWidths = self.columnWidths
+        self.previousFrame = frame
+        self.columnWidths = columnWidths
+        redraw = (
+            previousFrame is None
+            or monitorPosition is None
+            or len(previousFrame) != len(frame)
+            or not np.array_equal(previousColumnWidths, columnWidths)
+            or monitorPosition == self.monitorPositions.get(self.monitors[0])
+            or "RUNNER" in os.environ.keys()
+        )
+        if redraw:
+            if monitorPosition is not None and previousFrame is not None:
+                self.clearLines()
+            self.printMenuOption(latestScanMenuOption)
+            OutputControls().printOutput("\n".join("".join(line) for line in frame), enableMultipleLineOutput=True)
+            return len(frame)
+        sys.stdout.write(f"\x1b[{self.lines}A\r\x1b[2K")
+        self.printMenuOption(latestScanMenuOption)
+        segmentWidths = [width + 1 for width in columnWidths] + [1]
+        output = []
+        for line, previousLine in zip(frame, previousFrame):
+            column = 1
+            isContiguous = False
+            for segment, previousSegment, segmentWidth in zip(line, previousLine, segmentWidths):
+                if segment != previousSegment:
+                    output.append(segment if isContiguous else f"\x1b[{column}G{segment}")
+                    isContiguous = True
+                else:
+                    isContiguous = False
+                column += segmentWidth
+            output.append("\n")
+        sys.stdout.write("".join(output))
+        sys.stdout.flush()
+        OutputControls().lines += len(frame)
+        return len(frame)
 
     def updateDataFrameForTelegramMode(self, telegram, screen_monitor_df):
         telegram_df = None
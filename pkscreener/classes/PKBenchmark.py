@@ -0,0 +1,230 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import atexit
+import functools
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from PKDevTools.classes.log import default_logger
+
+# Per stage timings of a scan. The timings are recorded only when the
+# PKSCREENER_BENCHMARK environment variable points to a directory (see
+# --benchmark), so that the worker processes record theirs as well. Every
+# process appends its timings to <directory>/timings-<pid>.jsonl.
+class PKStageTimer:
+    ENVIRONMENT_KEY = "PKSCREENER_BENCHMARK"
+    _timings = {}
+    _lastTaskEnded = None
+    _flushAtExit = False
+
+    def directory():
+        return os.environ.get(PKStageTimer.ENVIRONMENT_KEY)
+
+    def enabled():
+        return PKStageTimer.directory() is not None
+
+    def record(name, seconds):
+        PKStageTimer._timings.setdefault(name, []).append(seconds)
+        if not PKStageTimer._flushAtExit:
+            atexit.register(PKStageTimer.flush)
+            PKStageTimer._flushAtExit = True
+
+    def flush():
+        directory = PKStageTimer.directory()
+        if directory is None or len(PKStageTimer._timings) == 0:
+            return
+        try:
+            with open(os.path.join(directory, f"timings-{os.getpid()}.jsonl"), "a") as f:
+                f.write(json.dumps(PKStageTimer._timings) + "\n")
+        except OSError as e:
+            default_logger().debug(e, exc_info=True)
+        PKStageTimer._timings = {}
+
+    # All the timings recorded in the directory by stage
+    def collect(directory):
+        timings = {}
+        for filePath in glob.glob(os.path.join(directory, "timings-*.jsonl")):
+            with open(filePath) as f:
+                for line in f:
+                    for name, values in json.loads(line).items():
+                        timings.setdefault(name, []).extend(values)
+        return timings
+
+    @contextmanager
+    def stage(name):
+        if not PKStageTimer.enabled():
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            PKStageTimer.record(name, time.perf_counter() - started)
+
+    # Decorator that times every call. With task=True, the function is the
+    # unit of work of the worker processes: the time between the end of one
+    # call and the start of the next is recorded as the queue handoff (putting
+    # the result on the queue and getting the next task) and the timings are
+    # flushed after each call, since the workers are terminated at the end.
+    def timed(name, task=False):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not PKStageTimer.enabled():
+                    return function(*args, **kwargs)
+                started = time.perf_counter()
+                if task and PKStageTimer._lastTaskEnded is not None:
+                    PKStageTimer.record("queueHandoff", started - PKStageTimer._lastTaskEnded)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    ended = time.perf_counter()
+                    PKStageTimer.record(name, ended - started)
+                    if task:
+                        PKStageTimer._lastTaskEnded = ended
+                        PKStageTimer.flush()
+            return wrapper
+        return decorator
+
+    # Times the methods of cls whose names start with one of the prefixes
+    def instrument(cls, prefixes):
+        for attribute, value in list(vars(cls).items()):
+            if callable(value) and attribute.startswith(tuple(prefixes)) and not hasattr(value, "__wrapped__"):
+                setattr(cls, attribute, PKStageTimer.timed(f"{cls.__name__}.{attribute}")(value))
+
+
+# Runs a fixed matrix of scans (X:0:<option>:<stocks>) against a synthetic or a
+# recorded (offline --datasource) universe, each in its own pkscreener process,
+# and reports the stocks/sec and the calls/sec and p50/p99 latency of every
+# stage as JSON.
+class PKBenchmark:
+    # Scans that need no further input
+    SCAN_OPTIONS = ["0", "1", "2", "3", "9", "10", "11", "13", "14", "17", "18", "23", "24", "31"]
+    DEFAULT_STOCKS = 200
+    BARS = 300
+    SCAN_TIMEOUT = 1800
+
+    # Writes numStocks random walk SYNxxxx.csv files for a local: data source
+    def syntheticUniverse(directory, numStocks, bars=BARS, seed=0):
+        rng = np.random.default_rng(seed)
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=bars, name="Date")
+        symbols = []
+        for i in range(numStocks):
+            close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, bars)))
+            openPrice = close * (1 + rng.normal(0, 0.005, bars))
+            high = np.maximum(openPrice, close) * (1 + np.abs(rng.normal(0, 0.01, bars)))
+            low = np.minimum(openPrice, close) * (1 - np.abs(rng.normal(0, 0.01, bars)))
+            volume = rng.integers(100000, 5000000, bars)
+            data = pd.DataFrame({"Open": openPrice, "High": high, "Low": low, "Close": close, "Adj Close": close, "Volume": volume}, index=index)
+            symbol = f"SYN{i:04d}"
+            data.round(2).to_csv(os.path.join(directory, f"{symbol}.csv"))
+            symbols.append(symbol)
+        return symbols
+
+    def stats(values):
+        values = np.asarray(values, dtype=float)
+        total = float(values.sum())
+        return {
+            "count": len(values),
+            "totalSeconds": round(total, 6),
+            "callsPerSecond": round(len(values) / total, 2) if total > 0 else None,
+            "p50Ms": round(float(np.percentile(values, 50)) * 1000, 3),
+            "p99Ms": round(float(np.percentile(values, 99)) * 1000, 3),
+        }
+
+    # A scan that crashed, exited with an error or timed out (returnCode None)
+    # is marked as failed and has no stocks/sec.
+    def report(timings, numStocks, wallSeconds, returnCode=0):
+        scanSeconds = sum(timings.get("runScan", []))
+        failed = returnCode != 0
+        return {
+            "stocks": numStocks,
+            "wallSeconds": round(wallSeconds, 3),
+            "returnCode": returnCode,
+            "timedOut": returnCode is None,
+            "failed": failed,
+            "stocksPerSecond": round(numStocks / scanSeconds, 2) if scanSeconds > 0 and not failed else None,
+            "stages": {name: PKBenchmark.stats(values) for name, values in sorted(timings.items()) if len(values) > 0},
+        }
+
+    # Returns the wall seconds and the return code (None if the scan timed out)
+    def runScan(option, stockCodes, workingDirectory, environment):
+        started = time.perf_counter()
+        returnCode = None
+        try:
+            returnCode = subprocess.run(
+                [sys.executable, "-m", "pkscreener.pkscreenercli", "-a", "Y", "-e", "-o", f"X:0:{option}:{','.join(stockCodes)}"],
+                cwd=workingDirectory,
+                env=environment,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=PKBenchmark.SCAN_TIMEOUT,
+            ).returncode
+        except subprocess.TimeoutExpired as e:
+            default_logger().debug(e, exc_info=True)
+        return time.perf_counter() - started, returnCode
+
+    def run(numStocks=DEFAULT_STOCKS, scanOptions=SCAN_OPTIONS, dataSource=None, outputFile=None):
+        from pkscreener.classes.PKDataSource import PKDataSource
+        from pkscreener.classes.PKResultCache import PKResultCache
+        workingDirectory = tempfile.mkdtemp(prefix="pkscreener-benchmark-")
+        try:
+            source = PKDataSource.fromSpec(dataSource) if dataSource else None
+            stockCodes = source.symbols()[:numStocks] if source is not None and source.isOffline else []
+            if len(stockCodes) == 0:
+                universe = os.path.join(workingDirectory, "universe")
+                os.makedirs(universe)
+                stockCodes = PKBenchmark.syntheticUniverse(universe, numStocks)
+                dataSource = f"local:{universe}"
+            packageRoot = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            environment = dict(os.environ)
+            environment[PKDataSource.ENVIRONMENT_KEY] = dataSource
+            # Every scan must really screen the stocks
+            environment.pop(PKResultCache.ENVIRONMENT_KEY, None)
+            environment["PYTHONPATH"] = os.pathsep.join([packageRoot] + ([environment["PYTHONPATH"]] if environment.get("PYTHONPATH") else []))
+            results = {"dataSource": dataSource, "stocks": len(stockCodes), "scans": {}}
+            for option in scanOptions:
+                timingsDirectory = os.path.join(workingDirectory, f"timings-{option}")
+                os.makedirs(timingsDirectory)
+                environment[PKStageTimer.ENVIRONMENT_KEY] = timingsDirectory
+                wallSeconds, returnCode = PKBenchmark.runScan(option, stockCodes, workingDirectory, environment)
+                results["scans"][f"X:0:{option}"] = PKBenchmark.report(PKStageTimer.collect(timingsDirectory), len(stockCodes), wallSeconds, returnCode)
+        finally:
+            shutil.rmtree(workingDirectory, ignore_errors=True)
+        output = json.dumps(results, indent=2)
+        if outputFile is not None:
+            with open(outputFile, "w") as f:
+                f.write(output)
+        return output
@@ -0,0 +1,250 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from PKDevTools.classes.log import default_logger
+from PKDevTools.classes.Utils import random_user_agent
+
+
+class PKRetryableDownloadError(Exception):
+    pass
+
+
+# Downloads the price history of many symbols from Yahoo's chart API.
+# Downloading is I/O bound, so a few threads sharing one pool of keep-alive
+# connections do the job without spawning any processes. Requests to a host
+# are spaced out to at most requestsPerSecond and the symbols that failed
+# with a throttling/server/network error are retried with an exponential
+# backoff, until all are done or the deadline has passed.
+#
+# Stocks that already have a (cached) history only need the candles since
+# their last completed one: download() then gets a start time per stock and
+# appendCandles() merges the new candles into the history.
+class PKBulkDownloader:
+    BASE_URL = "https://query2.finance.yahoo.com"
+    CHART_PATH = "/v8/finance/chart/{symbol}"
+    COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+    MAX_CONNECTIONS = 16
+    REQUESTS_PER_SECOND = 50
+    RETRIES = 3
+    BACKOFF = 0.5
+    RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+    def __init__(
+        self,
+        baseUrl=None,
+        maxConnections=MAX_CONNECTIONS,
+        requestsPerSecond=REQUESTS_PER_SECOND,
+        retries=RETRIES,
+        backoff=BACKOFF,
+        timeout=2,
+        proxies=None,
+    ):
+        self.baseUrl = (baseUrl or PKBulkDownloader.BASE_URL).rstrip("/")
+        self.maxConnections = maxConnections
+        self.requestsPerSecond = requestsPerSecond
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxConnections, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": random_user_agent()})
+        if proxies is not None:
+            self.session.proxies = proxies
+        self._hostLock = threading.Lock()
+        self._nextRequestTimes = {}
+
+    # Returns ({stock: DataFrame}, leftOutStocks)
+    def download(self, stockCodes, period, duration, exchangeSuffix=".NS", deadline=None, starts=None):
+        starts = starts or {}
+        results = {}
+        endTime = None if deadline is None else time.monotonic() + deadline
+        pending = list(dict.fromkeys(stockCodes))
+        with ThreadPoolExecutor(max_workers=self.maxConnections) as executor:
+            for attempt in range(self.retries + 1):
+                if attempt > 0:
+                    delay = self.backoff * (2 ** (attempt - 1))
+                    if endTime is not None and time.monotonic() + delay >= endTime:
+                        break
+                    time.sleep(delay)
+                futures = {
+                    stock: executor.submit(self.fetch, stock, period, duration, exchangeSuffix, endTime, starts.get(stock))
+                    for stock in pending
+                }
+                pending = []
+                for stock, future in futures.items():
+                    try:
+                        results[stock] = future.result()
+                    except PKRetryableDownloadError as e:
+                        default_logger().debug(f"{stock}: {e}")
+                        pending.append(stock)
+                    except Exception as e:
+                        default_logger().debug(e, exc_info=True)
+                if len(pending) == 0:
+                    break
+        leftOutStocks = [stock for stock in stockCodes if stock not in results]
+        return results, leftOutStocks
+
+    def fetch(self, stock, period, duration, exchangeSuffix=".NS", endTime=None, start=None):
+        symbol = stock
+        if len(exchangeSuffix) > 0 and not stock.endswith(exchangeSuffix) and not stock.startswith("^"):
+            symbol = f"{stock}{exchangeSuffix}"
+        url = f"{self.baseUrl}{PKBulkDownloader.CHART_PATH.format(symbol=symbol)}"
+        self._waitForHost(urlparse(url).netloc)
+        timeout = self.timeout
+        if endTime is not None:
+            timeout = min(timeout, endTime - time.monotonic())
+            if timeout <= 0:
+                raise TimeoutError(f"Deadline passed before downloading {symbol}")
+        params = {"interval": duration, "includePrePost": "false", "events": "div,splits"}
+        if start is None:
+            params["range"] = period
+        else:
+            params["period1"] = int(start)
+            params["period2"] = int(time.time())
+        try:
+            response = self.session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise PKRetryableDownloadError(e)
+        if response.status_code in PKBulkDownloader.RETRY_STATUS_CODES:
+            raise PKRetryableDownloadError(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        return PKBulkDownloader.toDataFrame(response.json(), duration)
+
+    # Spaces out the requests to the same host
+    def _waitForHost(self, host):
+        if not self.requestsPerSecond:
+            return
+        with self._hostLock:
+            now = time.monotonic()
+            requestTime = max(now, self._nextRequestTimes.get(host, now))
+            self._nextRequestTimes[host] = requestTime + 1 / self.requestsPerSecond
+        if requestTime > now:
+            time.sleep(requestTime - now)
+
+    # Converts a chart API response into the same frame that yf.download
+    # (with rounding) returns for a single ticker
+    def toDataFrame(chart, duration):
+        result = chart["chart"]["result"][0]
+        timestamps = result.get("timestamp")
+        if not timestamps:
+            raise ValueError(f"No prices found for {result.get('meta', {}).get('symbol')}")
+        indicators = result["indicators"]
+        quote = indicators["quote"][0]
+        adjClose = indicators.get("adjclose", [{}])[0].get("adjclose", quote["close"])
+        index = pd.to_datetime(np.asarray(timestamps, dtype=np.int64), unit="s", utc=True)
+        timezone = result.get("meta", {}).get("exchangeTimezoneName")
+        if timezone is not None:
+            index = index.tz_convert(timezone)
+        if duration[-1] not in ["m", "h"]:
+            index = index.normalize()
+        data = pd.DataFrame(
+            {
+                "Open": quote["open"],
+                "High": quote["high"],
+                "Low": quote["low"],
+                "Close": quote["close"],
+                "Adj Close": adjClose,
+                "Volume": quote["volume"],
+            },
+            index=index,
+            columns=PKBulkDownloader.COLUMNS,
+            dtype=np.float64,
+        )
+        data = data.dropna(how="all", subset=PKBulkDownloader.COLUMNS[:-1])
+        # The chart API repeats the live candle as a separate row
+        data = data[~data.index.duplicated(keep="last")]
+        data["Volume"] = data["Volume"].fillna(0).astype(np.int64)
+        return data.round(2)
+
+    # Returns {stock: start time} for the stocks whose history can be
+    # extended, i.e. from the day before their last completed candle.
+    # The last candle itself may have been saved during trading hours.
+    def deltaStarts(histories, duration):
+        starts = {}
+        if duration[-1] in ["m", "h"]:
+            return starts
+        for stock, history in histories.items():
+            try:
+                if len(history["index"]) < 2:
+                    continue
+                lastCompleted = pd.Timestamp(history["index"][-2])
+                starts[stock] = lastCompleted.timestamp() - 86400
+            except Exception as e:
+                default_logger().debug(e, exc_info=True)
+        return starts
+
+    # Replaces the last two candles of the history with the downloaded ones,
+    # which must start with the same (completed) candle. Returns the merged
+    # split dict with the history trimmed to the period or None if the
+    # candles don't line up (e.g. the prices have been adjusted for a split).
+    def appendCandles(history, data, period):
+        columns = list(history["columns"])
+        if columns != list(data.columns):
+            return None
+        storedIndex = pd.DatetimeIndex(history["index"])
+        lastCompletedDate = PKBulkDownloader._sessionDates(storedIndex[-2:-1])[0]
+        newDates = PKBulkDownloader._sessionDates(data.index)
+        position = np.searchsorted(newDates, lastCompletedDate)
+        if position >= len(data) or newDates[position] != lastCompletedDate:
+            return None
+        data = data.iloc[position:]
+        prices = [i for i, col in enumerate(columns) if col != "Volume"]
+        stored = np.asarray(history["data"][-2], dtype=np.float64)[prices]
+        if not np.allclose(stored, data.iloc[0].to_numpy(dtype=np.float64)[prices], rtol=1e-3, equal_nan=True):
+            return None
+        if storedIndex.tz is None and data.index.tz is not None:
+            storedIndex = storedIndex.tz_localize(data.index.tz)
+        elif storedIndex.tz is not None and data.index.tz is not None:
+            storedIndex = storedIndex.tz_convert(data.index.tz)
+        stored = pd.DataFrame(history["data"][:-2], columns=columns, index=storedIndex[:-2])
+        merged = pd.concat([stored, data]) if len(stored) > 0 else data
+        offset = PKBulkDownloader.periodOffset(period)
+        if offset is not None:
+            merged = merged[merged.index > merged.index[-1] - offset]
+        return merged.to_dict("split")
+
+    def _sessionDates(index):
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        return index.normalize()
+
+    # "1y" -> DateOffset(years=1), None for "max" etc.
+    def periodOffset(period):
+        units = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+        for unit, name in units.items():
+            count = period[:-len(unit)]
+            if period.endswith(unit) and count.isdigit():
+                return pd.DateOffset(**{name: int(count)})
+        return None
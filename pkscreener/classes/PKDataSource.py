@@ -0,0 +1,260 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import glob
+import os
+import pickle
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import parse_qs
+
+import pandas as pd
+import yfinance as yf
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes.PKBulkDownloader import PKBulkDownloader
+
+# Where the stock prices come from. The data source is picked with the
+# PKSCREENER_DATA_SOURCE environment variable (see --datasource), so that the
+# worker processes use the same one:
+#   yahoo (default)             Yahoo finance, the saved data from the server
+#   local:<directory>           <SYMBOL>.csv/.parquet files, fully offline
+#   replay:<file>[?options]     A saved stock data pickle served bar by bar
+#                               speed=<n>: n bars/bar-duration of wall clock,
+#                                   0 (default) for one bar per download()
+#                               start=<n>: bars visible at the start (1)
+class PKDataSource(ABC):
+    ENVIRONMENT_KEY = "PKSCREENER_DATA_SOURCE"
+    # Offline sources are the only source of truth: no saved data from the
+    # server or stale local caches are used.
+    isOffline = False
+    _current = None
+    _currentSpec = None
+
+    def current():
+        spec = os.environ.get(PKDataSource.ENVIRONMENT_KEY, "yahoo")
+        if PKDataSource._current is None or spec != PKDataSource._currentSpec:
+            PKDataSource._current = PKDataSource.fromSpec(spec)
+            PKDataSource._currentSpec = spec
+        return PKDataSource._current
+
+    def fromSpec(spec):
+        kind, _, location = spec.partition(":")
+        kind = kind.strip().lower()
+        if kind in ["", "yahoo"]:
+            return PKYahooDataSource()
+        if kind == "local":
+            return PKLocalDataSource(location)
+        if kind == "replay":
+            location, _, query = location.partition("?")
+            options = {key: values[-1] for key, values in parse_qs(query).items()}
+            return PKReplayDataSource(
+                location,
+                speed=float(options.get("speed", 0)),
+                start=int(options.get("start", 1)),
+            )
+        raise ValueError(f"Unknown data source: {spec}")
+
+    # Returns a single stock's frame (Open, High, Low, Close, [Adj Close], Volume)
+    # or for a list of stocks, the frames by stock.
+    def fetchStockData(self, stockCode, period, duration, proxyServer=None, start=None, end=None, timeout=None):
+        if isinstance(stockCode, list):
+            return {stock: self.fetchSymbolData(stock, period, duration, proxyServer, start, end, timeout) for stock in stockCode}
+        return self.fetchSymbolData(stockCode, period, duration, proxyServer, start, end, timeout)
+
+    # Returns the frame of a single stock (None if the source doesn't have it).
+    # Every data source implements this.
+    @abstractmethod
+    def fetchSymbolData(self, stockCode, period, duration, proxyServer=None, start=None, end=None, timeout=None):
+        pass
+
+    # Same as PKBulkDownloader.download(). Offline sources may ignore the
+    # starts and return the whole history (appendCandles() only picks the new
+    # candles anyway).
+    def download(self, stockCodes, period, duration, exchangeSuffix=".NS", deadline=None, starts=None, timeout=2, proxies=None):
+        results = {}
+        for stock in stockCodes:
+            try:
+                data = self.fetchSymbolData(PKDataSource.symbol(stock, exchangeSuffix), period, duration)
+                if data is not None and len(data) > 0:
+                    results[stock] = data
+            except Exception as e:
+                default_logger().debug(e, exc_info=True)
+        return results, [stock for stock in stockCodes if stock not in results]
+
+    # The stocks the source has, if it knows them
+    def symbols(self):
+        return []
+
+    def symbol(stock, exchangeSuffix=".NS"):
+        if len(exchangeSuffix) > 0 and not stock.endswith(exchangeSuffix) and not stock.startswith("^"):
+            return f"{stock}{exchangeSuffix}"
+        return stock
+
+    # Keeps the candles of the period
+    def trim(data, period):
+        offset = PKBulkDownloader.periodOffset(period) if period is not None else None
+        if offset is not None and len(data) > 0:
+            data = data[data.index > data.index[-1] - offset]
+        return data
+
+
+class PKYahooDataSource(PKDataSource):
+    # Yahoo gives the frames of a list of stocks in one request
+    def fetchStockData(self, stockCode, period, duration, proxyServer=None, start=None, end=None, timeout=None):
+        return self.fetchSymbolData(stockCode, period, duration, proxyServer, start, end, timeout)
+
+    def fetchSymbolData(self, stockCode, period, duration, proxyServer=None, start=None, end=None, timeout=None):
+        return yf.download(
+            tickers=stockCode,
+            period=period,
+            interval=duration,
+            proxy=proxyServer,
+            progress=False,
+            rounding = True,
+            group_by='ticker',
+            timeout=timeout,
+            start=start,
+            end=end
+        )
+
+    def download(self, stockCodes, period, duration, exchangeSuffix=".NS", deadline=None, starts=None, timeout=2, proxies=None):
+        downloader = PKBulkDownloader(timeout=timeout, proxies=proxies)
+        return downloader.download(stockCodes, period, duration, exchangeSuffix=exchangeSuffix, deadline=deadline, starts=starts)
+
+
+# A directory with one <SYMBOL>.csv or <SYMBOL>.parquet file per stock (with or
+# without the exchange suffix). The first column (or the index) has the dates.
+class PKLocalDataSource(PKDataSource):
+    isOffline = True
+    EXTENSIONS = [".parquet", ".csv"]
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        if not os.path.isdir(self.directory):
+            raise FileNotFoundError(f"Data source directory not found: {self.directory}")
+        self._cache = {}
+
+    def path(self, stockCode):
+        names = [stockCode]
+        if "." in stockCode:
+            names.append(stockCode.rsplit(".", 1)[0])
+        for name in names:
+            for extension in PKLocalDataSource.EXTENSIONS:
+                filePath = os.path.join(self.directory, f"{name}{extension}")
+                if os.path.isfile(filePath):
+                    return filePath
+        return None
+
+    def load(self, stockCode):
+        filePath = self.path(stockCode)
+        if filePath is None:
+            return None
+        modified = os.stat(filePath).st_mtime
+        cached = self._cache.get(filePath)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+        if filePath.endswith(".csv"):
+            data = pd.read_csv(filePath, index_col=0)
+        else:
+            data = pd.read_parquet(filePath)
+            if not isinstance(data.index, pd.DatetimeIndex):
+                data = data.set_index(data.columns[0])
+        try:
+            data.index = pd.DatetimeIndex(pd.to_datetime(data.index))
+        except (ValueError, TypeError):
+            # Mixed UTC offsets
+            data.index = pd.DatetimeIndex(pd.to_datetime(data.index, utc=True))
+        data = data.sort_index()
+        self._cache[filePath] = (modified, data)
+        return data
+
+    def symbols(self):
+        files = []
+        for extension in PKLocalDataSource.EXTENSIONS:
+            files.extend(glob.glob(f"*{extension}", root_dir=self.directory))
+        return sorted(set(os.path.splitext(f)[0] for f in files))
+
+    def fetchSymbolData(self, stockCode, period, duration, proxyServer=None, start=None, end=None, timeout=None):
+        data = self.load(stockCode)
+        if data is None:
+            return None
+        # start/end are about today's session, which the saved files don't have
+        return PKDataSource.trim(data, period)
+
+
+# Replays a saved {stock: split dict} pickle (e.g. a stock_data_*.pkl or an
+# intraday_stock_data_*.pkl of a session) one bar at a time.
+class PKReplayDataSource(PKDataSource):
+    isOffline = True
+    BAR_SECONDS = {"m": 60, "h": 3600, "d": 86400, "wk": 7 * 86400, "mo": 30 * 86400}
+
+    def __init__(self, sessionFile, speed=0, start=1):
+        with open(os.path.expanduser(sessionFile), "rb") as f:
+            self.session = pickle.load(f)
+        self.speed = speed
+        self.start = start
+        self.step = 0
+        self.startedAt = time.time()
+        self._frames = {}
+
+    def frame(self, stockCode):
+        data = self._frames.get(stockCode)
+        if data is None:
+            splitDict = self.session.get(stockCode)
+            if splitDict is None and "." in stockCode:
+                splitDict = self.session.get(stockCode.rsplit(".", 1)[0])
+            if splitDict is None:
+                return None
+            data = pd.DataFrame(splitDict["data"], columns=splitDict["columns"], index=pd.DatetimeIndex(splitDict["index"]))
+            self._frames[stockCode] = data
+        return data
+
+    def symbols(self):
+        return sorted(stock for stock, splitDict in self.session.items() if isinstance(splitDict, dict) and "data" in splitDict)
+
+    # Number of bars of each stock that have been replayed so far
+    def visibleBars(self, duration):
+        if self.speed <= 0:
+            return self.start + self.step
+        for unit, seconds in PKReplayDataSource.BAR_SECONDS.items():
+            count = duration[:-len(unit)]
+            if duration.endswith(unit) and count.isdigit():
+                barSeconds = int(count) * seconds
+                return self.start + int((time.time() - self.startedAt) * self.speed / barSeconds)
+        return self.start
+
+    def fetchSymbolData(self, stockCode, period, duration, proxyServer=None, start=None, end=None, timeout=None):
+        data = self.frame(stockCode)
+        if data is None:
+            return None
+        return data.head(max(self.visibleBars(duration), 0))
+
+    # Every download (i.e. refresh) of stocks of the session moves the replay
+    # forward by one bar
+    def download(self, stockCodes, period, duration, exchangeSuffix=".NS", deadline=None, starts=None, timeout=2, proxies=None):
+        results, leftOutStocks = super().download(stockCodes, period, duration, exchangeSuffix, deadline, starts, timeout, proxies)
+        if len(results) > 0:
+            self.step += 1
+        return results, leftOutStocks
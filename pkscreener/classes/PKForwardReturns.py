@@ -0,0 +1,101 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+import pandas as pd
+from PKDevTools.classes.ColorText import colorText
+
+# Accumulates the backtest results of every (stock, signal-date) pair along
+# with the closing prices that followed the signal. Forward returns for all
+# the configured periods are then computed in one array operation instead of
+# one pct_change per period per result.
+class PKForwardReturns:
+    LEADING_COLUMNS = ["Stock", "Date", "Volume", "Trend", "MA-Signal", "LTP", "52Wk-H", "52Wk-L"]
+    TRAILING_COLUMNS = ["Consol.", "Breakout", "RSI", "Pattern", "CCI"]
+
+    def __init__(self, periods, capacity=256):
+        self.periods = [int(prd) for prd in periods]
+        self.window = max(self.periods) + 1
+        self.rows = []
+        # Forward closes of each signal. Row i, column j is the close j
+        # candles after the signal date of the i-th result.
+        self.closes = np.full((max(1, capacity), self.window), np.nan)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def columns(self):
+        columns = list(PKForwardReturns.LEADING_COLUMNS)
+        columns.extend([f"{prd}-Pd" for prd in self.periods])
+        columns.extend(PKForwardReturns.TRAILING_COLUMNS)
+        for prd in self.periods:
+            columns.extend([f"LTP{prd}", f"Growth{prd}"])
+        return columns
+
+    # row: the screened values of a stock for one signal date
+    # closes: the closing prices starting from the signal date, oldest first
+    def add(self, row, closes):
+        index = len(self.rows)
+        if index == len(self.closes):
+            self.closes = np.concatenate([self.closes, np.full_like(self.closes, np.nan)])
+        values = np.asarray(closes, dtype=float)[: self.window]
+        # Missing closes carry the last known close forward, like pct_change does.
+        positions = np.where(np.isnan(values), 0, np.arange(len(values)))
+        values = values[np.maximum.accumulate(positions)] if len(values) > 0 else values
+        self.closes[index, : len(values)] = values
+        self.rows.append(row)
+
+    # Returns (in %) of every added result for each of the periods. NaN where
+    # the stock did not have enough candles after the signal date.
+    def returns(self):
+        closes = self.closes[: len(self.rows)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (closes[:, self.periods] / closes[:, [0]] - 1) * 100
+
+    def toDataFrame(self):
+        df = pd.DataFrame(self.rows)
+        returns = self.returns()
+        for index, prd in enumerate(self.periods):
+            df[f"{prd}-Pd"] = returns[:, index]
+        return df.reindex(columns=self.columns(), fill_value="")
+
+    # Colors the numeric -Pd columns for display. Gains are green unless the
+    # strategy was a sell signal, in which case falling prices are the wins.
+    def formatted(df, sellSignal=False):
+        if df is None:
+            return df
+        periodColumns = [
+            col for col in df.columns
+            if str(col).endswith("-Pd") and pd.api.types.is_numeric_dtype(df[col])
+        ]
+        if len(periodColumns) == 0:
+            return df
+        df = df.copy()
+        win, loss = (colorText.FAIL, colorText.GREEN) if sellSignal else (colorText.GREEN, colorText.FAIL)
+        for col in periodColumns:
+            df[col] = [
+                "" if np.isnan(pct) else ((win if pct >= 0 else loss) + "%.2f%%" % pct + colorText.END)
+                for pct in df[col].astype(float)
+            ]
+        return df
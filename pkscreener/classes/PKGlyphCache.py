@@ -0,0 +1,131 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+from PIL import Image, ImageFont
+
+# Stands in for an ImageFont.FreeTypeFont in the report images. Every glyph is
+# rasterized and measured only once per font size, and a line of text is then
+# measured and rendered by placing its glyphs one after the other, the same as
+# FreeType does: the mask of a line is the maximum of the masks of its glyphs.
+# Lines with anything other than whole pixel advances (and so, any layout
+# option other than the defaults) are left to the font itself.
+class PKGlyphCache:
+    fonts = {}
+
+    def __init__(self, font):
+        self.font = font
+        self.glyphs = {}
+
+    # The cache of the glyphs of the given font file and size, shared by all
+    # the reports rendered in this process.
+    def forFont(fontPath, size):
+        key = (fontPath, size)
+        glyphCache = PKGlyphCache.fonts.get(key)
+        if glyphCache is None:
+            glyphCache = PKGlyphCache(ImageFont.truetype(fontPath, size))
+            PKGlyphCache.fonts[key] = glyphCache
+        return glyphCache
+
+    # The mask, its offset, the advance and the bounding box of a character
+    def glyph(self, character):
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            mask, offset = self.font.getmask2(character, "L")
+            width, height = mask.size
+            bitmap = np.frombuffer(bytes(mask), dtype=np.uint8).reshape(height, width) if width * height > 0 else None
+            advance = self.font.getlength(character)
+            glyph = (bitmap, offset, int(advance) if advance.is_integer() else None, self.font.getbbox(character))
+            self.glyphs[character] = glyph
+        return glyph
+
+    # The glyphs of a line of text with the pen position of each one, or None
+    # when the font has to lay the line out itself.
+    def layout(self, text, mode="L", direction=None, features=None, language=None, stroke_width=0, anchor=None, start=None):
+        if (
+            len(text) == 0
+            or mode not in ["", "L"]
+            or direction is not None
+            or features is not None
+            or language is not None
+            or stroke_width != 0
+            or anchor not in [None, "la"]
+            or (start is not None and any(start))
+        ):
+            return None
+        placements = []
+        x = 0
+        for character in text:
+            glyph = self.glyph(character)
+            if glyph[2] is None:
+                return None
+            placements.append((x, glyph))
+            x += glyph[2]
+        return placements, x
+
+    def getbbox(self, text, mode="", direction=None, features=None, language=None, stroke_width=0, anchor=None):
+        lineLayout = self.layout(text, mode, direction, features, language, stroke_width, anchor)
+        if lineLayout is None:
+            return self.font.getbbox(text, mode, direction=direction, features=features, language=language, stroke_width=stroke_width, anchor=anchor)
+        placements, _ = lineLayout
+        return (
+            min(x + bbox[0] for x, (_, _, _, bbox) in placements),
+            min(bbox[1] for _, (_, _, _, bbox) in placements),
+            max(x + bbox[2] for x, (_, _, _, bbox) in placements),
+            max(bbox[3] for _, (_, _, _, bbox) in placements),
+        )
+
+    def getlength(self, text, mode="", direction=None, features=None, language=None):
+        lineLayout = self.layout(text, mode, direction, features, language)
+        if lineLayout is None:
+            return self.font.getlength(text, mode, direction=direction, features=features, language=language)
+        return float(lineLayout[1])
+
+    def getsize(self, text, direction=None, features=None, language=None, stroke_width=0):
+        if self.layout(text, "L", direction, features, language, stroke_width) is None:
+            return self.font.getsize(text, direction=direction, features=features, language=language, stroke_width=stroke_width)
+        left, _, right, bottom = self.getbbox(text)
+        return right - min(0, left), bottom
+
+    def getsize_multiline(self, text, direction=None, spacing=4, features=None, language=None, stroke_width=0):
+        lines = text.split("\n")
+        lineSpacing = self.getsize("A", stroke_width=stroke_width)[1] + spacing
+        maxWidth = max(self.getsize(line, direction=direction, features=features, language=language, stroke_width=stroke_width)[0] for line in lines)
+        return maxWidth, len(lines) * lineSpacing - spacing
+
+    def getmask2(self, text, mode="", direction=None, features=None, language=None, stroke_width=0, anchor=None, ink=0, start=None, *args, **kwargs):
+        lineLayout = self.layout(text, mode, direction, features, language, stroke_width, anchor, start)
+        if lineLayout is None or len(args) > 0 or len(kwargs) > 0:
+            return self.font.getmask2(text, mode, *args, direction=direction, features=features, language=language, stroke_width=stroke_width, anchor=anchor, ink=ink, start=start, **kwargs)
+        placements = [(x + offset[0], offset[1], bitmap) for x, (bitmap, offset, _, _) in lineLayout[0]]
+        left = min(x for x, _, _ in placements)
+        top = min(y for _, y, _ in placements)
+        inked = [(x, y, bitmap) for x, y, bitmap in placements if bitmap is not None]
+        right = max([x + bitmap.shape[1] for x, _, bitmap in inked], default=left)
+        bottom = max([y + bitmap.shape[0] for _, y, bitmap in inked], default=top)
+        mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for x, y, bitmap in inked:
+            region = mask[y - top:y - top + bitmap.shape[0], x - left:x - left + bitmap.shape[1]]
+            np.maximum(region, bitmap, out=region)
+        return Image.fromarray(mask, "L").im, (left, top)
@@ -0,0 +1,440 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes.PKSharedStockData import PKSharedStockData
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
+
+# Computes the indicators of ScreeningStatistics.preprocessData for the whole
+# universe at once, instead of one stock at a time inside each worker.
+# Every symbol becomes one column of a (dates x symbols) matrix. The columns are
+# right-aligned on their own bars (not on calendar dates), so a symbol with a
+# shorter history just has leading NaNs and holidays/suspensions of other
+# symbols never punch holes into its windows. The kernels below reproduce the
+# TA-Lib definitions (seeding, Wilder smoothing, zero-division results) so that
+# the per-stock values are the same as what pktalib would have returned.
+#
+# The results are published into shared memory once by the parent process.
+# preprocessData then just slices the rows of the stock it is working on, as
+# long as the stock's data is (a prefix of) what the engine was built from.
+#
+# In monitor/cron mode the same data comes back every cycle with only the last
+# candle changed (or one more candle added). The building process therefore
+# also keeps the rolling state of every symbol as of its last completed bar:
+# the window sums of the moving averages/VolMA and the Wilder averages of the
+# RSI (EMA values and the CCI/STOCHRSI windows are read back from the matrices).
+# update() then rolls each symbol forward bar by bar in O(1) and only
+# recomputes the full history of symbols whose completed bars have changed.
+class PKIndicatorEngine:
+    INDICATORS = ["SMA", "LMA", "SSMA", "SSMA20", "VolMA", "RSI", "CCI", "FASTK", "FASTD"]
+    REQUIRED_COLUMNS = ["High", "Low", "Close", "Volume"]
+    MOVING_AVERAGE_PERIODS = [50, 200, 9, 20]
+    VOLUME_PERIOD = 20
+    RSI_PERIOD = 14
+    CCI_PERIOD = 14
+    FASTK_PERIOD = 5
+    FASTD_PERIOD = 3
+    # Completed bars a symbol needs before it can be rolled forward instead of
+    # recomputed, i.e. until every indicator is past its warm up period.
+    WARMUP_BARS = 200
+    # Keeps the (rows x symbols x window) temporaries of the CCI bounded
+    CHUNK_SIZE = 256
+
+    def __init__(self, symbols, lengths, useEMA):
+        self.symbols = symbols
+        self.lengths = lengths
+        self.useEMA = useEMA
+        self.blockName = None
+        self._layout = None
+        self._owner = False
+        self._trackerId = None
+        self._shm = None
+        # Only available in the process that built the engine
+        self._inputs = None
+        self._state = None
+        self._columnIndex = {symbol: i for i, symbol in enumerate(symbols)}
+
+    def __getstate__(self):
+        return {
+            "symbols": self.symbols,
+            "lengths": self.lengths,
+            "useEMA": self.useEMA,
+            "blockName": self.blockName,
+            "_layout": self._layout,
+            "_trackerId": self._trackerId,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["symbols"], state["lengths"], state["useEMA"])
+        self.blockName = state["blockName"]
+        self._layout = state["_layout"]
+        self._trackerId = state["_trackerId"]
+        self._shm, arrays = PKSharedStockData.attachBlock(self.blockName, self._layout, trackerId=self._trackerId)
+        self._timestamps, self._close, self._indicators = arrays
+
+    def build(stockDict, useEMA=False):
+        symbols, blocks = PKIndicatorEngine._extract(stockDict)
+        if len(symbols) == 0:
+            return None
+        engine = PKIndicatorEngine(symbols, [len(values) for _, values in blocks], useEMA)
+        engine._setComputed(*PKIndicatorEngine._computeAll(blocks, useEMA))
+        engine.publish()
+        return engine
+
+    def _extract(stockDict):
+        symbols = []
+        blocks = []
+        isStore = isinstance(stockDict, PKStockDataStore)
+        for symbol in list(stockDict.keys()):
+            stored = stockDict.columnValues(symbol, PKIndicatorEngine.REQUIRED_COLUMNS) if isStore else None
+            if stored is not None:
+                timestamps, values = stored
+            else:
+                splitDict = stockDict.get(symbol)
+                try:
+                    stockColumns = list(splitDict["columns"])
+                    values = np.asarray(splitDict["data"], dtype=np.float64)
+                    values = values[:, [stockColumns.index(col) for col in PKIndicatorEngine.REQUIRED_COLUMNS]]
+                    index = pd.DatetimeIndex(splitDict["index"])
+                    timestamps = index.asi8 if index.tz is None else index.tz_convert("UTC").asi8
+                except Exception as e:
+                    default_logger().debug(e, exc_info=True)
+                    continue
+            if len(values) == 0 or len(timestamps) != len(values) or not np.isfinite(values).all():
+                # preprocessData would have to drop or keep NaN rows. Let it do so.
+                continue
+            symbols.append(symbol)
+            blocks.append((timestamps, values))
+        return symbols, blocks
+
+    # Right-aligns the blocks into (timestamps, high, low, close, volume) matrices
+    def _alignInputs(blocks, totalRows):
+        timestamps = np.zeros((totalRows, len(blocks)), dtype=np.int64)
+        inputs = np.full((4, totalRows, len(blocks)), np.nan)
+        for i, (stockTimestamps, values) in enumerate(blocks):
+            start = totalRows - len(values)
+            timestamps[start:, i] = stockTimestamps
+            inputs[:, start:, i] = values.T
+        return timestamps, inputs
+
+    def _computeAll(blocks, useEMA):
+        totalRows = max(len(values) for _, values in blocks)
+        timestamps, inputs = PKIndicatorEngine._alignInputs(blocks, totalRows)
+        high, low, close, volume = inputs
+        starts = PKIndicatorEngine.startRows(close)
+        indicators = np.full((totalRows, len(blocks), len(PKIndicatorEngine.INDICATORS)), np.nan)
+        movingAverage = PKIndicatorEngine.ema if useEMA else PKIndicatorEngine.sma
+        for i, period in enumerate(PKIndicatorEngine.MOVING_AVERAGE_PERIODS):
+            indicators[:, :, i] = movingAverage(close, period, starts)
+        indicators[:, :, 4] = PKIndicatorEngine.sma(volume, PKIndicatorEngine.VOLUME_PERIOD, starts)
+        averageGains, averageLosses = PKIndicatorEngine.wilderAverages(close, PKIndicatorEngine.RSI_PERIOD, starts)
+        rsi = PKIndicatorEngine.rsiFromAverages(averageGains, averageLosses)
+        indicators[:, :, 5] = rsi
+        indicators[:, :, 6] = PKIndicatorEngine.cci(high, low, close, PKIndicatorEngine.CCI_PERIOD)
+        indicators[:, :, 7], indicators[:, :, 8] = PKIndicatorEngine.stochRsi(
+            rsi, PKIndicatorEngine.RSI_PERIOD, PKIndicatorEngine.FASTK_PERIOD, PKIndicatorEngine.FASTD_PERIOD, starts
+        )
+        # Rolling state as of the last completed bar (the last bar may still be forming)
+        lastCompleted = totalRows - 2
+        sums = np.full((len(PKIndicatorEngine.MOVING_AVERAGE_PERIODS) + 1, len(blocks)), np.nan)
+        if lastCompleted >= 0:
+            windows = [(close, period) for period in PKIndicatorEngine.MOVING_AVERAGE_PERIODS]
+            windows.append((volume, PKIndicatorEngine.VOLUME_PERIOD))
+            for i, (values, period) in enumerate(windows):
+                if lastCompleted + 1 >= period:
+                    sums[i] = values[lastCompleted + 1 - period:lastCompleted + 1].sum(axis=0)
+            state = {"sums": sums, "averageGains": averageGains[lastCompleted].copy(), "averageLosses": averageLosses[lastCompleted].copy()}
+        else:
+            state = {"sums": sums, "averageGains": np.full(len(blocks), np.nan), "averageLosses": np.full(len(blocks), np.nan)}
+        return timestamps, inputs, indicators, state
+
+    def _setComputed(self, timestamps, inputs, indicators, state):
+        self._timestamps = timestamps
+        self._inputs = inputs
+        self._close = inputs[2]
+        self._indicators = indicators
+        self._state = state
+
+    # Copies the results into a new shared memory block for the workers
+    def publish(self):
+        self.unlink()
+        self.blockName, self._layout = PKSharedStockData.createBlock([self._timestamps, self._close, self._indicators])
+        self._shm, _ = PKSharedStockData.attachBlock(self.blockName, self._layout, owner=True)
+        self._owner = True
+        self._trackerId = PKSharedStockData.trackerId()
+
+    # Brings the engine up to date with a refreshed universe. Returns None if
+    # nothing in stockDict could be used.
+    def update(self, stockDict):
+        if self._inputs is None:
+            raise ValueError("Only the process that built the engine can update it")
+        symbols, blocks = PKIndicatorEngine._extract(stockDict)
+        if len(symbols) == 0:
+            self.unlink()
+            return None
+        lengths = [len(values) for _, values in blocks]
+        totalRows = max(lengths)
+        timestamps, inputs = PKIndicatorEngine._alignInputs(blocks, totalRows)
+        indicators = np.full((totalRows, len(symbols), len(PKIndicatorEngine.INDICATORS)), np.nan)
+        state = {
+            "sums": np.full((len(PKIndicatorEngine.MOVING_AVERAGE_PERIODS) + 1, len(symbols)), np.nan),
+            "averageGains": np.full(len(symbols), np.nan),
+            "averageLosses": np.full(len(symbols), np.nan),
+        }
+        oldRows = self._timestamps.shape[0]
+        newLengths = np.array(lengths, dtype=np.int64)
+        oldColumns = np.array([self._columnIndex.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+        oldLengths = np.where(oldColumns >= 0, np.array(self.lengths, dtype=np.int64)[oldColumns], 0)
+        completedBars = oldLengths - 1
+        canRoll = (oldColumns >= 0) & (completedBars >= PKIndicatorEngine.WARMUP_BARS) & (newLengths > completedBars)
+        # Completed bars keep their rows relative to each other. They only move
+        # down by the number of rows the matrices grew, less the bars each symbol got.
+        shifts = (totalRows - newLengths) - (oldRows - oldLengths)
+        rowRanges = {}
+        for shift in np.unique(shifts[canRoll]):
+            selected = np.flatnonzero(canRoll & (shifts == shift))
+            target = slice(max(0, shift), oldRows - 1 + shift)
+            source = slice(max(0, -shift), oldRows - 1)
+            rowRanges[shift] = (target, source)
+            # The completed bars must not have changed (e.g. adjusted for corporate
+            # actions or back-filled). Rows above each symbol are padding on both sides.
+            sameTimestamps = (timestamps[target][:, selected] == self._timestamps[source][:, oldColumns[selected]]).all(axis=0)
+            newInputs = inputs[:, target][:, :, selected]
+            oldInputs = self._inputs[:, source][:, :, oldColumns[selected]]
+            sameInputs = ((newInputs == oldInputs) | (np.isnan(newInputs) & np.isnan(oldInputs))).all(axis=(0, 1))
+            canRoll[selected] = sameTimestamps & sameInputs
+        recompute = np.flatnonzero(~canRoll)
+        if len(recompute) > 0:
+            _, _, subIndicators, subState = PKIndicatorEngine._computeAll([blocks[column] for column in recompute], self.useEMA)
+            indicators[totalRows - subIndicators.shape[0]:, recompute] = subIndicators
+            for key in state.keys():
+                state[key][..., recompute] = subState[key]
+        columns = np.flatnonzero(canRoll)
+        if len(columns) > 0:
+            for shift, (target, source) in rowRanges.items():
+                selected = columns[shifts[columns] == shift]
+                indicators[target, selected] = self._indicators[source, oldColumns[selected]]
+            for key in state.keys():
+                state[key][..., columns] = self._state[key][..., oldColumns[columns]]
+            PKIndicatorEngine._rollForward(
+                inputs, indicators, state, columns, totalRows - newLengths[columns] + completedBars[columns], newLengths[columns] - completedBars[columns], self.useEMA
+            )
+        self.symbols = symbols
+        self.lengths = lengths
+        self._columnIndex = {symbol: i for i, symbol in enumerate(symbols)}
+        self._setComputed(timestamps, inputs, indicators, state)
+        self.publish()
+        return self
+
+    # Computes `steps` bars for each of the columns, starting at firstRows. All
+    # but the last bar of each symbol are completed and advance its state.
+    def _rollForward(inputs, indicators, state, columns, firstRows, steps, useEMA):
+        high, low, close, volume = inputs
+        sums = state["sums"]
+        averageGains = state["averageGains"]
+        averageLosses = state["averageLosses"]
+        rsiPeriod = PKIndicatorEngine.RSI_PERIOD
+        cciOffsets = np.arange(1 - PKIndicatorEngine.CCI_PERIOD, 1)[:, None]
+        fastkOffsets = np.arange(1 - PKIndicatorEngine.FASTK_PERIOD, 1)[:, None]
+        fastdOffsets = np.arange(1 - PKIndicatorEngine.FASTD_PERIOD, 1)[:, None]
+        for step in range(int(steps.max())):
+            active = steps > step
+            cols = columns[active]
+            rows = firstRows[active] + step
+            isCompleted = step < steps[active] - 1
+            price = close[rows, cols]
+            newSums = np.empty((sums.shape[0], len(cols)))
+            for i, period in enumerate(PKIndicatorEngine.MOVING_AVERAGE_PERIODS):
+                newSums[i] = sums[i, cols] + price - close[rows - period, cols]
+                if useEMA:
+                    previous = indicators[rows - 1, cols, i]
+                    indicators[rows, cols, i] = (price - previous) * (2.0 / (period + 1)) + previous
+                else:
+                    indicators[rows, cols, i] = newSums[i] / period
+            newSums[-1] = sums[-1, cols] + volume[rows, cols] - volume[rows - PKIndicatorEngine.VOLUME_PERIOD, cols]
+            indicators[rows, cols, 4] = newSums[-1] / PKIndicatorEngine.VOLUME_PERIOD
+            change = price - close[rows - 1, cols]
+            newGains = (averageGains[cols] * (rsiPeriod - 1) + np.where(change > 0, change, 0.0)) / rsiPeriod
+            newLosses = (averageLosses[cols] * (rsiPeriod - 1) + np.where(change < 0, -change, 0.0)) / rsiPeriod
+            indicators[rows, cols, 5] = PKIndicatorEngine.rsiFromAverages(newGains, newLosses)
+            windowRows = rows + cciOffsets
+            typicalPrice = (high[windowRows, cols] + low[windowRows, cols] + close[windowRows, cols]) / 3
+            average = typicalPrice.sum(axis=0) / PKIndicatorEngine.CCI_PERIOD
+            meanDeviation = np.abs(typicalPrice - average).sum(axis=0) / PKIndicatorEngine.CCI_PERIOD
+            deviation = typicalPrice[-1] - average
+            with np.errstate(invalid="ignore", divide="ignore"):
+                indicators[rows, cols, 6] = np.where((deviation != 0) & (meanDeviation != 0), deviation / (0.015 * meanDeviation), 0.0)
+                rsiWindow = indicators[rows + fastkOffsets, cols, 5]
+                lowest = rsiWindow.min(axis=0)
+                highest = rsiWindow.max(axis=0)
+                indicators[rows, cols, 7] = np.where(highest - lowest != 0, (rsiWindow[-1] - lowest) / (highest - lowest) * 100, 0.0)
+            indicators[rows, cols, 8] = indicators[rows + fastdOffsets, cols, 7].sum(axis=0) / PKIndicatorEngine.FASTD_PERIOD
+            completedCols = cols[isCompleted]
+            sums[:, completedCols] = newSums[:, isCompleted]
+            averageGains[completedCols] = newGains[isCompleted]
+            averageLosses[completedCols] = newLosses[isCompleted]
+
+    # The last `count` closes and volumes (count x symbols, NaN above the start
+    # of a shorter history) and the latest VolMA of every symbol. None outside
+    # the process that built the engine.
+    def latestBars(self, count):
+        if self._inputs is None:
+            return None
+        return self._inputs[2, -count:], self._inputs[3, -count:], self._indicators[-1, :, 4]
+
+    # Returns a (len(data) x len(INDICATORS)) view or None if the engine
+    # does not hold exactly these rows for the given stock.
+    def indicatorsFor(self, stock, data, useEMA=False):
+        column = self._columnIndex.get(stock)
+        if column is None or useEMA != self.useEMA or not isinstance(data.index, pd.DatetimeIndex):
+            return None
+        rows = len(data)
+        length = self.lengths[column]
+        if rows == 0 or rows > length:
+            return None
+        start = self._timestamps.shape[0] - length
+        timestamps = self._timestamps[start:start + rows, column]
+        if data.index[0].value != timestamps[0] or data.index[-1].value != timestamps[-1]:
+            return None
+        if data["Close"].iloc[-1] != self._close[start + rows - 1, column]:
+            # Same candle, but refreshed (e.g. during trading hours)
+            return None
+        return self._indicators[start:start + rows, column, :]
+
+    # Detaches from the shared memory block (workers)
+    def close(self):
+        if self._shm is not None:
+            if not self._owner:
+                self._timestamps = self._close = self._indicators = None
+            try:
+                self._shm.close()
+            except BufferError as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+            self._shm = None
+
+    # Removes the shared memory block. The building process keeps its own
+    # copy of the results and the state, so it can still update() later.
+    def unlink(self):
+        if self._owner and self._shm is not None:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:  # pragma: no cover
+                pass
+        self.close()
+
+    def startRows(values):
+        valid = ~np.isnan(values)
+        return np.where(valid.any(axis=0), valid.argmax(axis=0), values.shape[0])
+
+    def _maskBefore(values, firstRows):
+        values[np.arange(values.shape[0])[:, None] < firstRows] = np.nan
+        return values
+
+    def sma(values, period, starts):
+        totalRows, numSymbols = values.shape
+        cumulative = np.vstack([np.zeros((1, numSymbols)), np.cumsum(np.nan_to_num(values), axis=0)])
+        result = np.full((totalRows, numSymbols), np.nan)
+        if totalRows >= period:
+            result[period - 1:] = (cumulative[period:] - cumulative[:-period]) / period
+        return PKIndicatorEngine._maskBefore(result, starts + period - 1)
+
+    # Seeded with the SMA of the first period values, like TA-Lib
+    def ema(values, period, starts):
+        k = 2.0 / (period + 1)
+        seeds = PKIndicatorEngine.sma(values, period, starts)
+        seedRows = starts + period - 1
+        result = np.full(values.shape, np.nan)
+        previous = np.full(values.shape[1], np.nan)
+        for row in range(values.shape[0]):
+            previous = np.where(seedRows == row, seeds[row], (values[row] - previous) * k + previous)
+            result[row] = previous
+        return result
+
+    # Wilder's average gain/loss, seeded with the simple average of the first period changes
+    def wilderAverages(values, period, starts):
+        changes = np.diff(values, axis=0, prepend=np.nan)
+        gains = np.where(changes > 0, changes, 0.0)
+        losses = np.where(changes < 0, -changes, 0.0)
+        missing = np.isnan(changes)
+        gains[missing] = losses[missing] = np.nan
+        seedGains = PKIndicatorEngine.sma(gains, period, starts + 1)
+        seedLosses = PKIndicatorEngine.sma(losses, period, starts + 1)
+        firstRows = starts + period
+        averageGains = np.full(values.shape, np.nan)
+        averageLosses = np.full(values.shape, np.nan)
+        previousGain = np.full(values.shape[1], np.nan)
+        previousLoss = np.full(values.shape[1], np.nan)
+        for row in range(values.shape[0]):
+            isFirst = firstRows == row
+            previousGain = np.where(isFirst, seedGains[row], (previousGain * (period - 1) + gains[row]) / period)
+            previousLoss = np.where(isFirst, seedLosses[row], (previousLoss * (period - 1) + losses[row]) / period)
+            averageGains[row] = previousGain
+            averageLosses[row] = previousLoss
+        return averageGains, averageLosses
+
+    def rsiFromAverages(averageGains, averageLosses):
+        total = averageGains + averageLosses
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = np.where(total != 0, 100 * averageGains / total, 0.0)
+        result[np.isnan(averageGains)] = np.nan
+        return result
+
+    def rsi(values, period, starts):
+        return PKIndicatorEngine.rsiFromAverages(*PKIndicatorEngine.wilderAverages(values, period, starts))
+
+    def cci(high, low, close, period):
+        typicalPrice = (high + low + close) / 3
+        result = np.full(close.shape, np.nan)
+        if close.shape[0] < period:
+            return result
+        for chunkStart in range(0, close.shape[1], PKIndicatorEngine.CHUNK_SIZE):
+            chunk = slice(chunkStart, chunkStart + PKIndicatorEngine.CHUNK_SIZE)
+            windows = sliding_window_view(typicalPrice[:, chunk], period, axis=0)
+            average = windows.sum(axis=-1) / period
+            meanDeviation = np.abs(windows - average[..., None]).sum(axis=-1) / period
+            deviation = typicalPrice[period - 1:, chunk] - average
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = np.where((deviation != 0) & (meanDeviation != 0), deviation / (0.015 * meanDeviation), 0.0)
+            values[np.isnan(average)] = np.nan
+            result[period - 1:, chunk] = values
+        return result
+
+    # TA-Lib's STOCHRSI: fast stochastic of the RSI. FASTK starts together with FASTD.
+    def stochRsi(rsi, period, fastkPeriod, fastdPeriod, starts):
+        lowest = np.full(rsi.shape, np.nan)
+        highest = np.full(rsi.shape, np.nan)
+        if rsi.shape[0] >= fastkPeriod:
+            windows = sliding_window_view(rsi, fastkPeriod, axis=0)
+            lowest[fastkPeriod - 1:] = windows.min(axis=-1)
+            highest[fastkPeriod - 1:] = windows.max(axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fastk = np.where(highest - lowest != 0, (rsi - lowest) / (highest - lowest) * 100, 0.0)
+        fastk[np.isnan(lowest)] = np.nan
+        fastd = PKIndicatorEngine.sma(fastk, fastdPeriod, starts + period + fastkPeriod - 1)
+        fastk = PKIndicatorEngine._maskBefore(fastk, starts + period + fastkPeriod + fastdPeriod - 2)
+        return fastk, fastd
@@ -0,0 +1,296 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import warnings
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# The Lorentzian classification of advanced_ta (with the default settings that
+# ScreeningStatistics.validateLorentzian has always used), reduced to what the
+# latest bar needs: whether it is a new buy or sell signal.
+#
+# The signal of a bar is the sign of the model's prediction for it, if the
+# volatility and regime filters let it through, or else the signal of the bar
+# before. So nothing else is needed when the filters stop the latest bar. The
+# prediction is the sum of the labels of the last NEIGHBORS_COUNT neighbours
+# kept in a ring buffer that carries over from one bar to the next, so the
+# nearest neighbour search still has to run over every bar. It jumps from one
+# neighbour to the next instead of visiting every bar of the history.
+#
+# Every symbol is a column of a (bars x symbols) matrix, so that many symbols
+# with as many bars can be classified together. The features and filters
+# follow the ta library's definitions operation for operation (including
+# their seeds and quirks), so the signals are the same as advanced_ta's.
+class PKLorentzianClassifier:
+    BUY = 1
+    SELL = -1
+    # (kind, length, smoothing length) of the features
+    FEATURES = [("RSI", 14, 2), ("WT", 10, 11), ("CCI", 20, 2), ("ADX", 20, 2), ("RSI", 9, 2)]
+    NEIGHBORS_COUNT = 8
+    MAX_BARS_BACK = 2000
+    # The regime filter compares the slope of the price with its EMA over this
+    # many bars, which needs as many bars to warm up. There cannot be a signal
+    # on a shorter history.
+    REGIME_PERIOD = 200
+    REGIME_THRESHOLD = -0.1
+    VOLATILITY_PERIODS = (1, 10)
+    # Rows of the distance matrix computed at a time
+    CHUNK_SIZE = 256
+
+    # The new signal (BUY, SELL or 0) of the latest bar of a stock's data
+    # (sorted with the latest bar first, as the screeners get it)
+    def latestSignal(df):
+        return PKLorentzianClassifier.latestSignals({"": df})[""]
+
+    # The new signals of the latest bars of many stocks, by symbol. Symbols
+    # with the same number of bars are classified together.
+    def latestSignals(dataFrames):
+        signals = {}
+        symbolsByLength = {}
+        for symbol, df in dataFrames.items():
+            signals[symbol] = 0
+            if df is None or len(df) < PKLorentzianClassifier.REGIME_PERIOD:
+                continue
+            symbolsByLength.setdefault(len(df), []).append(symbol)
+        for symbols in symbolsByLength.values():
+            prices = {
+                column: np.column_stack([dataFrames[symbol][column].to_numpy(dtype=float)[::-1] for symbol in symbols])
+                for column in ["Open", "High", "Low", "Close"]
+            }
+            for symbol, signal in zip(symbols, PKLorentzianClassifier.signalsOf(**prices)):
+                signals[symbol] = signal
+        return signals
+
+    # The new signals of the latest bar of every column of the (chronological)
+    # price matrices
+    def signalsOf(Open, High, Low, Close):
+        signals = np.zeros(Close.shape[1], dtype=int)
+        with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            finite = np.isfinite(Open).all(axis=0) & np.isfinite(High).all(axis=0) & np.isfinite(Low).all(axis=0) & np.isfinite(Close).all(axis=0)
+            filters = PKLorentzianClassifier.volatilityFilter(High, Low, Close) & PKLorentzianClassifier.regimeFilter(Open, High, Low, Close)
+            columns = np.flatnonzero(finite & filters[-1])
+            if len(columns) == 0:
+                return signals
+            features, valid = PKLorentzianClassifier.featuresOf(High[:, columns], Low[:, columns], Close[:, columns])
+            for featureColumn, column in enumerate(columns):
+                if not valid[featureColumn]:
+                    continue
+                predictions = PKLorentzianClassifier.predictionsOf(features[:, :, featureColumn], Close[:, column])
+                signals[column] = PKLorentzianClassifier.newSignalOf(predictions, filters[:, column])
+        return signals
+
+    # The signal of the latest bar, if it differs from the one before
+    def newSignalOf(predictions, filter):
+        if not filter[-1] or predictions[-1] == 0:
+            return 0
+        signal = int(np.sign(predictions[-1]))
+        determined = np.flatnonzero(filter[:-1] & (predictions[:-1] != 0))
+        previousSignal = int(np.sign(predictions[determined[-1]])) if len(determined) > 0 else 0
+        return signal if signal != previousSignal else 0
+
+    # Approximate nearest neighbours with the Lorentzian distance: for every
+    # bar, the bars of the history (but every 4th) are visited in order and a
+    # bar becomes a neighbour when it is at least as far as the last one
+    # taken, or as the one 3/4 into the ring buffer once that is full.
+    def predictionsOf(features, close):
+        numBars = len(close)
+        maxBarsBack = PKLorentzianClassifier.MAX_BARS_BACK
+        neighborsCount = PKLorentzianClassifier.NEIGHBORS_COUNT
+        maxBarsBackIndex = max(numBars - maxBarsBack, 0)
+        size = numBars - maxBarsBackIndex
+        pastClose = PKLorentzianClassifier.shifted(close, 4)
+        labels = np.where(pastClose < close, -1, np.where(pastClose > close, 1, 0))
+        predictions = np.zeros(numBars, dtype=int)
+        distances = deque()
+        neighbours = deque()
+        for chunkStart in range(maxBarsBackIndex, numBars, PKLorentzianClassifier.CHUNK_SIZE):
+            bars = np.arange(chunkStart, min(chunkStart + PKLorentzianClassifier.CHUNK_SIZE, numBars))
+            chunk = np.zeros((len(bars), size))
+            for feature in features:
+                chunk += np.log(1 + np.abs(feature[bars].reshape(-1, 1) - feature[:size].reshape(1, -1)))
+            chunk[:, ::4] = -np.inf
+            for row, bar in zip(chunk, bars):
+                row = row[:min(maxBarsBack, bar + 1)]
+                lastDistance = -1.0
+                start = 0
+                while start < len(row):
+                    neighbour = start + int(np.argmax(row[start:] >= lastDistance))
+                    if not row[neighbour] >= lastDistance:
+                        break
+                    lastDistance = row[neighbour]
+                    distances.append(lastDistance)
+                    neighbours.append(labels[neighbour])
+                    if len(neighbours) > neighborsCount:
+                        lastDistance = distances[round(neighborsCount * 3 / 4)]
+                        distances.popleft()
+                        neighbours.popleft()
+                    start = neighbour + 1
+                predictions[bar] = sum(neighbours)
+        return predictions
+
+    # The normalized features as a (features x bars x symbols) array, and
+    # whether they could be normalized for each symbol
+    def featuresOf(High, Low, Close):
+        features = []
+        valid = np.ones(Close.shape[1], dtype=bool)
+        for kind, length, smoothing in PKLorentzianClassifier.FEATURES:
+            if kind == "RSI":
+                feature = PKLorentzianClassifier.ema(PKLorentzianClassifier.rsi(Close, length), smoothing) / 100
+            elif kind == "WT":
+                hlc3 = (High + Low + Close) / 3
+                ema1 = PKLorentzianClassifier.ema(hlc3, length)
+                ema2 = PKLorentzianClassifier.ema(np.abs(hlc3 - ema1), length)
+                wt1 = PKLorentzianClassifier.ema((hlc3 - ema1) / (0.015 * ema2), smoothing)
+                feature = PKLorentzianClassifier.normalize(wt1 - PKLorentzianClassifier.sma(wt1, 4))
+            elif kind == "CCI":
+                feature = PKLorentzianClassifier.normalize(PKLorentzianClassifier.ema(PKLorentzianClassifier.cci(High, Low, Close, length), smoothing))
+            else:
+                feature = PKLorentzianClassifier.adx(High, Low, Close, length) / 100
+            valid &= ~np.isinf(feature).any(axis=0)
+            features.append(feature)
+        return np.array(features), valid
+
+    def volatilityFilter(High, Low, Close):
+        recent, historical = PKLorentzianClassifier.VOLATILITY_PERIODS
+        trueRange = PKLorentzianClassifier.trueRange(High, Low, Close)
+        return PKLorentzianClassifier.atr(trueRange, recent) > PKLorentzianClassifier.atr(trueRange, historical)
+
+    # Whether the slope of a Kalman-like filter of the price has not declined
+    # much below its average
+    def regimeFilter(Open, High, Low, Close):
+        source = (Open + High + Low + Close) / 4
+        barRange = High - Low
+        flat = barRange == 0
+        priceChanges = 0.2 * (source - np.vstack([source[:1], source[:-1]]))
+        ranges = 0.1 * barRange
+        value1 = PKLorentzianClassifier.recurrence(lambda previous, change, isFlat: PKLorentzianClassifier.select(isFlat, 0.0, change + 0.8 * previous), priceChanges, flat)
+        value2 = PKLorentzianClassifier.recurrence(lambda previous, barRange, isFlat: PKLorentzianClassifier.select(isFlat, 0.0, barRange + 0.8 * previous), ranges, flat)
+        omega = np.nan_to_num(np.abs(np.divide(value1, value2)))
+        alpha = (-(omega ** 2) + np.sqrt((omega ** 4) + 16 * (omega ** 2))) / 8
+        klmf = PKLorentzianClassifier.recurrence(lambda previous, weighted, weight: weighted + weight * previous, alpha * source, 1 - alpha)
+        absCurveSlope = np.abs(np.diff(klmf, axis=0, prepend=0.0))
+        averageSlope = PKLorentzianClassifier.ema(absCurveSlope, PKLorentzianClassifier.REGIME_PERIOD)
+        return (absCurveSlope - averageSlope) / averageSlope >= PKLorentzianClassifier.REGIME_THRESHOLD
+
+    def trueRange(High, Low, Close):
+        previousClose = PKLorentzianClassifier.shifted(Close, 1)
+        return np.fmax(np.fmax(High - Low, np.abs(High - previousClose)), np.abs(Low - previousClose))
+
+    # Wilder's average, seeded with the mean of the first bars
+    def atr(trueRange, length):
+        seed = PKLorentzianClassifier.columnMeans(trueRange[:length])
+        averages = PKLorentzianClassifier.recurrence(lambda previous, value: (previous * (length - 1) + value) / float(length), trueRange[length:], initial=seed)
+        return np.vstack([np.zeros((length - 1, trueRange.shape[1])), seed.reshape(1, -1), averages])
+
+    def rsi(Close, length):
+        change = Close - PKLorentzianClassifier.shifted(Close, 1)
+        gains = PKLorentzianClassifier.ewm(np.where(change > 0, change, 0.0), alpha=1 / length, min_periods=length)
+        losses = PKLorentzianClassifier.ewm(-np.where(change < 0, change, 0.0), alpha=1 / length, min_periods=length)
+        return np.where(losses == 0, 100, 100 - (100 / (1 + gains / losses)))
+
+    def cci(High, Low, Close, length):
+        typicalPrice = (High + Low + Close) / 3.0
+        windows = sliding_window_view(np.ascontiguousarray(typicalPrice.T), length, axis=1)
+        meanDeviation = np.mean(np.abs(windows - np.mean(windows, axis=2, keepdims=True)), axis=2).T
+        meanDeviation = np.vstack([np.full((length - 1, Close.shape[1]), np.nan), meanDeviation])
+        return (typicalPrice - PKLorentzianClassifier.sma(typicalPrice, length)) / (0.015 * meanDeviation)
+
+    # The ADX as the ta library computes it: true range and directional
+    # movements summed from the 2nd bar and then smoothed (but for the very
+    # last bar, which the ta library leaves at 0), and the ADX seeded with the
+    # mean of the first directional indices
+    def adx(High, Low, Close, length):
+        previousClose = PKLorentzianClassifier.shifted(Close, 1)
+        trueRange = np.maximum(High, previousClose) - np.minimum(Low, previousClose)
+        upMove = High - PKLorentzianClassifier.shifted(High, 1)
+        downMove = PKLorentzianClassifier.shifted(Low, 1) - Low
+        plusMove = np.abs(((upMove > downMove) & (upMove > 0)) * upMove)
+        minusMove = np.abs(((downMove > upMove) & (downMove > 0)) * downMove)
+        smoothed = []
+        for movement in [trueRange, plusMove, minusMove]:
+            seed = PKLorentzianClassifier.columnSums(movement[1:length + 1])
+            values = PKLorentzianClassifier.recurrence(lambda previous, value: previous - previous / float(length) + value, movement[length + 1:], initial=seed)
+            smoothed.append(np.vstack([seed.reshape(1, -1), values, np.zeros((1, Close.shape[1]))]))
+        trs, plusDM, minusDM = smoothed
+        plusDI = np.where(trs != 0, 100 * (plusDM / trs), 0)
+        minusDI = np.where(trs != 0, 100 * (minusDM / trs), 0)
+        directionalIndex = np.where(plusDI + minusDI != 0, 100 * np.abs((plusDI - minusDI) / (plusDI + minusDI)), 0)
+        seed = PKLorentzianClassifier.columnMeans(directionalIndex[:length])
+        values = PKLorentzianClassifier.recurrence(lambda previous, value: ((previous * (length - 1)) + value) / float(length), directionalIndex[length:-1], initial=seed)
+        return np.vstack([np.zeros((2 * length - 1, Close.shape[1])), seed.reshape(1, -1), values])
+
+    # Rescales every column into [0, 1] (as sklearn's MinMaxScaler does)
+    def normalize(values):
+        minimum = np.nanmin(values, axis=0)
+        valueRange = np.nanmax(values, axis=0) - minimum
+        scale = 1 / np.where(valueRange < 10 * np.finfo(float).eps, 1.0, valueRange)
+        return values * scale + (0 - minimum * scale)
+
+    def ema(values, length):
+        return PKLorentzianClassifier.ewm(values, span=length, min_periods=length)
+
+    def ewm(values, **kwargs):
+        return pd.DataFrame(values).ewm(adjust=False, **kwargs).mean().to_numpy()
+
+    def sma(values, length):
+        return pd.DataFrame(values).rolling(length, min_periods=length).mean().to_numpy()
+
+    def shifted(values, periods):
+        padding = np.full((periods,) + values.shape[1:], np.nan)
+        return np.concatenate([padding, values[:-periods]])
+
+    # Sums and means down the columns, each summed on its own the way pandas
+    # and numpy sum a single series
+    def columnSums(values):
+        return np.array([column.sum() for column in values.T])
+
+    def columnMeans(values):
+        return np.array([column.mean() for column in values.T])
+
+    # Runs step(previous, *row) down the rows of the matrices (starting from
+    # the initial row, which is not part of the result). A single column is
+    # run on plain floats, which is much faster than on arrays of one element
+    # and gives the same results.
+    def recurrence(step, *matrices, initial=None):
+        numColumns = matrices[0].shape[1]
+        if numColumns == 1:
+            rows = zip(*[matrix[:, 0].tolist() for matrix in matrices])
+            previous = 0.0 if initial is None else float(initial[0])
+        else:
+            rows = zip(*matrices)
+            previous = np.zeros(numColumns) if initial is None else initial
+        values = []
+        for row in rows:
+            previous = step(previous, *row)
+            values.append(previous)
+        return np.array(values, dtype=float).reshape(-1, numColumns)
+
+    def select(condition, whenTrue, whenFalse):
+        if isinstance(condition, (bool, np.bool_)):
+            return whenTrue if condition else whenFalse
+        return np.where(condition, whenTrue, whenFalse)
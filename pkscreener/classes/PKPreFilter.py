@@ -0,0 +1,76 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+
+# Evaluates the basic checks of StockScreener (performBasicLTPChecks and
+# performBasicVolumeChecks) on the latest candles of the whole universe at
+# once, so that the stocks that would fail them are not even queued to the
+# workers. The checks run on the same arrays the PKIndicatorEngine was built
+# from, so they only apply to stocks screened off the cached data.
+#
+# The workers compare rounded values ("%.1f" % change, round(ltp, 2) etc.).
+# Values that are within that rounding of a limit are therefore let through
+# and the workers make the final call on them.
+class PKPreFilter:
+    STAGE_TWO_BARS = 250
+    LTP_ROUNDING = 0.005
+    CHANGE_ROUNDING = 0.05
+
+    def rejectedSymbols(engine, configManager, executeOption, exchangeName="INDIA", volumeRatio=2.5):
+        bars = engine.latestBars(PKPreFilter.STAGE_TWO_BARS) if engine is not None else None
+        if bars is None:
+            return set()
+        closes, volumes, volumeMA = bars
+        ltp = closes[-1]
+        previous = closes[-2] if len(closes) > 1 else np.full_like(ltp, np.nan)
+        rejected = np.zeros(len(ltp), dtype=bool)
+        # ScreeningStatistics.validateLTP
+        minLTP = configManager.minLTP if exchangeName == "INDIA" else configManager.minLTP/80
+        rejected |= (ltp < minLTP - PKPreFilter.LTP_ROUNDING) | (ltp > configManager.maxLTP + PKPreFilter.LTP_ROUNDING)
+        minChange = configManager.minimumChangePercentage
+        if minChange != 0:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                change = (ltp / previous - 1) * 100
+            # A rise from 0 is reported as no change. 0 to 0 or a stock with only
+            # one candle has no change at all and never satisfies the filter.
+            change = np.where(np.isinf(change), 0, change)
+            rejected |= np.isnan(change) | (change < minChange - PKPreFilter.CHANGE_ROUNDING)
+        if configManager.stageTwo and executeOption > 0:
+            hasYearlyData = np.array(engine.lengths) > PKPreFilter.STAGE_TWO_BARS
+            # All of the last 250 closes are there for the stocks that have more
+            yearlyLow = closes.min(axis=0)
+            yearlyHigh = closes.max(axis=0)
+            rejected |= hasYearlyData & (ltp < 2 * yearlyLow - PKPreFilter.LTP_ROUNDING) & (ltp < 0.75 * yearlyHigh - PKPreFilter.LTP_ROUNDING)
+        # ScreeningStatistics.validateVolume
+        if executeOption > 0:
+            minVolume = configManager.minVolume / (100 if configManager.isIntradayConfig() else 1)
+            volume = np.nan_to_num(volumes[-1])
+            volumeMA = np.nan_to_num(volumeMA)
+            rejected |= (volumeMA < minVolume) & (volume < minVolume)
+            if executeOption == 9:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    ratio = volume / volumeMA
+                rejected |= (volumeMA == 0) | (ratio < volumeRatio - PKPreFilter.LTP_ROUNDING)
+        return {symbol for symbol, isRejected in zip(engine.symbols, rejected) if isRejected}
@@ -0,0 +1,172 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import hashlib
+import os
+import pickle
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes import VERSION
+from pkscreener.classes.PKScanRecord import PKScanRecord
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
+
+# Results of screenStocks by stock, latest candle, scan options and config. A
+# stock whose latest candle hasn't changed since it was last screened the same
+# way gets the same result (found or not), so repeated scans (rotating monitors,
+# bot users asking for the popular options, -e reruns) skip its indicators.
+# Every StockScreener keeps the most recently used MAX_ENTRIES results. When
+# the PKSCREENER_RESULT_CACHE environment variable points to a directory (see
+# --resultcache), they are also saved there, one file per result, for the
+# other workers and the later runs.
+class PKResultCache:
+    ENVIRONMENT_KEY = "PKSCREENER_RESULT_CACHE"
+    MAX_ENTRIES = 10000
+    # Saved results are only ever reused on the day of their candle or so
+    MAX_DISK_AGE_DAYS = 7
+    FILE_EXTENSION = ".pkres"
+    # These depend on more than the candles: bid/ask from the exchange, and
+    # MF/FII and fair values that are fetched while screening.
+    UNCACHEABLE_EXECUTE_OPTIONS = [21, 29]
+    SETTING_TYPES = (str, int, float, bool, list, tuple, type(None))
+
+    def __init__(self, maxEntries=MAX_ENTRIES):
+        self.maxEntries = maxEntries
+        self._results = OrderedDict()
+
+    def directory():
+        return os.environ.get(PKResultCache.ENVIRONMENT_KEY)
+
+    # (number of rows, timestamp, values) of the latest candle of the stock in
+    # the stock data, or None if it isn't there. The whole candle is part of
+    # the key because today's candle keeps changing during the trading hours.
+    def lastBarOf(objectDictionary, stock):
+        if objectDictionary is None:
+            return None
+        try:
+            if isinstance(objectDictionary, PKStockDataStore):
+                lastRow = objectDictionary.lastRow(stock)
+                if lastRow is not None:
+                    return lastRow
+            hostData = objectDictionary.get(stock)
+            if hostData is None or len(hostData["data"]) == 0:
+                return None
+            return (
+                len(hostData["data"]),
+                pd.Timestamp(hostData["index"][-1]).value,
+                tuple(np.asarray(hostData["data"][-1], dtype=float).tolist()),
+            )
+        except Exception as e:
+            default_logger().debug(e, exc_info=True)
+            return None
+
+    def settingsOf(configManager):
+        return sorted(
+            (key, value) for key, value in vars(configManager).items()
+            if isinstance(value, PKResultCache.SETTING_TYPES) and not key.startswith("_")
+        )
+
+    def keyFor(stock, lastBars, options, configManager):
+        key = (VERSION, stock, lastBars, options, PKResultCache.settingsOf(configManager))
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    # Callers get their own dictionaries to change
+    def copyOf(result):
+        if not isinstance(result, tuple) or len(result) < 2:
+            return result
+        return (dict(result[0]), dict(result[1]), *result[2:])
+
+    # Returns (True, result) for a known result, (False, None) otherwise
+    def get(self, key):
+        if key in self._results:
+            self._results.move_to_end(key)
+            return True, PKResultCache.copyOf(self._results[key])
+        filePath = self.filePathFor(key)
+        if filePath is None or not os.path.isfile(filePath):
+            return False, None
+        try:
+            with open(filePath, "rb") as f:
+                result = pickle.loads(f.read())
+        except Exception as e:
+            default_logger().debug(e, exc_info=True)
+            return False, None
+        self.remember(key, result)
+        return True, PKResultCache.copyOf(result)
+
+    # Only the record of the stock's data is kept, with all of its closes
+    # for a backtest (see PKForwardReturns).
+    def put(self, key, result, menuOption=None):
+        if isinstance(result, tuple) and len(result) >= 4 and isinstance(result[2], pd.DataFrame):
+            result = PKScanRecord.compact(result, len(result[2]) if menuOption == "B" else 0)
+        result = PKResultCache.copyOf(result)
+        self.remember(key, result)
+        filePath = self.filePathFor(key)
+        if filePath is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(filePath), exist_ok=True)
+            # Other workers may be reading it. Let's not have them see half of it.
+            tempPath = f"{filePath}.tmp{os.getpid()}"
+            with open(tempPath, "wb") as f:
+                f.write(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+            os.replace(tempPath, filePath)
+        except Exception as e:
+            default_logger().debug(e, exc_info=True)
+
+    def remember(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxEntries:
+            self._results.popitem(last=False)
+
+    def filePathFor(self, key):
+        directory = PKResultCache.directory()
+        if directory is None or len(directory) == 0:
+            return None
+        return os.path.join(directory, key[:2], f"{key}{PKResultCache.FILE_EXTENSION}")
+
+    def __len__(self):
+        return len(self._results)
+
+    # Removes the saved results older than maxAgeDays
+    def prune(directory=None, maxAgeDays=MAX_DISK_AGE_DAYS):
+        directory = PKResultCache.directory() if directory is None else directory
+        if directory is None or not os.path.isdir(directory):
+            return 0
+        expiry = time.time() - maxAgeDays * 86400
+        removed = 0
+        for root, _, fileNames in os.walk(directory):
+            for fileName in fileNames:
+                filePath = os.path.join(root, fileName)
+                try:
+                    if os.stat(filePath).st_mtime < expiry:
+                        os.remove(filePath)
+                        removed += 1
+                except Exception as e:  # pragma: no cover
+                    default_logger().debug(e, exc_info=True)
+        return removed
@@ -0,0 +1,248 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import re
+
+
+# A scan of the monitor as it was last run: the item of its first stock (all
+# its arguments but the stock), the stocks it ran on, and the stocks it found.
+# source is the index of the scan whose results it was piped from, if any.
+class PKFusedScan:
+    def __init__(self, key, template, universe, source=None):
+        self.key = key
+        self.template = template
+        self.universe = universe
+        self.source = source
+        self.found = set()
+
+    # The item of this scan for the stock
+    def itemFor(self, stock, totalSymbols):
+        item = list(self.template)
+        item[PKScanFusion.TOTAL_SYMBOLS_INDEX] = totalSymbols
+        item[PKScanFusion.STOCK_INDEX] = stock
+        return tuple(item)
+
+
+# Fuses the scans of the monitors (the widgets of a dashboard and the scans
+# piped from each other) into one scan of the stocks. The scans are recorded
+# as they run in a cycle of the monitors. Once the stock data is refreshed for
+# the next cycle, the first of them runs all of them together: each stock is
+# pre-processed once for all the scans (see StockScreener.screenFusedStocks),
+# a piped scan only runs on the stocks found by its source, and the results of
+# every scan are kept here for when the monitor gets to it.
+class PKScanFusion:
+    TOTAL_SYMBOLS_INDEX = 10
+    STOCK_INDEX = 12
+    USER_ARGS_INDEX = 17
+    TEST_DATA_INDEX = 22
+    EXECUTE_OPTION_INDEX = 2
+    # Fetched live from the exchange, so not ahead of time
+    LIVE_EXECUTE_OPTIONS = [29]
+    scans = []
+    plannedScans = []
+    # key -> {stock: result} of the stocks each scan has run on in this cycle
+    results = None
+    # monitor key -> indices (into scans) of the stages of its latest run in
+    # this cycle, and the monitor and scan recorded last
+    monitorStages = {}
+    runningMonitorKey = None
+    lastScanIndex = None
+
+    # The scans of the monitors (-m) on the cached data as of today
+    def isFusable(items, userPassedArgs=None):
+        if userPassedArgs is None or userPassedArgs.monitor is None or userPassedArgs.download:
+            return False
+        if len(items) == 0:
+            return False
+        item = items[0]
+        executeOption = item[PKScanFusion.EXECUTE_OPTION_INDEX]
+        return (
+            item[0] == "X"
+            and isinstance(executeOption, int)
+            and executeOption not in PKScanFusion.LIVE_EXECUTE_OPTIONS
+            and item[18] == 0
+            and not item[14]
+            and item[PKScanFusion.TEST_DATA_INDEX] is None
+        )
+
+    # The arguments a scan was run with, other than the stocks. The candle
+    # duration is part of it because monitors can switch to intraday.
+    def specKey(item, configManager):
+        skipped = [PKScanFusion.TOTAL_SYMBOLS_INDEX, PKScanFusion.STOCK_INDEX, PKScanFusion.USER_ARGS_INDEX, PKScanFusion.TEST_DATA_INDEX]
+        return (configManager.period, configManager.duration) + tuple(
+            value for index, value in enumerate(item) if index not in skipped
+        )
+
+    # The monitors are about to run on fresh data. What ran in the last cycle
+    # is what will run in this one.
+    def newCycle():
+        if len(PKScanFusion.scans) > 0:
+            PKScanFusion.plannedScans = PKScanFusion.scans
+        PKScanFusion.scans = []
+        PKScanFusion.results = None
+        PKScanFusion.monitorStages = {}
+        PKScanFusion.runningMonitorKey = None
+        PKScanFusion.lastScanIndex = None
+
+    def reset():
+        PKScanFusion.newCycle()
+        PKScanFusion.plannedScans = []
+
+    # Remembers a scan that just ran for the monitor, given as its key (the
+    # one its results are saved under, see MarketMonitor.runningMonitor) and
+    # option string. Whether the scan was piped, and from which scan, comes
+    # from the option string (see pipeSource).
+    def record(items, found, configManager, monitor=None):
+        key = PKScanFusion.specKey(items[0], configManager)
+        universe = set(item[PKScanFusion.STOCK_INDEX] for item in items)
+        stages = PKScanFusion.stagesOf(monitor)
+        scanIndex = next((index for index, scan in enumerate(PKScanFusion.scans) if scan.key == key), None)
+        if scanIndex is not None:
+            scan = PKScanFusion.scans[scanIndex]
+            scan.universe |= universe
+            scan.found |= found
+        else:
+            scan = PKFusedScan(key, items[0], universe, PKScanFusion.pipeSource(monitor, stages))
+            scan.found = set(found)
+            PKScanFusion.scans.append(scan)
+            scanIndex = len(PKScanFusion.scans) - 1
+        stages.append(scanIndex)
+        PKScanFusion.lastScanIndex = scanIndex
+        return scan
+
+    # The scans recorded for the earlier stages of the monitor's run. A new
+    # run starts whenever another monitor ran in between.
+    def stagesOf(monitor):
+        if monitor is None:
+            PKScanFusion.runningMonitorKey = None
+            return []
+        monitorKey = monitor[0]
+        if PKScanFusion.runningMonitorKey != monitorKey:
+            PKScanFusion.monitorStages[monitorKey] = []
+            PKScanFusion.runningMonitorKey = monitorKey
+        return PKScanFusion.monitorStages[monitorKey]
+
+    # The index of the scan the next stage of the monitor is piped from, if
+    # any. The stages of a monitor option are separated by ">" and a stage
+    # starting with "|" runs on the stocks found by the stage before it. A
+    # first stage "|{n}..." runs on those found by monitor n (if that ran in
+    # this cycle) and a first stage "|..." on those of the scan before it.
+    def pipeSource(monitor, stages):
+        if monitor is None:
+            return None
+        segments = monitor[1].replace("\"", "").replace("'", "").split(">")
+        stage = len(stages)
+        if stage >= len(segments) or not segments[stage].startswith("|"):
+            return None
+        if stage > 0:
+            return stages[-1]
+        sourceMonitor = re.match(r"\|\{(\d+)\}", segments[0])
+        if sourceMonitor is None:
+            return PKScanFusion.lastScanIndex
+        sourceStages = PKScanFusion.monitorStages.get(sourceMonitor.group(1))
+        return sourceStages[-1] if sourceStages else None
+
+    # The planned scans that can run together with the scan of these items,
+    # if it is one of them: the ones for the same candle duration and period.
+    # A scan piped from one that can't run now is left out too.
+    def scansToFuse(items, configManager):
+        if len(PKScanFusion.plannedScans) < 2:
+            return []
+        key = PKScanFusion.specKey(items[0], configManager)
+        if PKScanFusion.results is not None and key in PKScanFusion.results:
+            return []
+        if key not in [scan.key for scan in PKScanFusion.plannedScans]:
+            return []
+        scans = []
+        indices = {}
+        for index, scan in enumerate(PKScanFusion.plannedScans):
+            if scan.key[:2] != key[:2]:
+                continue
+            if scan.source is not None and scan.source not in indices:
+                continue
+            indices[index] = len(scans)
+            fusedScan = PKFusedScan(scan.key, scan.template, scan.universe, None if scan.source is None else indices[scan.source])
+            scans.append(fusedScan)
+        return scans if len(scans) > 1 else []
+
+    # The stocks each scan runs on: its own, or those of its source scan, of
+    # which it only gets to see the ones that the source finds.
+    def domains(scans):
+        domains = []
+        for scan in scans:
+            domains.append(scan.universe if scan.source is None else domains[scan.source])
+        return domains
+
+    # One item per stock, with the list of (scanIndex, sourceIndex, item) of
+    # all the scans that run on it in place of the executeOption.
+    def fusedItems(scans):
+        domains = PKScanFusion.domains(scans)
+        stocks = []
+        for domain in domains:
+            stocks.extend(sorted(domain))
+        fusedItems = []
+        for stock in dict.fromkeys(stocks):
+            stockScans = [
+                (index, scan.source, scan.itemFor(stock, len(domains[index])))
+                for index, scan in enumerate(scans)
+                if stock in domains[index]
+            ]
+            fusedItem = list(stockScans[0][2])
+            fusedItem[PKScanFusion.EXECUTE_OPTION_INDEX] = stockScans
+            fusedItems.append(tuple(fusedItem))
+        return fusedItems
+
+    # Keeps the results of the fused scans, given the answers of the workers
+    # to all the fused items, in whatever order they came. A stock that a scan
+    # ran on without finding anything has None. A piped scan only ran on the
+    # stocks its source found, so the others are not kept for it.
+    def keepResults(scans, answers):
+        results = {} if PKScanFusion.results is None else PKScanFusion.results
+        scanResults = [{} for _ in scans]
+        for answer in answers:
+            for scanIndex, result in (answer or {}).items():
+                scanResults[scanIndex][result[3]] = result
+        for scan, domain, found in zip(scans, PKScanFusion.domains(scans), scanResults):
+            screened = domain if scan.source is None else scanResults[scan.source].keys()
+            results[scan.key] = {stock: found.get(stock) for stock in screened}
+        PKScanFusion.results = results
+        return results
+
+    # Splits the items of a scan into the results already found by a fused
+    # scan and the items that still need to run.
+    def cachedResults(items, configManager):
+        if PKScanFusion.results is None or len(items) == 0:
+            return [], items
+        scanResults = PKScanFusion.results.get(PKScanFusion.specKey(items[0], configManager))
+        if scanResults is None:
+            return [], items
+        cached = []
+        remaining = []
+        for item in items:
+            stock = item[PKScanFusion.STOCK_INDEX]
+            if stock in scanResults:
+                cached.append(scanResults[stock])
+            else:
+                remaining.append(item)
+        return cached, remaining
@@ -0,0 +1,71 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+import pandas as pd
+
+# What the parent needs of the stock data behind a scan result, in place of
+# the whole OHLCV DataFrame that was used to screen it: the date of its last
+# candle (the date of the results) and, for backtests, the closes from the
+# signal date onwards that PKForwardReturns works the returns out from.
+class PKScanRecord:
+    __slots__ = ("stock", "date", "closes")
+
+    def __init__(self, stock, date, closes=None):
+        self.stock = stock
+        self.date = date
+        self.closes = closes
+
+    # The closes of a backtest result are the first `window` closes of its
+    # data, which starts at the signal date.
+    def fromData(stock, data, window=0):
+        if data is None or len(data) == 0:
+            return PKScanRecord(stock, None)
+        closes = None
+        if window > 0 and "Close" in data.columns:
+            closes = data["Close"].head(window).to_numpy(dtype=float)
+        return PKScanRecord(stock, data.index[-1], closes)
+
+    # Swaps the data of a screenStocks result (or of each of the results of a
+    # walk-forward backtest or of a fused scan) for its PKScanRecord.
+    def compact(result, window=0):
+        if isinstance(result, list):
+            return [PKScanRecord.compact(res, window) for res in result]
+        if isinstance(result, dict):
+            return {key: PKScanRecord.compact(res, window) for key, res in result.items()}
+        if not isinstance(result, tuple) or len(result) < 4 or not isinstance(result[2], pd.DataFrame):
+            return result
+        return (*result[:2], PKScanRecord.fromData(result[3], result[2], window), *result[3:])
+
+    def closesOf(data, window):
+        if isinstance(data, PKScanRecord):
+            closes = data.closes
+        else:
+            closes = data["Close"].head(window).values if len(data) > 0 else None
+        return np.array([]) if closes is None else closes[:window]
+
+    def dateOf(data):
+        if isinstance(data, PKScanRecord):
+            return data.date
+        return data.index[-1]
@@ -34,7 +34,6 @@ from PKDevTools.classes.ColorText import colorText
 from PKDevTools.classes.PKDateUtilities import PKDateUtilities
 from PKDevTools.classes.log import default_logger
 from PKDevTools.classes.PKGitFolderDownloader import downloadFolder
-from PKDevTools.classes.PKMultiProcessorClient import PKMultiProcessorClient
 from PKDevTools.classes.multiprocessing_logging import LogQueueReader
 from PKDevTools.classes.SuppressOutput import SuppressOutput
 from PKDevTools.classes.FunctionTimeouts import exit_after
@@ -42,6 +41,15 @@ from PKDevTools.classes.FunctionTimeouts import exit_after
 from pkscreener.classes.StockScreener import StockScreener
 from pkscreener.classes.CandlePatterns import CandlePatterns
 from pkscreener.classes.ConfigManager import parser, tools
+from pkscreener import Imports
+from pkscreener.classes.PKBenchmark import PKStageTimer
+from pkscreener.classes.PKIndicatorEngine import PKIndicatorEngine
+from pkscreener.classes.PKPreFilter import PKPreFilter
+from pkscreener.classes.MarketMonitor import MarketMonitor
+from pkscreener.classes.PKScanFusion import PKScanFusion
+from pkscreener.classes.PKSharedStockData import PKSharedStockData
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
+from pkscreener.classes.PKWorkerPool import PKScanJob, PKScanWorker, PKTaskBatches, PKWorkerPool
 from PKDevTools.classes.OutputControls import OutputControls
 from PKNSETools.PKIntraDay import Intra_Day
 import pkscreener.classes.Fetcher as Fetcher
@@ -57,6 +65,10 @@ class PKScanRunner:
     results_queue = None
     scr = None
     consumers = None
+    sharedStockData = []
+    indicatorEngine = None
+    # (stockDictPrimary, stockDictSecondary, indicatorEngine) as published for the workers
+    jobStockData = None
 
     def initDataframes():
         screenResults = pd.DataFrame(
@@ -97,28 +109,26 @@ class PKScanRunner:
         )
         return screenResults, saveResults
 
-    def initQueues(minimumCount=0,userPassedArgs=None):
-        tasks_queue = multiprocessing.JoinableQueue()
-        results_queue = multiprocessing.Queue()
-        logging_queue = multiprocessing.Queue()
-
+    def workerCount(minimumCount=0,userPassedArgs=None):
         totalConsumers = 1 if (userPassedArgs is not None and userPassedArgs.singlethread) else min(minimumCount, multiprocessing.cpu_count())
         if totalConsumers == 1:
             totalConsumers = 2  # This is required for single core machine
         # if PKScanRunner.configManager.cacheEnabled is True and multiprocessing.cpu_count() > 2:
         #     totalConsumers -= 1
+        return totalConsumers
+
+    def initQueues(minimumCount=0,userPassedArgs=None):
+        tasks_queue = multiprocessing.JoinableQueue()
+        results_queue = multiprocessing.Queue()
+        logging_queue = multiprocessing.Queue()
+        totalConsumers = PKScanRunner.workerCount(minimumCount,userPassedArgs)
         return tasks_queue, results_queue, totalConsumers, logging_queue
 
-    def populateQueues(items, tasks_queue, exit=False,userPassedArgs=None):
+    # Queues the items as one batch of the active job. The workers stay up
+    # for the next scan, so there's no exit signal to append.
+    def populateQueues(items, tasks_queue, userPassedArgs=None):
         # default_logger().debug(f"Unfinished items in task_queue: {tasks_queue.qsize()}")
-        for item in items:
-            tasks_queue.put(item)
-        mayBePiped = userPassedArgs is not None and (userPassedArgs.monitor is not None or "|" in userPassedArgs.options)
-        if exit and not mayBePiped:
-            # Append exit signal for each process indicated by None
-            for _ in range(multiprocessing.cpu_count()):
-                tasks_queue.put(None)
-
+        tasks_queue.put(PKWorkerPool.batch(items))
 
     def getScanDurationParameters(testing, menuOption):
         # Number of days from past, including the backtest duration chosen by the user
@@ -169,6 +179,54 @@ class PKScanRunner:
                     ]
         items.extend(moreItems)
 
+    # Folds the items of every backtest day of a stock into one item with the
+    # list of the backtest durations, so that a worker pre-processes the
+    # stock's data once and walks it forward over all the days (see
+    # StockScreener.screenStocks)
+    def walkForwardItems(items):
+        stockIndex = 12
+        backtestDurationIndex = 18
+        stockItems = {}
+        for item in items:
+            stockItem = stockItems.get(item[stockIndex])
+            if stockItem is None:
+                stockItem = list(item)
+                stockItem[backtestDurationIndex] = []
+                stockItems[item[stockIndex]] = stockItem
+            stockItem[backtestDurationIndex].append(item[backtestDurationIndex])
+        return [tuple(item) for item in stockItems.values()]
+
+    # Drops the items of the stocks whose latest candle already fails the basic
+    # LTP/%change/stage-two/volume checks (see PKPreFilter), before they are
+    # queued to the workers. Only applies to scans of the cached data as of
+    # today, which is what the indicator engine was built from.
+    def preFilterItems(items, userPassedArgs=None):
+        engine = PKScanRunner.indicatorEngine
+        configManager = PKScanRunner.configManager
+        if engine is None or len(items) == 0 or configManager.calculatersiintraday:
+            return items
+        if userPassedArgs is not None and userPassedArgs.download:
+            return items
+        rejectedSymbols = {}
+        preFilteredItems = []
+        for item in items:
+            menuOption, exchangeName, executeOption = item[0], item[1], item[2]
+            shouldCache, stock, downloadOnly, volumeRatio = item[11], item[12], item[14], item[15]
+            backtestDuration, testData = item[18], item[22]
+            if menuOption != "X" or backtestDuration != 0 or downloadOnly or not shouldCache or testData is not None:
+                preFilteredItems.append(item)
+                continue
+            options = (exchangeName, executeOption, volumeRatio)
+            if options not in rejectedSymbols:
+                try:
+                    rejectedSymbols[options] = PKPreFilter.rejectedSymbols(engine, configManager, executeOption, exchangeName, volumeRatio)
+                except Exception as e:  # pragma: no cover
+                    default_logger().debug(e, exc_info=True)
+                    rejectedSymbols[options] = set()
+            if stock not in rejectedSymbols[options]:
+                preFilteredItems.append(item)
+        return preFilteredItems
+
     def getStocksListForScan(userArgs, menuOption, totalStocksInReview, downloadedRecently, daysInPast):
         savedStocksCount = 0
         pastDate, savedListResp = PKScanRunner.downloadSavedResults(daysInPast,downloadedRecently=downloadedRecently)
@@ -245,31 +303,22 @@ class PKScanRunner:
         choices = f"{choices}{'_i' if isIntraday else ''}"
         return choices
 
-    def refreshDatabase(consumers,stockDictPrimary,stockDictSecondary):
-        for worker in consumers:
-            worker.objectDictionaryPrimary = stockDictPrimary
-            worker.objectDictionarySecondary = stockDictSecondary
-            worker.refreshDatabase = True
-            
-    def runScanWithParams(userPassedArgs,keyboardInterruptEvent,screenCounter,screenResultsCounter,stockDictPrimary,stockDictSecondary,testing, backtestPeriod, menuOption, executeOption, samplingDuration, items,screenResults, saveResults, backtest_df,scanningCb,tasks_queue, results_queue, consumers,logging_queue):
-        if tasks_queue is None or results_queue is None or consumers is None:
-            tasks_queue, results_queue, consumers,logging_queue = PKScanRunner.prepareToRunScan(menuOption,keyboardInterruptEvent,screenCounter, screenResultsCounter, stockDictPrimary,stockDictSecondary, items,executeOption,userPassedArgs)
-            try:
-                if logging_queue is not None:
-                    log_queue_reader = LogQueueReader(logging_queue)
-                    log_queue_reader.start()
-            except:
-                pass
+    # Fresh data for the next scans of the running workers (monitor cycles)
+    def refreshDatabase(stockDictPrimary,stockDictSecondary,userPassedArgs=None):
+        PKScanRunner.releaseSharedStockData()
+        PKScanRunner.publishStockData(stockDictPrimary,stockDictSecondary,userPassedArgs)
+
+    def runScanWithParams(userPassedArgs,keyboardInterruptEvent,screenCounter,screenResultsCounter,stockDictPrimary,stockDictSecondary,testing, backtestPeriod, menuOption, executeOption, samplingDuration, items,screenResults, saveResults, backtest_df,scanningCb):
+        tasks_queue, results_queue, consumers,logging_queue = PKScanRunner.prepareToRunScan(menuOption,keyboardInterruptEvent,screenCounter, screenResultsCounter, items,executeOption,userPassedArgs)
+        PKScanRunner.submitScanJob(menuOption,stockDictPrimary,stockDictSecondary,items,userPassedArgs)
         # if executeOption == 29: # Intraday Bid/Ask, for which we need to fetch data from NSE instead of yahoo
         #     intradayFetcher = Intra_Day("SBINEQN") # This will initialise the cookies etc.
         #     for consumer in consumers:
         #         consumer.intradayNSEFetcher = intradayFetcher
-        # else:
-        #     # Restart the workers because the run method may have exited from a previous run
-        #     PKScanRunner.startWorkers(consumers)
         PKScanRunner.tasks_queue = tasks_queue
         PKScanRunner.results_queue = results_queue
         PKScanRunner.consumers = consumers
+        items = PKScanRunner.preFilterItems(items, userPassedArgs)
         screenResults, saveResults, backtest_df = scanningCb(
                     menuOption,
                     items,
@@ -286,35 +335,133 @@ class PKScanRunner:
                 )
 
         OutputControls().printOutput(colorText.END)
+        PKWorkerPool.cancel()
         if userPassedArgs is not None and (userPassedArgs.monitor is None and "|" not in userPassedArgs.options) and not userPassedArgs.options.upper().startswith("C"):
-            # Don't terminate the multiprocessing clients if we're 
-            # going to pipe the results from an earlier run
-            # or we're running in monitoring mode
-            PKScanRunner.terminateAllWorkers(userPassedArgs,consumers, tasks_queue, testing)
-        else:
-            for worker in consumers:
-                worker.paused = True
-                worker._clear()
+            # Keep the workers warm for the next scan, but the next scan
+            # may well be on freshly loaded data. Monitors and piped scans
+            # run on the same data until refreshDatabase.
+            PKScanRunner.releaseSharedStockData()
         return screenResults, saveResults,backtest_df,tasks_queue, results_queue, consumers, logging_queue
 
+    # Makes the scan the active job of the workers. The stock data is only
+    # published if it isn't already since the last refresh or release.
+    def submitScanJob(menuOption,stockDictPrimary,stockDictSecondary,items,userPassedArgs=None):
+        jobId = PKWorkerPool.nextJobId()
+        itemTemplate = items[0] if len(items) > 0 else None
+        if menuOption in ["C"]:
+            exists, cache_file = Utility.tools.afterMarketStockDataExists(intraday=PKScanRunner.configManager.isIntradayConfig())
+            sec_cache_file = cache_file if "intraday_" in cache_file else f"intraday_{cache_file}"
+            job = PKScanJob(jobId, PKScanRunner.configManager,
+                            candlePatterns=PKScanRunner.candlePatterns,
+                            dbFileNamePrimary=(cache_file if exists else None),
+                            dbFileNameSecondary=(sec_cache_file if exists else None),
+                            itemTemplate=itemTemplate)
+        else:
+            if PKScanRunner.jobStockData is None:
+                PKScanRunner.publishStockData(stockDictPrimary,stockDictSecondary,userPassedArgs)
+            stockDictPrimary, stockDictSecondary, indicatorEngine = PKScanRunner.jobStockData
+            job = PKScanJob(jobId, PKScanRunner.configManager,
+                            objectDictionaryPrimary=stockDictPrimary,
+                            objectDictionarySecondary=stockDictSecondary,
+                            candlePatterns=PKScanRunner.candlePatterns,
+                            indicatorEngine=indicatorEngine,
+                            itemTemplate=itemTemplate)
+        PKWorkerPool.submit(job)
+        return job
+
+    def publishStockData(stockDictPrimary,stockDictSecondary,userPassedArgs=None):
+        stockDictPrimary = PKScanRunner.shareStockData(stockDictPrimary,userPassedArgs)
+        stockDictSecondary = PKScanRunner.shareStockData(stockDictSecondary,userPassedArgs)
+        indicatorEngine = PKScanRunner.buildIndicatorEngine(stockDictPrimary,userPassedArgs)
+        PKScanRunner.precomputeCandlePatterns(stockDictPrimary,userPassedArgs)
+        PKScanRunner.jobStockData = (stockDictPrimary, stockDictSecondary, indicatorEngine)
+        PKScanFusion.newCycle()
+
+    # Publishes the loaded stock data once into shared memory so that the workers
+    # read it without going through the Manager process. Writes from the workers
+    # are still forwarded to the original dictionary for saving the cache later.
+    def shareStockData(stockDict, userPassedArgs=None):
+        if stockDict is None or isinstance(stockDict, PKStockDataStore) or len(stockDict) == 0:
+            # Memory-mapped stores are already shared through the OS page cache
+            return stockDict
+        if userPassedArgs is not None and userPassedArgs.download:
+            # Workers download and fill up everything. Nothing to share yet.
+            return stockDict
+        try:
+            sharedData = PKSharedStockData.publish(stockDict, writeThrough=stockDict)
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+            sharedData = None
+        if sharedData is None:
+            return stockDict
+        PKScanRunner.sharedStockData.append(sharedData)
+        return sharedData
+
+    # Precomputes the preprocessData indicators of the whole universe in one go.
+    # The kernels follow TA-Lib, so we only use them when pktalib does too.
+    # Subsequent monitor/cron cycles only compute the newest candles.
+    def buildIndicatorEngine(stockDict, userPassedArgs=None):
+        if not Imports["talib"] or not isinstance(stockDict, (dict, PKStockDataStore)) or len(stockDict) == 0:
+            return None
+        if userPassedArgs is not None and userPassedArgs.download:
+            return None
+        useEMA = PKScanRunner.configManager.useEMA
+        previousEngine = PKScanRunner.indicatorEngine
+        try:
+            if previousEngine is not None and previousEngine.useEMA == useEMA:
+                indicatorEngine = previousEngine.update(stockDict)
+            else:
+                indicatorEngine = PKIndicatorEngine.build(stockDict, useEMA=useEMA)
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+            indicatorEngine = None
+        PKScanRunner.indicatorEngine = indicatorEngine
+        if indicatorEngine is not None:
+            PKScanRunner.sharedStockData.append(indicatorEngine)
+        return indicatorEngine
+
+    # Evaluates the candle patterns of the latest candles of all stocks at once,
+    # so that the workers only have to look them up.
+    def precomputeCandlePatterns(stockDict, userPassedArgs=None):
+        if not Imports["talib"] or not isinstance(stockDict, (dict, PKStockDataStore)):
+            stockDict = {}
+        if userPassedArgs is not None and userPassedArgs.download:
+            stockDict = {}
+        # Also drops the patterns of any previous run if there's nothing to do
+        return PKScanRunner.candlePatterns.precomputePatterns(stockDict)
+
+    def releaseSharedStockData():
+        for sharedData in PKScanRunner.sharedStockData:
+            try:
+                sharedData.unlink()
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+        PKScanRunner.sharedStockData = []
+        PKScanRunner.jobStockData = None
+
+    # Returns the running worker pool if it's big enough for the scan.
+    # Otherwise starts one, which is then reused by the next scans.
     @exit_after(180) # Should not remain stuck starting the multiprocessing clients beyond this time
-    def prepareToRunScan(menuOption,keyboardInterruptEvent, screenCounter, screenResultsCounter, stockDictPrimary,stockDictSecondary, items, executeOption,userPassedArgs):
+    def prepareToRunScan(menuOption,keyboardInterruptEvent, screenCounter, screenResultsCounter, items, executeOption,userPassedArgs):
+        singleThreaded = userPassedArgs is not None and userPassedArgs.singlethread
+        if PKWorkerPool.isRunning(PKScanRunner.workerCount(len(items),userPassedArgs), exactly=singleThreaded):
+            return PKWorkerPool.tasks_queue, PKWorkerPool.results_queue, PKWorkerPool.workers, PKWorkerPool.logging_queue
+        if len(PKWorkerPool.workers) > 0:
+            PKScanRunner.terminateAllWorkers(userPassedArgs, PKWorkerPool.workers, PKWorkerPool.tasks_queue)
         tasks_queue, results_queue, totalConsumers, logging_queue = PKScanRunner.initQueues(len(items),userPassedArgs)
         scr = ScreeningStatistics.ScreeningStatistics(PKScanRunner.configManager, default_logger())
-        exists, cache_file = Utility.tools.afterMarketStockDataExists(intraday=PKScanRunner.configManager.isIntradayConfig())
-        sec_cache_file = cache_file if "intraday_" in cache_file else f"intraday_{cache_file}"
+        # The stock data, indicator engine and candle patterns of every scan
+        # come with its job (see submitScanJob)
         consumers = [
-                    PKMultiProcessorClient(
+                    PKScanWorker(
                         StockScreener().screenStocks,
                         tasks_queue,
                         results_queue,
                         logging_queue,
                         screenCounter,
                         screenResultsCounter,
-                        # stockDictPrimary,
-                        # stockDictSecondary,
-                        (stockDictPrimary if menuOption not in ["C"] else None),
-                        (stockDictSecondary if menuOption not in ["C"] else None),
+                        None,
+                        None,
                         PKScanRunner.fetcher.proxyServer,
                         keyboardInterruptEvent,
                         default_logger(),
@@ -322,10 +469,8 @@ class PKScanRunner:
                         PKScanRunner.configManager,
                         PKScanRunner.candlePatterns,
                         scr,
-                        # None,
-                        # None
-                        (cache_file if (exists and menuOption in ["C"]) else None),
-                        (sec_cache_file if (exists and menuOption in ["C"]) else None),
+                        jobQueue=PKWorkerPool.newJobQueue(),
+                        activeJobId=PKWorkerPool.activeJobId,
                     )
                     for _ in range(totalConsumers)
                 ]
@@ -338,6 +483,13 @@ class PKScanRunner:
         for consumer in consumers:
             consumer.intradayNSEFetcher = intradayFetcher
         PKScanRunner.startWorkers(consumers)
+        PKWorkerPool.register(consumers, tasks_queue, results_queue, logging_queue)
+        try:
+            if logging_queue is not None:
+                log_queue_reader = LogQueueReader(logging_queue)
+                log_queue_reader.start()
+        except:
+            pass
         return tasks_queue,results_queue,consumers,logging_queue
 
     @exit_after(120) # Should not remain stuck starting the multiprocessing clients beyond this time
@@ -400,6 +552,8 @@ class PKScanRunner:
                 except Exception as e:  # pragma: no cover
                     # default_logger().debug(e, exc_info=True)
                     break
+        PKScanRunner.releaseSharedStockData()
+        PKWorkerPool.reset()
         PKScanRunner.tasks_queue = None
         PKScanRunner.results_queue = None
         PKScanRunner.scr = None
@@ -409,54 +563,67 @@ class PKScanRunner:
         OutputControls().printOutput("Shutting down for test coverage")
 
     # @exit_after(60)
+    @PKStageTimer.timed("runScan")
     def runScan(userPassedArgs,testing,numStocks,iterations,items,numStocksPerIteration,tasks_queue,results_queue,originalNumberOfStocks,backtest_df, *otherArgs,resultsReceivedCb=None):
-        queueCounter = 0
         counter = 0
         shouldContinue = True
+        shouldStop = False
         lastNonNoneResult = None
-        while numStocks:
-            if counter == 0 and numStocks > 0:
-                if queueCounter < int(iterations):
-                    PKScanRunner.populateQueues(
-                        items[
-                            numStocksPerIteration
-                            * queueCounter : numStocksPerIteration
-                            * (queueCounter + 1)
-                        ],
-                        tasks_queue,
-                        (queueCounter + 1 == int(iterations)) and ((queueCounter + 1)*int(iterations) == originalNumberOfStocks),
-                        userPassedArgs
-                    )
-                else:
-                    PKScanRunner.populateQueues(
-                        items[
-                            numStocksPerIteration
-                            * queueCounter :
-                        ],
-                        tasks_queue,
-                        True,
-                        userPassedArgs
-                    )
-            numStocks -= 1
-            result = results_queue.get()
-            if result is not None:
-                lastNonNoneResult = result
-            
-            if resultsReceivedCb is not None:
-                shouldContinue, backtest_df = resultsReceivedCb(result, numStocks, backtest_df,*otherArgs)
-            counter += 1
-            # If it's being run under unit testing, let's wrap up if we find at least 1
-            # stock or if we've already tried screening through 5% of the list.
-            if (not shouldContinue) or (testing and counter >= int(numStocksPerIteration * 0.05)):
-                if PKScanRunner.consumers is not None:
-                    consumers = PKScanRunner.consumers
-                    for worker in consumers:
-                        worker.paused = True
-                        worker._clear()
+        isFusable = PKScanFusion.isFusable(items, userPassedArgs)
+        found = set()
+        cachedResults = []
+        scanItems = items
+        if isFusable:
+            scans = PKScanFusion.scansToFuse(items, PKScanRunner.configManager)
+            if len(scans) > 0:
+                PKScanRunner.runFusedScans(userPassedArgs, scans, tasks_queue, results_queue)
+            cachedResults, items = PKScanFusion.cachedResults(items, PKScanRunner.configManager)
+        batches = PKTaskBatches(items, len(PKWorkerPool.workers))
+        queuedBatches = 0
+        while numStocks and (len(cachedResults) > 0 or queuedBatches > 0 or batches.remaining() > 0):
+            if len(cachedResults) > 0:
+                # Already found by the fused scan of the monitors
+                results, cachedResults = cachedResults, []
+            else:
+                while queuedBatches < PKTaskBatches.QUEUED_PER_WORKER * batches.workers and batches.remaining() > 0:
+                    PKScanRunner.populateQueues(batches.nextBatch(), tasks_queue, userPassedArgs)
+                    queuedBatches += 1
+                results = PKWorkerPool.nextResults(results_queue)
+                queuedBatches -= 1
+                batches.markCompleted(len(results))
+            for result in results:
+                numStocks -= 1
+                if result is not None:
+                    # Walk-forward backtests return the results of all the days
+                    lastNonNoneResult = result[-1] if isinstance(result, list) else result
+                    if isFusable:
+                        found.add(result[3])
+                if resultsReceivedCb is not None:
+                    shouldContinue, backtest_df = resultsReceivedCb(result, numStocks, backtest_df,*otherArgs)
+                counter += 1
+                # If it's being run under unit testing, let's wrap up if we find at least 1
+                # stock or if we've already tried screening through 5% of the list.
+                shouldStop = (not shouldContinue) or (testing and counter >= int(numStocksPerIteration * 0.05))
+                if shouldStop:
+                    break
+            if shouldStop:
+                PKWorkerPool.cancel()
                 break
-            # Add to the queue when we're through 75% of the previously added items already
-            if counter >= numStocksPerIteration: #int(numStocksPerIteration * 0.75):
-                queueCounter += 1
-                counter = 0
-        
+        if isFusable:
+            PKScanFusion.record(scanItems, found, PKScanRunner.configManager, MarketMonitor().runningMonitor())
         return backtest_df, lastNonNoneResult
+
+    # Runs the scans of the monitors together, as one scan of the stocks that
+    # any of them runs on (see PKScanFusion). The results are kept for when
+    # the monitors get to each of the scans.
+    def runFusedScans(userPassedArgs, scans, tasks_queue, results_queue):
+        fusedItems = PKScanFusion.fusedItems(scans)
+        answers = []
+        def answerReceived(answer, numStocks, backtest_df, *otherArgs):
+            answers.append(answer)
+            return True, backtest_df
+        PKScanRunner.runScan(userPassedArgs, False, len(fusedItems), 1, fusedItems, len(fusedItems), tasks_queue, results_queue, len(fusedItems), None, resultsReceivedCb=answerReceived)
+        if len(answers) < len(fusedItems):
+            # Didn't run to the end. The scans will just run on their own.
+            return None
+        return PKScanFusion.keepResults(scans, answers)
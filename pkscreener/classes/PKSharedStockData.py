@@ -0,0 +1,176 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
+
+# Stock database that is published once by the parent process into a single
+# shared memory block and attached read-only by every PKMultiProcessorClient.
+# A Manager().dict() proxy serves every lookup through a round trip to the
+# manager process (pickling the whole split dict each time) and spawned
+# workers would otherwise each carry their own copy of the universe.
+#
+# The block holds the same columnar layout as PKStockDataStore:
+#   [values float64 (totalRows x columns)][timestamps int64][offsets int64]
+# Only the block name and the (small) meta are pickled across to the workers.
+# Writes from the workers (freshly downloaded data, refreshed MF/FII values)
+# land in the per-process overlay and are also forwarded to writeThrough
+# (usually the original Manager dict) so that the parent can still save them.
+class PKSharedStockData(PKStockDataStore):
+    def __init__(self, blockName, meta, layout, writeThrough=None, owner=False, trackerId=None):
+        self.storePath = None
+        self.blockName = blockName
+        self.writeThrough = writeThrough
+        self._layout = layout
+        self._owner = owner
+        self._trackerId = PKSharedStockData.trackerId() if owner else trackerId
+        self._overlay = {}
+        self._shm = None
+        self._setMeta(meta)
+        self._attach()
+
+    def publish(stockDict, writeThrough=None):
+        columnarData = PKStockDataStore.columnarize(stockDict)
+        if columnarData is None:
+            return None
+        allValues, allTimestamps, offsets, meta = columnarData
+        blockName, layout = PKSharedStockData.createBlock([allValues, allTimestamps, offsets])
+        return PKSharedStockData(blockName, meta, layout, writeThrough=writeThrough, owner=True)
+
+    # Copies the arrays back to back into a new shared memory block and returns
+    # the block name with the (offset, shape, dtype) layout to attach them again.
+    def createBlock(arrays):
+        layout = []
+        totalBytes = 0
+        for array in arrays:
+            layout.append((totalBytes, array.shape, array.dtype.str))
+            totalBytes += array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(totalBytes, 1))
+        for array, (offset, shape, dtype) in zip(arrays, layout):
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = array
+        blockName = shm.name
+        # Whoever attaches keeps the mapping alive. Drop the one we created with.
+        shm.close()
+        return blockName, layout
+
+    # Identifies the resource tracker this process talks to (by the pipe to
+    # it), None if it has none. Processes started by multiprocessing (fork,
+    # spawn or forkserver) share the tracker of the process that started them.
+    def trackerId():
+        from multiprocessing import resource_tracker
+        fd = getattr(resource_tracker._resource_tracker, "_fd", None)
+        if fd is None:
+            return None
+        try:
+            stat = os.fstat(fd)
+        except OSError as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    # trackerId is the one of the process that created the block
+    def attachBlock(blockName, layout, owner=False, trackerId=None):
+        if owner:
+            shm = shared_memory.SharedMemory(name=blockName)
+        else:
+            try:
+                shm = shared_memory.SharedMemory(name=blockName, track=False)
+            except TypeError:
+                # Python < 3.13 registers every attach with the resource tracker.
+                # With the creator's tracker that changes nothing (and it must
+                # keep the registration to unlink the block). A tracker of our
+                # own would unlink the block when this process exits.
+                from multiprocessing import resource_tracker
+                shm = shared_memory.SharedMemory(name=blockName)
+                if PKSharedStockData.trackerId() != trackerId:
+                    try:
+                        resource_tracker.unregister(shm._name, "shared_memory")
+                    except Exception as e:  # pragma: no cover
+                        default_logger().debug(e, exc_info=True)
+        arrays = []
+        for offset, shape, dtype in layout:
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            array.flags.writeable = False
+            arrays.append(array)
+        return shm, arrays
+
+    def _attach(self):
+        self._shm, arrays = PKSharedStockData.attachBlock(self.blockName, self._layout, owner=self._owner, trackerId=self._trackerId)
+        self._values, self._timestamps, self._offsets = arrays
+
+    def __getstate__(self):
+        return {
+            "blockName": self.blockName,
+            "_meta": self._meta,
+            "_layout": self._layout,
+            "_trackerId": self._trackerId,
+            "writeThrough": self.writeThrough,
+            "_overlay": self._overlay,
+        }
+
+    def __setstate__(self, state):
+        self.storePath = None
+        self.blockName = state["blockName"]
+        self.writeThrough = state["writeThrough"]
+        self._layout = state["_layout"]
+        self._overlay = state["_overlay"]
+        self._owner = False
+        self._trackerId = state["_trackerId"]
+        self._shm = None
+        self._setMeta(state["_meta"])
+        self._attach()
+
+    def __setitem__(self, symbol, splitDict):
+        self._overlay[symbol] = splitDict
+        if self.writeThrough is not None:
+            try:
+                self.writeThrough[symbol] = splitDict
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+
+    def close(self):
+        self._values = self._timestamps = self._offsets = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError as e:  # pragma: no cover
+                # Some frame still holds a view into the block. The mapping goes
+                # away with the process, the name is still unlinked below.
+                default_logger().debug(e, exc_info=True)
+            self._shm = None
+
+    # Only the publishing (parent) process should unlink the block.
+    def unlink(self):
+        if self._owner and self._shm is not None:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:  # pragma: no cover
+                pass
+        self._owner = False
+        self.close()
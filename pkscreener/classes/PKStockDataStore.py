@@ -0,0 +1,338 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import glob
+import os
+import pickle
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+from PKDevTools.classes import Archiver
+from PKDevTools.classes.log import default_logger
+
+# Columnar, memory-mapped store for the OHLCV history of the whole universe.
+# Instead of pickling {symbol: df.to_dict("split")}, every symbol's rows are
+# appended into one float64 matrix (rows x columns) with a parallel int64
+# timestamp array and an offsets array that maps each symbol to its slice.
+# The arrays are opened with mmap, so readers (including all the worker
+# processes) share the same OS page cache and only touch the rows they read.
+#
+# On disk, a store is a directory (e.g. stock_data_230524.pkcol) containing:
+#   ohlcv.npy       float64 (totalRows x len(columns))
+#   timestamps.npy  int64 (totalRows), nanoseconds since epoch, UTC
+#   offsets.npy     int64 (numSymbols + 1), row offsets into the above
+#   meta.pkl        columns, symbols, per-symbol columns/tz and the extra
+#                   non-OHLCV keys (MF, FII, FairValue etc.) of each symbol.
+class PKStockDataStore:
+    STORE_EXTENSION = ".pkcol"
+    DATA_FILE = "ohlcv.npy"
+    TIMESTAMPS_FILE = "timestamps.npy"
+    OFFSETS_FILE = "offsets.npy"
+    META_FILE = "meta.pkl"
+    VERSION = 1
+    SPLIT_KEYS = ["index", "columns", "data"]
+
+    def __init__(self, storePath):
+        self.storePath = storePath
+        # Per-process writes (e.g. refreshed MF/FII values) never touch the
+        # mapped files. They are kept here and win over the stored values.
+        self._overlay = {}
+        self._open()
+
+    def _open(self):
+        with open(os.path.join(self.storePath, PKStockDataStore.META_FILE), "rb") as f:
+            meta = pickle.loads(f.read())
+        self._setMeta(meta)
+        self._values = np.load(os.path.join(self.storePath, PKStockDataStore.DATA_FILE), mmap_mode="r")
+        self._timestamps = np.load(os.path.join(self.storePath, PKStockDataStore.TIMESTAMPS_FILE), mmap_mode="r")
+        self._offsets = np.load(os.path.join(self.storePath, PKStockDataStore.OFFSETS_FILE))
+
+    def _setMeta(self, meta):
+        if meta.get("version") != PKStockDataStore.VERSION:
+            raise ValueError(f"Unsupported store version: {meta.get('version')}")
+        self._meta = meta
+        self.columns = meta["columns"]
+        self.symbols = meta["symbols"]
+        self._symbolColumns = meta["symbolColumns"]
+        self._symbolTimezones = meta["symbolTimezones"]
+        self._extras = meta["extras"]
+        self._unconverted = meta["unconverted"]
+        self._rowIndex = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    # Workers may get this object pickled (spawn start method). We only send
+    # the path and the overlay across and map the files again on the other side.
+    def __getstate__(self):
+        return {"storePath": self.storePath, "_overlay": self._overlay}
+
+    def __setstate__(self, state):
+        self.storePath = state["storePath"]
+        self._overlay = state["_overlay"]
+        self._open()
+
+    def remove(storePath):
+        shutil.rmtree(storePath, ignore_errors=True)
+
+    def storePathForCacheFile(cache_file, outputFolder=None):
+        if outputFolder is None and os.sep not in cache_file:
+            outputFolder = Archiver.get_user_outputs_dir()
+        fileName = os.path.join(outputFolder, cache_file) if outputFolder is not None else cache_file
+        return f"{os.path.splitext(fileName)[0]}{PKStockDataStore.STORE_EXTENSION}"
+
+    def exists(storePath):
+        return os.path.isfile(os.path.join(storePath, PKStockDataStore.META_FILE))
+
+    # The pickle remains the source of truth. If it was deleted (config change,
+    # forced re-download) or re-saved later, the store must not be used.
+    def isUpToDate(storePath, sourceFilePath):
+        if not PKStockDataStore.exists(storePath) or not os.path.exists(sourceFilePath):
+            return False
+        metaFile = os.path.join(storePath, PKStockDataStore.META_FILE)
+        return os.stat(metaFile).st_mtime >= os.stat(sourceFilePath).st_mtime
+
+    # Flattens {symbol: split dict} into (values, timestamps, offsets, meta).
+    # Returns None when no symbol could be stored column-wise.
+    def columnarize(stockDict):
+        if isinstance(stockDict, PKStockDataStore) or not isinstance(stockDict, dict):
+            # DictProxy from multiprocessing.Manager or a store itself
+            stockDict = stockDict.copy()
+        columns = []
+        symbols = []
+        symbolColumns = {}
+        symbolTimezones = {}
+        extras = {}
+        unconverted = {}
+        valueBlocks = []
+        timestampBlocks = []
+        for symbol, splitDict in stockDict.items():
+            if isinstance(splitDict, pd.DataFrame):
+                splitDict = splitDict.to_dict("split")
+            try:
+                index = pd.DatetimeIndex(splitDict["index"])
+                values = np.asarray(splitDict["data"], dtype=np.float64)
+                stockColumns = list(splitDict["columns"])
+                if values.ndim != 2 or values.shape[1] != len(stockColumns) or len(index) != len(values):
+                    raise ValueError(f"Shape mismatch for {symbol}")
+            except Exception as e:
+                # Not a plain numeric OHLCV frame. Let's keep it as is.
+                default_logger().debug(e, exc_info=True)
+                unconverted[symbol] = splitDict
+                continue
+            for col in stockColumns:
+                if col not in columns:
+                    columns.append(col)
+            symbols.append(symbol)
+            symbolColumns[symbol] = stockColumns
+            symbolTimezones[symbol] = None if index.tz is None else str(index.tz)
+            timestampBlocks.append(index.asi8 if index.tz is None else index.tz_convert("UTC").asi8)
+            valueBlocks.append((stockColumns, values))
+            stockExtras = {key: splitDict[key] for key in splitDict.keys() if key not in PKStockDataStore.SPLIT_KEYS}
+            if len(stockExtras) > 0:
+                extras[symbol] = stockExtras
+        if len(symbols) == 0:
+            return None
+        totalRows = sum(len(values) for _, values in valueBlocks)
+        allValues = np.full((totalRows, len(columns)), np.nan, dtype=np.float64)
+        offsets = np.zeros(len(symbols) + 1, dtype=np.int64)
+        rowStart = 0
+        for i, (stockColumns, values) in enumerate(valueBlocks):
+            rowEnd = rowStart + len(values)
+            if stockColumns == columns:
+                allValues[rowStart:rowEnd] = values
+            else:
+                allValues[rowStart:rowEnd, [columns.index(col) for col in stockColumns]] = values
+            offsets[i + 1] = rowEnd
+            rowStart = rowEnd
+        allTimestamps = np.concatenate(timestampBlocks).astype(np.int64) if len(timestampBlocks) > 0 else np.zeros(0, dtype=np.int64)
+        meta = {
+            "version": PKStockDataStore.VERSION,
+            "columns": columns,
+            "symbols": symbols,
+            "symbolColumns": symbolColumns,
+            "symbolTimezones": symbolTimezones,
+            "extras": extras,
+            "unconverted": unconverted,
+        }
+        return allValues, allTimestamps, offsets, meta
+
+    def write(stockDict, storePath):
+        columnarData = PKStockDataStore.columnarize(stockDict)
+        if columnarData is None:
+            # Nothing that could be stored column-wise
+            PKStockDataStore.remove(storePath)
+            return None
+        allValues, allTimestamps, offsets, meta = columnarData
+        # Write everything into a temporary folder first so that readers
+        # never see a half-written store.
+        tempPath = f"{storePath}.tmp{os.getpid()}"
+        shutil.rmtree(tempPath, ignore_errors=True)
+        os.makedirs(tempPath, exist_ok=True)
+        np.save(os.path.join(tempPath, PKStockDataStore.DATA_FILE), allValues)
+        np.save(os.path.join(tempPath, PKStockDataStore.TIMESTAMPS_FILE), allTimestamps)
+        np.save(os.path.join(tempPath, PKStockDataStore.OFFSETS_FILE), offsets)
+        # meta.pkl is written last because its presence marks a complete store
+        with open(os.path.join(tempPath, PKStockDataStore.META_FILE), "wb") as f:
+            f.write(pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL))
+        PKStockDataStore.remove(storePath)
+        os.replace(tempPath, storePath)
+        return storePath
+
+    def fromPickle(pickleFilePath, storePath=None):
+        if storePath is None:
+            storePath = PKStockDataStore.storePathForCacheFile(pickleFilePath)
+        with open(pickleFilePath, "rb") as f:
+            stockDict = pickle.load(f)
+        if PKStockDataStore.write(stockDict, storePath) is None:
+            return None
+        return PKStockDataStore(storePath)
+
+    # One-shot converter for all the existing *stock_data_*.pkl files
+    def convertPickles(rootDir=None, pattern="*stock_data_*.pkl"):
+        if rootDir is None:
+            rootDir = Archiver.get_user_outputs_dir()
+        convertedStores = []
+        for fileName in glob.glob(pattern, root_dir=rootDir):
+            pickleFilePath = os.path.join(rootDir, fileName)
+            storePath = PKStockDataStore.storePathForCacheFile(pickleFilePath)
+            if PKStockDataStore.isUpToDate(storePath, pickleFilePath):
+                continue
+            try:
+                if PKStockDataStore.fromPickle(pickleFilePath, storePath) is not None:
+                    convertedStores.append(storePath)
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+        return convertedStores
+
+    def values(self, symbol):
+        i = self._rowIndex[symbol]
+        return self._values[self._offsets[i]:self._offsets[i + 1]]
+
+    def timestamps(self, symbol):
+        i = self._rowIndex[symbol]
+        return self._timestamps[self._offsets[i]:self._offsets[i + 1]]
+
+    # (UTC timestamps, values of the given columns) straight from the store,
+    # or None when the symbol is not held column-wise (or got overwritten).
+    def columnValues(self, symbol, columns):
+        if symbol in self._overlay or symbol not in self._rowIndex:
+            return None
+        stockColumns = self._symbolColumns[symbol]
+        if any(col not in stockColumns for col in columns):
+            return None
+        return self.timestamps(symbol), self.values(symbol)[:, [self.columns.index(col) for col in columns]]
+
+    # (number of rows, UTC timestamp, values of the last row) of a symbol
+    # without building its frame, or None when it's not held column-wise.
+    def lastRow(self, symbol):
+        if symbol in self._overlay or symbol not in self._rowIndex:
+            return None
+        timestamps = self.timestamps(symbol)
+        if len(timestamps) == 0:
+            return None
+        return len(timestamps), int(timestamps[-1]), tuple(self.values(symbol)[-1].tolist())
+
+    def dateIndex(self, symbol):
+        index = pd.DatetimeIndex(self.timestamps(symbol).view("M8[ns]"))
+        tz = self._symbolTimezones.get(symbol)
+        if tz is not None:
+            index = index.tz_localize("UTC").tz_convert(tz)
+        return index
+
+    def _storedSplitDict(self, symbol):
+        stockColumns = self._symbolColumns[symbol]
+        values = self.values(symbol)
+        if stockColumns != self.columns:
+            values = values[:, [self.columns.index(col) for col in stockColumns]]
+        splitDict = {"index": self.dateIndex(symbol), "columns": list(stockColumns), "data": values}
+        splitDict.update(self._extras.get(symbol, {}))
+        return splitDict
+
+    def dataFrame(self, symbol):
+        splitDict = self.get(symbol)
+        if splitDict is None:
+            return None
+        return pd.DataFrame(splitDict["data"], columns=splitDict["columns"], index=splitDict["index"])
+
+    def get(self, symbol, default=None):
+        if symbol in self._overlay:
+            return self._overlay[symbol]
+        if symbol in self._rowIndex:
+            return self._storedSplitDict(symbol)
+        if symbol in self._unconverted:
+            return self._unconverted[symbol]
+        return default
+
+    def __getitem__(self, symbol):
+        splitDict = self.get(symbol)
+        if splitDict is None:
+            raise KeyError(symbol)
+        return splitDict
+
+    def __setitem__(self, symbol, splitDict):
+        self._overlay[symbol] = splitDict
+
+    def __contains__(self, symbol):
+        return symbol in self._overlay or symbol in self._rowIndex or symbol in self._unconverted
+
+    def keys(self):
+        allKeys = list(self.symbols)
+        allKeys.extend([symbol for symbol in self._unconverted.keys() if symbol not in self._rowIndex])
+        allKeys.extend([symbol for symbol in self._overlay.keys() if symbol not in self._rowIndex and symbol not in self._unconverted])
+        return allKeys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        for symbol in self.keys():
+            yield symbol, self.get(symbol)
+
+    def update(self, otherDict):
+        for symbol, splitDict in otherDict.items():
+            self[symbol] = splitDict
+
+    # Materializes the whole universe into a plain dictionary (e.g. to pickle it)
+    def copy(self):
+        copiedDict = {}
+        for symbol, splitDict in self.items():
+            data = splitDict.get("data")
+            if isinstance(data, np.ndarray) and not data.flags.owndata:
+                splitDict = dict(splitDict)
+                splitDict["data"] = np.array(splitDict["data"])
+            copiedDict[symbol] = splitDict
+        return copiedDict
+
+    @property
+    def nbytes(self):
+        return self._values.nbytes + self._timestamps.nbytes + self._offsets.nbytes
+
+
+if __name__ == "__main__":
+    # python -m pkscreener.classes.PKStockDataStore [folder containing stock_data_*.pkl]
+    for convertedStore in PKStockDataStore.convertPickles(rootDir=sys.argv[1] if len(sys.argv) > 1 else None):
+        print(f"[+] Converted into {convertedStore}")
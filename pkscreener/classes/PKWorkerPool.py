@@ -0,0 +1,276 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import math
+import multiprocessing
+import sys
+import time
+from queue import Empty
+
+from PKDevTools.classes.log import default_logger
+from PKDevTools.classes.PKMultiProcessorClient import PKMultiProcessorClient
+
+from pkscreener.classes.PKIndicatorEngine import PKIndicatorEngine
+from pkscreener.classes.PKScanRecord import PKScanRecord
+from pkscreener.classes.PKSharedStockData import PKSharedStockData
+
+# Everything a warm worker needs to run the items of one scan. It is sent once
+# to each worker through the worker's own job queue, so it only carries what
+# pickles cheaply: shared stock data and the indicator engine pickle to the
+# names of their shared memory blocks, and the config travels as its plain
+# settings because the ConfigManager singleton holds a lock. The itemTemplate
+# is a typical item of the scan: queued items only carry their differences
+# from it (usually just the stock), not all the arguments with the userArgs.
+class PKScanJob:
+    def __init__(self, jobId, configManager, objectDictionaryPrimary=None, objectDictionarySecondary=None, candlePatterns=None, indicatorEngine=None, dbFileNamePrimary=None, dbFileNameSecondary=None, itemTemplate=None):
+        self.jobId = jobId
+        self.itemTemplate = itemTemplate
+        self.settings = {key: value for key, value in vars(configManager).items() if key != "attributes"}
+        self.objectDictionaryPrimary = objectDictionaryPrimary
+        self.objectDictionarySecondary = objectDictionarySecondary
+        self.candlePatterns = candlePatterns
+        self.indicatorEngine = indicatorEngine
+        self.dbFileNamePrimary = dbFileNamePrimary
+        self.dbFileNameSecondary = dbFileNameSecondary
+
+    # Runs in the worker when it picks up the first item of this job
+    def applyTo(self, worker):
+        PKScanJob.detach(worker.objectDictionaryPrimary, self.objectDictionaryPrimary)
+        PKScanJob.detach(worker.objectDictionarySecondary, self.objectDictionarySecondary)
+        worker.configManager.__dict__.update(self.settings)
+        worker.objectDictionaryPrimary = self.objectDictionaryPrimary
+        worker.objectDictionarySecondary = self.objectDictionarySecondary
+        worker.candlePatterns = self.candlePatterns
+        if worker.screener is not None:
+            PKScanJob.detach(worker.screener.indicatorEngine, self.indicatorEngine)
+            worker.screener.indicatorEngine = self.indicatorEngine
+        worker.dbFileNamePrimary = self.dbFileNamePrimary
+        worker.dbFileNameSecondary = self.dbFileNameSecondary
+        worker.refreshDatabase = (self.dbFileNamePrimary is not None) or (self.dbFileNameSecondary is not None)
+        worker.itemTemplate = self.itemTemplate
+        worker.jobId = self.jobId
+
+    # Lets go of the shared memory mapping of the previous job's data
+    def detach(previous, current):
+        if previous is not current and isinstance(previous, (PKSharedStockData, PKIndicatorEngine)):
+            previous.close()
+
+
+# A PKMultiProcessorClient that stays up between scans. Tasks are batches of
+# items, (jobId, [item changes]), and the answers of a batch go back together
+# as (jobId, [answers]). Items of a job that is no longer active (cancelled or
+# finished early) are skipped. Answers carry a PKScanRecord in place of the
+# stock's data, which the parent has no use for beyond a date and some closes.
+class PKScanWorker(PKMultiProcessorClient):
+    def __init__(self, *args, jobQueue=None, activeJobId=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jobQueue = jobQueue
+        self.activeJobId = activeJobId
+        self.itemTemplate = None
+        self.jobId = 0
+
+    def startJob(self, jobId):
+        try:
+            job = self.jobQueue.get()
+            while job.jobId < jobId:
+                job = self.jobQueue.get()
+            job.applyTo(self)
+        except Exception as e:
+            # Carry on with what we had rather than leave the parent waiting
+            self.default_logger.debug(e, exc_info=True)
+            self.jobId = jobId
+
+    # Closes a backtest result needs for its forward returns (PKForwardReturns.window)
+    def backtestWindow(self):
+        return max(int(prd) for prd in self.configManager.periodsRange) + 1
+
+    def processQueueItems(self):
+        while not self.keyboardInterruptEvent.is_set():
+            try:
+                task = self.task_queue.get()
+            except Empty as e:
+                self.default_logger.debug(e, exc_info=True)
+                continue
+            except KeyboardInterrupt as e:
+                self.default_logger.debug(e, exc_info=True)
+                sys.exit(0)
+            if task is None:
+                self.task_queue.task_done()
+                break
+            jobId, batch = task
+            if jobId > self.jobId:
+                self.startJob(jobId)
+            answers = []
+            for changes in batch:
+                if jobId != self.activeJobId.value:
+                    break
+                answer = None
+                try:
+                    if self.refreshDatabase:
+                        self._reloadDatabase()
+                    item = PKWorkerPool.itemFrom(changes, self.itemTemplate)
+                    answer = PKScanRecord.compact(
+                        self.processorMethod(*item, self),
+                        self.backtestWindow() if item[0] == "B" else 0,
+                    )
+                except Exception as e:
+                    # The parent waits for one answer per item, so don't die on it
+                    self.default_logger.debug(e, exc_info=True)
+                answers.append(answer)
+            self.task_queue.task_done()
+            if jobId == self.activeJobId.value:
+                self.result_queue.put((jobId, answers))
+
+
+# The warm pool of PKScanWorkers of this process. It is started by the first
+# scan and reused by every later one (runApplication loops, -m monitors, cron
+# cycles, piped scans) until the application exits.
+class PKWorkerPool:
+    workers = []
+    tasks_queue = None
+    results_queue = None
+    logging_queue = None
+    activeJobId = None
+    lastJobId = 0
+    itemTemplate = None
+
+    def isRunning(totalWorkers=1, exactly=False):
+        workers = PKWorkerPool.workers
+        if len(workers) < totalWorkers or (exactly and len(workers) != totalWorkers):
+            return False
+        return all(worker.is_alive() for worker in workers)
+
+    def newJobQueue():
+        if PKWorkerPool.activeJobId is None:
+            PKWorkerPool.activeJobId = multiprocessing.Value("i", 0)
+        return multiprocessing.Queue()
+
+    def register(workers, tasks_queue, results_queue, logging_queue):
+        PKWorkerPool.workers = workers
+        PKWorkerPool.tasks_queue = tasks_queue
+        PKWorkerPool.results_queue = results_queue
+        PKWorkerPool.logging_queue = logging_queue
+
+    # Hands the job to every worker and makes it the active one. A worker only
+    # takes its jobs when it gets items, so the jobs of the scans it had no
+    # items of are dropped here, as this one supersedes them anyway.
+    def submit(job):
+        for worker in PKWorkerPool.workers:
+            PKWorkerPool.drain(worker.jobQueue)
+            worker.jobQueue.put(job)
+        PKWorkerPool.itemTemplate = job.itemTemplate
+        PKWorkerPool.activeJobId.value = job.jobId
+
+    def nextJobId():
+        PKWorkerPool.lastJobId += 1
+        return PKWorkerPool.lastJobId
+
+    # The task for a batch of items of the active job. Items are sent as the
+    # {index: value} of the fields that differ from the job's itemTemplate.
+    def batch(items):
+        template = PKWorkerPool.itemTemplate
+        if template is None:
+            return (PKWorkerPool.activeJobId.value, list(items))
+        changes = []
+        for item in items:
+            if len(item) != len(template):
+                changes.append(item)
+            else:
+                changes.append({i: value for i, (value, templateValue) in enumerate(zip(item, template)) if value is not templateValue})
+        return (PKWorkerPool.activeJobId.value, changes)
+
+    def itemFrom(changes, template):
+        if not isinstance(changes, dict):
+            return changes
+        return tuple(changes.get(i, templateValue) for i, templateValue in enumerate(template))
+
+    # Waits for the answers to the next batch of the active job, dropping
+    # stale answers of earlier jobs that were still on their way.
+    def nextResults(results_queue):
+        jobId, answers = results_queue.get()
+        while jobId != PKWorkerPool.activeJobId.value:
+            jobId, answers = results_queue.get()
+        return answers
+
+    # Stops the active job. Workers skip whatever is still queued for it.
+    def cancel():
+        if PKWorkerPool.activeJobId is not None:
+            PKWorkerPool.activeJobId.value = 0
+        for queue in [PKWorkerPool.tasks_queue, PKWorkerPool.results_queue]:
+            PKWorkerPool.drain(queue)
+
+    def drain(queue):
+        try:
+            while queue is not None:
+                queue.get_nowait()
+        except Empty:
+            pass
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+
+    def reset():
+        PKWorkerPool.register([], None, None, None)
+
+
+# Hands out the items of a scan in batches that keep a worker busy for about
+# TARGET_SECONDS, going by how long the stocks took so far. Cheap scans thus
+# go out in large batches instead of paying a queue round trip per stock.
+# Batches get smaller towards the end so that whichever worker is free picks
+# up the rest and all of them finish at about the same time.
+class PKTaskBatches:
+    TARGET_SECONDS = 0.2
+    INITIAL_SIZE = 2
+    MAX_SIZE = 512
+    # Batches kept queued per worker, so that none of them waits for the parent
+    QUEUED_PER_WORKER = 2
+
+    def __init__(self, items, workers):
+        self.items = items
+        self.workers = max(1, workers)
+        self.dispatched = 0
+        self.completed = 0
+        self.startTime = None
+
+    def remaining(self):
+        return len(self.items) - self.dispatched
+
+    def batchSize(self):
+        if self.completed == 0:
+            size = PKTaskBatches.INITIAL_SIZE
+        else:
+            secondsPerStock = (time.time() - self.startTime) * self.workers / self.completed
+            size = int(PKTaskBatches.TARGET_SECONDS / secondsPerStock) if secondsPerStock > 0 else PKTaskBatches.MAX_SIZE
+        fairShare = math.ceil(self.remaining() / (PKTaskBatches.QUEUED_PER_WORKER * self.workers))
+        return max(1, min(size, fairShare, PKTaskBatches.MAX_SIZE))
+
+    def nextBatch(self):
+        if self.startTime is None:
+            self.startTime = time.time()
+        size = self.batchSize()
+        batch = self.items[self.dispatched:self.dispatched + size]
+        self.dispatched += len(batch)
+        return batch
+
+    def markCompleted(self, count):
+        self.completed += count
@@ -433,6 +433,12 @@ class pktalib:
             # default_logger().debug(e, exc_info=True)
             return talib.CDLENGULFING(open, high, low, close)
 
+    # Number of leading bars for which the TA-Lib function returns no value
+    @classmethod
+    def lookback(self, functionName):
+        from talib import abstract
+        return abstract.Function(functionName).lookback
+
     @classmethod
     def argrelextrema(self, data, comparator, axis=0, order=1, mode="clip"):
         """
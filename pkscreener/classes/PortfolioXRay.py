@@ -34,7 +34,6 @@ from PKDevTools.classes.log import default_logger
 from pkscreener.classes.ConfigManager import parser, tools
 from pkscreener.classes.Portfolio import Portfolio, PortfolioCollection
 from pkscreener.classes.PKTask import PKTask
-from pkscreener.classes.PKScheduler import PKScheduler
 from PKDevTools.classes.OutputControls import OutputControls
 
 configManager = tools()
@@ -357,46 +356,6 @@ def getBacktestDataFromCleanedData(args, saveResults, df, periods,progressLabel:
         df = pd.concat([df, df_target], axis=1)
     return df
 
-def statScanCalculationForNoFilter(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(saveResults, period, "NoFilter", userArgs,task)
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
-def statScanCalculationForPatterns(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    df_grouped = saveResults.groupby("Pattern")
-    for pattern, df_group in df_grouped:
-        if pattern is None or len(pattern) == 0:
-            pattern = "No Pattern"
-        scanResults.append(
-                    getCalculatedValues(df_group, period, f"[P]{pattern}", userArgs,task)
-                )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
 def ensureColumnsExist(saveResults):
     columns = ['Stock', 'Date', 'Volume', 'Trend', 'MA-Signal', 'LTP', '52Wk-H',
                '52Wk-L', '1-Pd', '2-Pd', '3-Pd', '4-Pd', '5-Pd', '10-Pd', '15-Pd',
@@ -415,16 +374,14 @@ def ensureColumnsExist(saveResults):
 def cleanupData(savedResults):
     saveResults = savedResults.copy()
     saveResults = ensureColumnsExist(saveResults)
+    # Only the text columns can have color styles. Numeric columns are kept as-is.
     for col in saveResults.columns:
-        saveResults.loc[:, col] = saveResults.loc[:, col].apply(
-                lambda x: Utility.tools.removeAllColorStyles(x)
-            )
+        if saveResults[col].dtype == object:
+            saveResults[col] = Utility.tools.removeAllColorStylesFromColumn(saveResults[col])
 
     saveResults["LTP"] = saveResults["LTP"].astype(float).fillna(0.0)
     saveResults["RSI"] = saveResults["RSI"].astype(float).fillna(0.0)
-    saveResults.loc[:, "Volume"] = saveResults.loc[:, "Volume"].apply(
-            lambda x: x.replace("x", "")
-        )
+    saveResults["Volume"] = saveResults["Volume"].astype(str).str.replace("x", "", regex=False)
     if f"Trend({configManager.daysToLookback}Prds)" not in saveResults.columns:
         saveResults.rename(
                 columns={
@@ -434,18 +391,20 @@ def cleanupData(savedResults):
                 },
                 inplace=True,
             )
-    saveResults.loc[:, f"Consol."] = saveResults.loc[
-            :, f"Consol."
-        ].apply(lambda x: x.replace("Range:", "").replace("%", ""))
+    saveResults["Consol."] = (
+            saveResults["Consol."].astype(str)
+            .str.replace("Range:", "", regex=False)
+            .str.replace("%", "", regex=False)
+        )
     saveResults[["Breakout", "Resistance"]] = saveResults[
             f"Breakout({configManager.daysToLookback}Prds)"
-        ].str.split(" R: ", n=1, expand=True)
-    saveResults.loc[:, "Breakout"] = saveResults.loc[:, "Breakout"].apply(
-            lambda x: x.replace("BO: ", "").replace(" ", "")
+        ].astype(str).str.split(" R: ", n=1, expand=True).reindex(columns=[0, 1])
+    saveResults["Breakout"] = (
+            saveResults["Breakout"]
+            .str.replace("BO: ", "", regex=False)
+            .str.replace(" ", "", regex=False)
         )
-    saveResults.loc[:, "Resistance"] = saveResults.loc[
-            :, "Resistance"
-        ].apply(lambda x: x.replace("(Potential)", "") if x is not None else x)
+    saveResults["Resistance"] = saveResults["Resistance"].str.replace("(Potential)", "", regex=False)
     saveResults["Volume"] = saveResults["Volume"].astype(float).fillna(0.0)
     saveResults[f"Consol."] = (
             saveResults[f"Consol."].astype(float).fillna(0.0)
@@ -470,355 +429,109 @@ def getbacktestPeriod(args):
     return backtestPeriods
 
 def statScanCalculations(userArgs, saveResults, periods,progressLabel:str=None):
-    scanResults = []
-    task1 = PKTask(f"[{len(saveResults)}] RSI Stats",long_running_fn=statScanCalculationForRSI)
-    task2 = PKTask(f"[{len(saveResults)}] Trend Stats",long_running_fn=statScanCalculationForTrend)
-    task3 = PKTask(f"[{len(saveResults)}] MA Stats",long_running_fn=statScanCalculationForMA)
-    task4 = PKTask(f"[{len(saveResults)}] Volume Stats",long_running_fn=statScanCalculationForVol)
-    task5 = PKTask(f"[{len(saveResults)}] Consolidation Stats",long_running_fn=statScanCalculationForConsol)
-    task6 = PKTask(f"[{len(saveResults)}] Breakout Stats",long_running_fn=statScanCalculationForBO)
-    task7 = PKTask(f"[{len(saveResults)}] 52Week Stats",long_running_fn=statScanCalculationFor52Wk)
-    task8 = PKTask(f"[{len(saveResults)}] CCI Stats",long_running_fn=statScanCalculationForCCI)
-    task9 = PKTask(f"[{len(saveResults)}] CCI Stats",long_running_fn=statScanCalculationForPatterns)
-    task10 = PKTask(f"[{len(saveResults)}] NoFilter Stats",long_running_fn=statScanCalculationForNoFilter)
-    tasksList=[task1,task2,task3,task4,task5,task6,task7,task8,task9,task10]
-    for task in tasksList:
-        task.long_running_fn_args = (userArgs, saveResults, periods, scanResults)
-    if configManager.enablePortfolioCalculations:
-        PKScheduler.scheduleTasks(tasksList,label=progressLabel,showProgressBars=True,timeout=600)
-    else:
-        for task in tasksList:
-            task.long_running_fn(*(task,))
-    for task in tasksList:
-        if task.result is not None and len(task.result) > 0:
-            scanResults.extend(task.result)
-    return scanResults
-
-def statScanCalculationForCCI(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterCCIBelowMinus100(saveResults), period, "[CCI]<=-100", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterCCIBelow0(saveResults), period, "[CCI]-100<C<0", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterCCI0To100(saveResults), period, "[CCI]0<=C<=100", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterCCI100To200(saveResults), period, "[CCI]100<C<=200", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterCCIAbove200(saveResults), period, "[CCI]>200", userArgs,task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
-def statScanCalculationFor52Wk(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPMoreOREqual52WkH(saveResults), period, "[52Wk]LTP>=H", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPWithin90Percent52WkH(saveResults),
-                    period,
-                    "[52Wk]LTP>=.9*H",
-                    userArgs,
-                    task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPLess90Percent52WkH(saveResults),
-                    period,
-                    "[52Wk]LTP<.9*H",
-                    userArgs,
-                    task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPMore52WkL(saveResults), period, "[52Wk]LTP>L", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPWithin90Percent52WkL(saveResults),
-                    period,
-                    "[52Wk]LTP>=1.1*L",
-                    userArgs,
-                    task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPLess52WkL(saveResults), period, "[52Wk]LTP<=L", userArgs,task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
-def statScanCalculationForBO(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPLessThanBreakout(saveResults), period, "[BO]LTP<BO", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPMoreOREqualBreakout(saveResults),
-                    period,
-                    "[BO]LTP>=BO",
-                    userArgs,
-                    task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPLessThanResistance(saveResults), period, "[BO]LTP<R", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterLTPMoreOREqualResistance(saveResults),
-                    period,
-                    "[BO]LTP>=R",
-                    userArgs,
-                    task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
-def statScanCalculationForConsol(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterConsolidating10Percent(saveResults), period, "Cons.<=10", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterConsolidatingMore10Percent(saveResults),
-                    period,
-                    "Cons.>10",
-                    userArgs,
-                    task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
-def statScanCalculationForVol(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterVolumeLessThan25(saveResults), period, "Vol<2.5", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterVolumeMoreThan25(saveResults), period, "Vol>=2.5", userArgs,task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
-def statScanCalculationForMA(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterMASignalBullish(saveResults), period, "[MA]Bull", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterMASignalBearish(saveResults), period, "[MA]Bear", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterMASignalNeutral(saveResults), period, "[MA]Neutral", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterMASignalBullCross(saveResults), period, "[MA]BullCross", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterMASignalBearCross(saveResults), period, "[MA]BearCross", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterMASignalSupport(saveResults), period, "[MA]Support", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterMASignalResist(saveResults), period, "[MA]Resist", userArgs,task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
-
-def statScanCalculationForTrend(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterTrendStrongUp(saveResults), period, "[T]StrongUp", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterTrendWeakUp(saveResults), period, "[T]WeakUp", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterTrendUp(saveResults), period, "[T]TrendUp", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterTrendStrongDown(saveResults), period, "[T]StrongDown", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterTrendWeakDown(saveResults), period, "[T]WeakDown", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterTrendSideways(saveResults), period, "[T]Sideways", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterTrendDown(saveResults), period, "[T]TrendDown", userArgs,task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
-    return scanResults
+    # All the strategies are evaluated together as boolean masks over the
+    # results instead of filtering the results once per strategy.
+    return getCalculatedValuesForStrategies(
+        saveResults, strategyMasks(saveResults), periods, userArgs
+    )
 
-def statScanCalculationForRSI(*args, **kwargs):
-    task = None
-    if isinstance(args[0], PKTask):
-        task = args[0]
-        userArgs, saveResults, period, scanResults = task.long_running_fn_args
-    else:
-        userArgs, saveResults, period, scanResults = args[0],args[1],args[2],args[3]
-    scanResults.append(
-                getCalculatedValues(
-                    filterRSIAbove50(saveResults), period, "[RSI]>=50", userArgs, task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterRSI50To67(saveResults), period, "[RSI]50<=RSI<=67", userArgs,task
-                )
-            )
-    scanResults.append(
-                getCalculatedValues(
-                    filterRSI68OrAbove(saveResults), period, "[RSI]>=68", userArgs,task
-                )
-            )
-    if task is not None:
-        if task.taskId > 0:
-            task.resultsDict[task.taskId] = scanResults
-            task.progressStatusDict[task.taskId] = {'progress': 1, 'total': 1}
-        else:
-            task.result = scanResults
+# The conditions of the strategies, in the order they are reported, as
+# functions of the results giving the boolean mask of those that satisfy
+# them. The filter... functions and strategyMasks are all built from these.
+STRATEGY_CONDITIONS = {
+    "[RSI]>=50": lambda df: df["RSI"] > 50,
+    "[RSI]50<=RSI<=67": lambda df: (df["RSI"] >= 50) & (df["RSI"] <= 67),
+    "[RSI]>=68": lambda df: df["RSI"] >= 68,
+    "[T]StrongUp": lambda df: trendOf(df) == "Strong Up",
+    "[T]WeakUp": lambda df: trendOf(df) == "Weak Up",
+    "[T]TrendUp": lambda df: trendOf(df).str.endswith("Up"),
+    "[T]StrongDown": lambda df: trendOf(df) == "Strong Down",
+    "[T]WeakDown": lambda df: trendOf(df) == "Weak Down",
+    "[T]Sideways": lambda df: trendOf(df) == "Sideways",
+    "[T]TrendDown": lambda df: trendOf(df).str.endswith("Down"),
+    "[MA]Bull": lambda df: df["MA-Signal"] == "Bullish",
+    "[MA]Bear": lambda df: df["MA-Signal"] == "Bearish",
+    "[MA]Neutral": lambda df: df["MA-Signal"] == "Neutral",
+    "[MA]BullCross": lambda df: df["MA-Signal"].astype(str).str.startswith("BullCross"),
+    "[MA]BearCross": lambda df: df["MA-Signal"].astype(str).str.startswith("BearCross"),
+    "[MA]Support": lambda df: df["MA-Signal"].astype(str).str.endswith("Support"),
+    "[MA]Resist": lambda df: df["MA-Signal"].astype(str).str.endswith("Resist"),
+    "Vol<2.5": lambda df: df["Volume"] < 2.5,
+    "Vol>=2.5": lambda df: df["Volume"] >= 2.5,
+    "Cons.<=10": lambda df: df["Consol."] <= 10,
+    "Cons.>10": lambda df: df["Consol."] > 10,
+    "[BO]LTP<BO": lambda df: df["LTP"] < df["Breakout"],
+    "[BO]LTP>=BO": lambda df: (df["Breakout"] > 0) & (df["LTP"] >= df["Breakout"]),
+    "[BO]LTP<R": lambda df: df["LTP"] < df["Resistance"],
+    "[BO]LTP>=R": lambda df: (df["Resistance"] > 0) & (df["LTP"] >= df["Resistance"]),
+    "[52Wk]LTP>=H": lambda df: df["LTP"] >= df["52Wk-H"],
+    "[52Wk]LTP>=.9*H": lambda df: (df["LTP"] >= 0.9 * df["52Wk-H"]) & (df["LTP"] < df["52Wk-H"]),
+    "[52Wk]LTP<.9*H": lambda df: df["LTP"] < 0.9 * df["52Wk-H"],
+    "[52Wk]LTP>L": lambda df: (df["LTP"] > df["52Wk-L"]) & (df["LTP"] < 1.1 * df["52Wk-L"]),
+    "[52Wk]LTP>=1.1*L": lambda df: (df["LTP"] >= (1.1 * df["52Wk-L"])) & (df["LTP"] > df["52Wk-L"]),
+    "[52Wk]LTP<=L": lambda df: df["LTP"] <= df["52Wk-L"],
+    "[CCI]<=-100": lambda df: df["CCI"] <= -100,
+    "[CCI]-100<C<0": lambda df: (df["CCI"] > -100) & (df["CCI"] < 0),
+    "[CCI]0<=C<=100": lambda df: (df["CCI"] >= 0) & (df["CCI"] <= 100),
+    "[CCI]100<C<=200": lambda df: (df["CCI"] > 100) & (df["CCI"] <= 200),
+    "[CCI]>200": lambda df: df["CCI"] > 200,
+}
+
+def trendOf(df):
+    return df[f"Trend({configManager.daysToLookback}Prds)"].astype(str)
+
+# The strategies (in the order they are reported) and the boolean masks
+# of the results that satisfy them
+def strategyMasks(df):
+    masks = [(key, condition(df)) for key, condition in STRATEGY_CONDITIONS.items()]
+    masks.extend(patternMasks(df))
+    masks.append(("NoFilter", pd.Series(True, index=df.index)))
+    return masks
+
+# A "[P]{pattern}" strategy for each of the patterns in the results
+def patternMasks(df):
+    return [
+        (f"[P]{pattern if len(pattern) > 0 else 'No Pattern'}", df["Pattern"] == pattern)
+        for pattern in sorted(df["Pattern"].dropna().unique())
+    ]
+
+# Vectorized getCalculatedValues for all the strategies at once: the sums
+# of LTP, LTP{period} and Growth{period} of every strategy come out of a
+# single (strategies x results) @ (results x columns) matrix multiplication.
+def getCalculatedValuesForStrategies(df, masks, periods, userArgs=None):
+    if len(masks) == 0:
+        return []
+    columns = ["LTP"] + [f"LTP{period}" for period in periods] + [f"Growth{period}" for period in periods]
+    values = df[columns].astype(float).fillna(0.0).to_numpy()
+    weights = np.array([mask.to_numpy(dtype=bool) for _, mask in masks], dtype=float)
+    sums = np.round(weights @ values, 2)
+    ltpSum1ShareEach = sums[:, [0]]
+    tdySum1ShareEach = sums[:, 1 : 1 + len(periods)]
+    growthSum1ShareEach = sums[:, 1 + len(periods) :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentGrowth = np.where(
+            ltpSum1ShareEach > 0,
+            np.round(100 * growthSum1ShareEach / ltpSum1ShareEach, 2),
+            0,
+        )
+    growth10k = np.round(10000 * (1 + 0.01 * percentGrowth), 2)
+    percentGrowth = np.where(tdySum1ShareEach != 0, percentGrowth, 999999999)
+    growth10k = np.where(tdySum1ShareEach != 0, growth10k, 999999999)
+    scanResults = []
+    for strategyIndex, (key, mask) in enumerate(masks):
+        if configManager.enablePortfolioCalculations and userArgs.options.startswith("B"): # backtests
+            portfolio = Portfolio(name=key)
+            task = PKTask(f"[{key}] Portfolio", long_running_fn=portfolio.updatePortfolioFromXRayDataFrame)
+            task.long_running_fn(df[mask].fillna(0.0), configManager.periodsRange, task)
+            PortfolioCollection().addPortfolio(portfolio)
+        result_df = {"ScanType": key}
+        for periodIndex, period in enumerate(periods):
+            result_df[f"{period}Pd-PFV"] = tdySum1ShareEach[strategyIndex, periodIndex]
+            result_df[f"{period}Pd-%"] = percentGrowth[strategyIndex, periodIndex]
+            result_df[f"{period}Pd-10k"] = growth10k[strategyIndex, periodIndex]
+        scanResults.append(result_df)
     return scanResults
 
-
 def formatGridOutput(df,replacenan=True):
     if replacenan:
         df = df.replace(np.nan, "-", regex=True)
@@ -922,226 +635,156 @@ def getCalculatedValues(df, periods, key, userArgs=None, task=None):
     return collated_df  # , df_col
 
 
-def filterRSIAbove50(df):
+# The results (with the missing values as 0) that satisfy the condition of
+# the strategy with the given key
+def filterStrategy(df, key):
     if df is None:
         return None
-    return df[df["RSI"] > 50].fillna(0.0)
+    return df[STRATEGY_CONDITIONS[key](df)].fillna(0.0)
+
+
+def filterRSIAbove50(df):
+    return filterStrategy(df, "[RSI]>=50")
 
 
 def filterRSI50To67(df):
-    if df is None:
-        return None
-    return df[(df["RSI"] >= 50) & (df["RSI"] <= 67)].fillna(0.0)
+    return filterStrategy(df, "[RSI]50<=RSI<=67")
 
 
 def filterRSI68OrAbove(df):
-    if df is None:
-        return None
-    return df[df["RSI"] >= 68].fillna(0.0)
+    return filterStrategy(df, "[RSI]>=68")
 
 
 def filterTrendStrongUp(df):
-    if df is None:
-        return None
-    return df[df[f"Trend({configManager.daysToLookback}Prds)"] == "Strong Up"].fillna(0.0)
+    return filterStrategy(df, "[T]StrongUp")
 
 
 def filterTrendWeakUp(df):
-    if df is None:
-        return None
-    return df[df[f"Trend({configManager.daysToLookback}Prds)"] == "Weak Up"].fillna(0.0)
+    return filterStrategy(df, "[T]WeakUp")
 
 
 def filterTrendWeakDown(df):
-    if df is None:
-        return None
-    return df[df[f"Trend({configManager.daysToLookback}Prds)"] == "Weak Down"].fillna(0.0)
+    return filterStrategy(df, "[T]WeakDown")
 
 
 def filterTrendStrongDown(df):
-    if df is None:
-        return None
-    return df[df[f"Trend({configManager.daysToLookback}Prds)"] == "Strong Down"].fillna(0.0)
+    return filterStrategy(df, "[T]StrongDown")
 
 
 def filterTrendUp(df):
-    if df is None:
-        return None
-    return df[df[f"Trend({configManager.daysToLookback}Prds)"].astype(str).str.endswith("Up")].fillna(0.0)
+    return filterStrategy(df, "[T]TrendUp")
 
 
 def filterTrendSideways(df):
-    if df is None:
-        return None
-    return df[df[f"Trend({configManager.daysToLookback}Prds)"] == "Sideways"].fillna(0.0)
+    return filterStrategy(df, "[T]Sideways")
 
 
 def filterTrendDown(df):
-    if df is None:
-        return None
-    return df[df[f"Trend({configManager.daysToLookback}Prds)"].astype(str).str.endswith("Down")].fillna(0.0)
+    return filterStrategy(df, "[T]TrendDown")
 
 
 def filterMASignalBullish(df):
-    if df is None:
-        return None
-    return df[df["MA-Signal"] == "Bullish"].fillna(0.0)
+    return filterStrategy(df, "[MA]Bull")
 
 
 def filterMASignalBearish(df):
-    if df is None:
-        return None
-    return df[df["MA-Signal"] == "Bearish"].fillna(0.0)
+    return filterStrategy(df, "[MA]Bear")
 
 
 def filterMASignalNeutral(df):
-    if df is None:
-        return None
-    return df[df["MA-Signal"] == "Neutral"].fillna(0.0)
+    return filterStrategy(df, "[MA]Neutral")
 
 
 def filterMASignalBullCross(df):
-    if df is None:
-        return None
-    return df[df["MA-Signal"].astype(str).str.startswith("BullCross")].fillna(0.0)
+    return filterStrategy(df, "[MA]BullCross")
 
 
 def filterMASignalBearCross(df):
-    if df is None:
-        return None
-    return df[df["MA-Signal"].astype(str).str.startswith("BearCross")].fillna(0.0)
+    return filterStrategy(df, "[MA]BearCross")
 
 
 def filterMASignalSupport(df):
-    if df is None:
-        return None
-    return df[df["MA-Signal"].astype(str).str.endswith("Support")].fillna(0.0)
+    return filterStrategy(df, "[MA]Support")
 
 
 def filterMASignalResist(df):
-    if df is None:
-        return None
-    return df[df["MA-Signal"].astype(str).str.endswith("Resist")].fillna(0.0)
+    return filterStrategy(df, "[MA]Resist")
 
 
 def filterVolumeLessThan25(df):
-    if df is None:
-        return None
-    return df[df["Volume"] < 2.5].fillna(0.0)
+    return filterStrategy(df, "Vol<2.5")
 
 
 def filterVolumeMoreThan25(df):
-    if df is None:
-        return None
-    return df[df["Volume"] >= 2.5].fillna(0.0)
+    return filterStrategy(df, "Vol>=2.5")
 
 
 def filterConsolidating10Percent(df):
-    if df is None:
-        return None
-    return df[df[f"Consol."] <= 10].fillna(0.0)
+    return filterStrategy(df, "Cons.<=10")
 
 
 def filterConsolidatingMore10Percent(df):
-    if df is None:
-        return None
-    return df[df[f"Consol."] > 10].fillna(0.0)
+    return filterStrategy(df, "Cons.>10")
 
 
 def filterLTPLessThanBreakout(df):
-    if df is None:
-        return None
-    return df[df["LTP"] < df["Breakout"]].fillna(0.0)
+    return filterStrategy(df, "[BO]LTP<BO")
 
 
 def filterLTPMoreOREqualBreakout(df):
-    if df is None:
-        return None
-    return df[((df["Breakout"] > 0) & (df["LTP"] >= df["Breakout"]))].fillna(0.0)
+    return filterStrategy(df, "[BO]LTP>=BO")
 
 
 def filterLTPLessThanResistance(df):
-    if df is None:
-        return None
-    return df[df["LTP"] < df["Resistance"]].fillna(0.0)
+    return filterStrategy(df, "[BO]LTP<R")
 
 
 def filterLTPMoreOREqualResistance(df):
-    if df is None:
-        return None
-    return df[((df["Resistance"] > 0) & (df["LTP"] >= df["Resistance"]))].fillna(0.0)
+    return filterStrategy(df, "[BO]LTP>=R")
 
 
 def filterLTPMoreOREqual52WkH(df):
-    if df is None:
-        return None
-    return df[df["LTP"] >= df["52Wk-H"]].fillna(0.0)
+    return filterStrategy(df, "[52Wk]LTP>=H")
 
 
 def filterLTPWithin90Percent52WkH(df):
-    if df is None:
-        return None
-    return df[(df["LTP"] >= 0.9 * df["52Wk-H"]) & (df["LTP"] < df["52Wk-H"])].fillna(
-        0.0
-    )
+    return filterStrategy(df, "[52Wk]LTP>=.9*H")
 
 
 def filterLTPLess90Percent52WkH(df):
-    if df is None:
-        return None
-    return df[df["LTP"] < 0.9 * df["52Wk-H"]].fillna(0.0)
+    return filterStrategy(df, "[52Wk]LTP<.9*H")
 
 
 def filterLTPMore52WkL(df):
-    if df is None:
-        return None
-    return df[((df["LTP"] > df["52Wk-L"]) & (df["LTP"] < 1.1 * df["52Wk-L"]))].fillna(
-        0.0
-    )
+    return filterStrategy(df, "[52Wk]LTP>L")
 
 
 def filterLTPWithin90Percent52WkL(df):
-    if df is None:
-        return None
-    return df[(df["LTP"] >= (1.1 * df["52Wk-L"])) & (df["LTP"] > df["52Wk-L"])].fillna(
-        0.0
-    )
+    return filterStrategy(df, "[52Wk]LTP>=1.1*L")
 
 
 def filterLTPLess52WkL(df):
-    if df is None:
-        return None
-    return df[df["LTP"] <= df["52Wk-L"]].fillna(0.0)
+    return filterStrategy(df, "[52Wk]LTP<=L")
 
 
 def filterCCIBelowMinus100(df):
-    if df is None:
-        return None
-    return df[df["CCI"] <= -100].fillna(0.0)
+    return filterStrategy(df, "[CCI]<=-100")
 
 
 def filterCCIBelow0(df):
-    if df is None:
-        return None
-    return df[(df["CCI"] > -100) & (df["CCI"] < 0)].fillna(0.0)
+    return filterStrategy(df, "[CCI]-100<C<0")
 
 
 def filterCCI0To100(df):
-    if df is None:
-        return None
-    return df[(df["CCI"] >= 0) & (df["CCI"] <= 100)].fillna(0.0)
+    return filterStrategy(df, "[CCI]0<=C<=100")
 
 
 def filterCCI100To200(df):
-    if df is None:
-        return None
-    return df[(df["CCI"] > 100) & (df["CCI"] <= 200)].fillna(0.0)
+    return filterStrategy(df, "[CCI]100<C<=200")
 
 
 def filterCCIAbove200(df):
-    if df is None:
-        return None
-    return df[(df["CCI"] > 200)].fillna(0.0)
+    return filterStrategy(df, "[CCI]>200")
 
 def returnNoFilter(df):
     return df
@@ -1149,15 +792,10 @@ def returnNoFilter(df):
 def filterPattern(df, pattern="[P]No Pattern"):
     if df is None:
         return None
-    match_df = None
-    df_grouped = df.groupby("Pattern")
-    for foundPattern, df_group in df_grouped:
-        if foundPattern is None or len(foundPattern) == 0:
-            foundPattern = "No Pattern"
-        if f"[P]{foundPattern}" == pattern:
-            match_df = df_group
-            break
-    return match_df
+    for key, mask in patternMasks(df):
+        if key == pattern:
+            return df[mask]
+    return None
 
 def strategyDictionary():
     """
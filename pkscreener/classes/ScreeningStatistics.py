@@ -24,7 +24,6 @@
 """
 
 import math
-import sys
 import warnings
 import datetime
 import numpy as np
@@ -37,15 +36,18 @@ from sys import float_info as sflt
 import pkscreener.classes.Utility as Utility
 from pkscreener import Imports
 from pkscreener.classes.Pktalib import pktalib
+from pkscreener.classes.PKLorentzianClassifier import PKLorentzianClassifier
 from PKDevTools.classes.OutputControls import OutputControls
 from PKNSETools.morningstartools import Stock
 
-if sys.version_info >= (3, 11):
-    import advanced_ta as ata
-
 # from sklearn.preprocessing import StandardScaler
-if Imports["scipy"]:
-    from scipy.stats import linregress
+if Imports["numba"]:
+    try:
+        from numba import njit
+    except Exception:  # pragma: no cover
+        njit = None
+else:
+    njit = None
 
 from PKDevTools.classes.ColorText import colorText
 from PKDevTools.classes.PKDateUtilities import PKDateUtilities
@@ -53,6 +55,41 @@ from PKDevTools.classes.SuppressOutput import SuppressOutput
 from PKDevTools.classes.MarketHours import MarketHours
 # from PKDevTools.classes.log import measure_time
 
+# Recursive ATR trailing stop, same rules as ScreeningStatistics.xATRTrailingStop_func.
+# Works on numpy arrays (compiled with numba) as well as on plain python lists.
+def _atrTrailingStopsKernel(close, nLoss, stops):
+    for i in range(1, len(close)):
+        prevStop = stops[i - 1]
+        if close[i] > prevStop and close[i - 1] > prevStop:
+            stop = close[i] - nLoss[i]
+            stops[i] = stop if stop > prevStop else prevStop
+        elif close[i] < prevStop and close[i - 1] < prevStop:
+            stop = close[i] + nLoss[i]
+            stops[i] = stop if stop < prevStop else prevStop
+        elif close[i] > prevStop:
+            stops[i] = close[i] - nLoss[i]
+        else:
+            stops[i] = close[i] + nLoss[i]
+    return stops
+
+_compiledATRTrailingStopsKernel = None
+if njit is not None:
+    try:
+        _compiledATRTrailingStopsKernel = njit(cache=True, nogil=True)(_atrTrailingStopsKernel)
+    except Exception:  # pragma: no cover
+        _compiledATRTrailingStopsKernel = None
+
+def atrTrailingStops(close, nLoss):
+    close = np.asarray(close, dtype=np.float64)
+    nLoss = np.asarray(nLoss, dtype=np.float64)
+    if _compiledATRTrailingStopsKernel is not None:
+        try:
+            return _compiledATRTrailingStopsKernel(close, nLoss, np.zeros(len(close)))
+        except Exception:  # pragma: no cover
+            pass
+    # Python floats in lists are much cheaper to index than numpy scalars
+    return np.array(_atrTrailingStopsKernel(close.tolist(), nLoss.tolist(), [0.0] * len(close)), dtype=np.float64)
+
 # Exception for only downloading stock data and not screening
 class DownloadDataOnly(Exception):
     pass
@@ -89,6 +126,9 @@ class ScreeningStatistics:
         self.configManager = configManager
         self.default_logger = default_logger
         self.shouldLog = shouldLog
+        # Set by the parent process (PKScanRunner) when indicators have been
+        # precomputed for the whole universe. See PKIndicatorEngine.
+        self.indicatorEngine = None
 
     # Find stocks that have broken through 52 week high.
     def find52WeekHighBreakout(self, df):
@@ -283,15 +323,7 @@ class ScreeningStatistics:
         data = data.dropna()
         data = data.reset_index()
         # Filling ATRTrailingStop Variable
-        data["ATRTrailingStop"] = [0.0] + [np.nan for i in range(len(data) - 1)]
-        
-        for i in range(1, len(data)):
-            data.loc[i, "ATRTrailingStop"] = self.xATRTrailingStop_func(
-                data.loc[i, "Close"],
-                data.loc[i - 1, "Close"],
-                data.loc[i - 1, "ATRTrailingStop"],
-                data.loc[i, "nLoss"],
-            )
+        data["ATRTrailingStop"] = atrTrailingStops(data["Close"].to_numpy(), data["nLoss"].to_numpy())
         data = self.computeBuySellSignals(data,ema_period=ema_period)
         if data is None:
             return False
@@ -1544,153 +1576,107 @@ class ScreeningStatistics:
     def findTrend(self, df, screenDict, saveDict, daysToLookback=None, stockName=""):
         if df is None or len(df) == 0:
             return "Unknown"
-        data = df.copy()
         if daysToLookback is None:
             daysToLookback = self.configManager.daysToLookback
-        data = data.head(daysToLookback)
-        data = data[::-1]
-        data = data.set_index(np.arange(len(data)))
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
         saved = self.findCurrentSavedValue(screenDict,saveDict,"Trend")
         try:
-            with SuppressOutput(suppress_stdout=True, suppress_stderr=True):
-                data["tops"] = data["Close"].iloc[
-                    list(
-                        pktalib.argrelextrema(
-                            np.array(data["Close"]), np.greater_equal, order=1
-                        )[0]
-                    )
-                ]
-            data = data.fillna(0)
-            data = data.replace([np.inf, -np.inf], 0)
-
-            try:
-                # if len(data) < daysToLookback:
-                #     self.default_logger.debug(data)
-                #     raise StockDataNotAdequate
-                data = data.replace(np.inf, np.nan).replace(-np.inf, np.nan).dropna()
-                if len(data["tops"][data.tops > 0]) > 1:
-                    slope = np.polyfit(
-                        data.index[data.tops > 0], data["tops"][data.tops > 0], 1
-                    )[0]
-                else:
-                    slope = 0
-            except np.linalg.LinAlgError as e: # pragma: no cover
-                self.default_logger.debug(e, exc_info=True)
-                screenDict["Trend"] = (
-                    saved[0] + colorText.BOLD + colorText.WARN + "Unknown" + colorText.END
-                )
-                saveDict["Trend"] = saved[1] + "Unknown"
-                return saveDict["Trend"]
-            except Exception as e:  # pragma: no cover
-                self.default_logger.debug(e, exc_info=True)
-                slope, _ = 0, 0
-            angle = np.rad2deg(np.arctan(slope))
-            if angle == 0:
-                screenDict["Trend"] = (
-                    saved[0] + colorText.BOLD + colorText.WARN + "Unknown" + colorText.END
-                )
-                saveDict["Trend"] = saved[1] + "Unknown"
-            elif angle <= 30 and angle >= -30:
-                screenDict["Trend"] = (
-                    saved[0] + colorText.BOLD + colorText.WARN + "Sideways" + colorText.END
-                )
-                saveDict["Trend"] = saved[1] + "Sideways"
-            elif angle >= 30 and angle < 61:
-                screenDict["Trend"] = (
-                    saved[0] + colorText.BOLD + colorText.GREEN + "Weak Up" + colorText.END
-                )
-                saveDict["Trend"] = saved[1] + "Weak Up"
-            elif angle >= 60:
-                screenDict["Trend"] = (
-                    saved[0] + colorText.BOLD + colorText.GREEN + "Strong Up" + colorText.END
-                )
-                saveDict["Trend"] = saved[1] + "Strong Up"
-            elif angle <= -30 and angle > -61:
-                screenDict["Trend"] = (
-                    saved[0] + colorText.BOLD + colorText.FAIL + "Weak Down" + colorText.END
-                )
-                saveDict["Trend"] = saved[1] + "Weak Down"
-            elif angle < -60:
-                screenDict["Trend"] = (
-                    saved[0] + colorText.BOLD + colorText.FAIL + "Strong Down" + colorText.END
-                )
-                saveDict["Trend"] = saved[1] + "Strong Down"
-        except np.linalg.LinAlgError as e: # pragma: no cover
+            closes = df["Close"].to_numpy(dtype=float)[:daysToLookback][::-1]
+            trend = self.findTrends(closes.reshape(-1, 1))[0]
+        except Exception as e:  # pragma: no cover
             self.default_logger.debug(e, exc_info=True)
-            screenDict["Trend"] = (
-                saved[0] + colorText.BOLD + colorText.WARN + "Unknown" + colorText.END
-            )
-            saveDict["Trend"] = saved[1] + "Unknown"
+            trend = "Unknown"
+        color = colorText.GREEN if trend.endswith("Up") else (colorText.FAIL if trend.endswith("Down") else colorText.WARN)
+        screenDict["Trend"] = (
+            saved[0] + colorText.BOLD + color + trend + colorText.END
+        )
+        saveDict["Trend"] = saved[1] + trend
         return saveDict["Trend"]
 
+    # The trends of all the columns of a (lookback x symbols) matrix of
+    # chronological closes (shorter histories can be padded with NaN at the
+    # top), from the angle of the least-squares line through the tops of
+    # each column: the positive closes at least as high as their neighbours.
+    def findTrends(self, closes):
+        closes = np.nan_to_num(np.asarray(closes, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+        previous = np.vstack([closes[:1], closes[:-1]])
+        following = np.vstack([closes[1:], closes[-1:]])
+        isTop = (closes >= previous) & (closes >= following) & (closes > 0)
+        tops = isTop.sum(axis=0)
+        number = np.arange(len(closes), dtype=float).reshape(-1, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            numberMean = np.where(isTop, number, 0).sum(axis=0) / tops
+            closeMean = np.where(isTop, closes, 0).sum(axis=0) / tops
+            numberDeviation = np.where(isTop, number - numberMean, 0)
+            slopes = (numberDeviation * (closes - closeMean)).sum(axis=0) / (numberDeviation ** 2).sum(axis=0)
+        slopes = np.where(tops > 1, slopes, 0)
+        angles = np.broadcast_to(np.rad2deg(np.arctan(slopes)), slopes.shape)
+        return np.select(
+            [
+                angles == 0,
+                (angles <= 30) & (angles >= -30),
+                (angles >= 30) & (angles < 61),
+                angles >= 60,
+                (angles <= -30) & (angles > -61),
+                angles < -60,
+            ],
+            ["Unknown", "Sideways", "Weak Up", "Strong Up", "Weak Down", "Strong Down"],
+            "Unknown",
+        )
+
     # Find stocks approching to long term trendlines
     def findTrendlines(self, df, screenDict, saveDict, percentage=0.05):
         # period = int("".join(c for c in self.configManager.period if c.isdigit()))
         # if len(data) < period:
         #     return False
-        data = df.copy()
-        data = data[::-1]
-        data["Number"] = np.arange(len(data)) + 1
-        data_low = data.copy()
-        points = 30
-
-        """ Ignoring the Resitance for long-term purpose
-        while len(data_high) > points:
-            slope, intercept, r_value, p_value, std_err = linregress(x=data_high['Number'], y=data_high['High'])
-            data_high = data_high.loc[data_high['High'] > slope * data_high['Number'] + intercept]
-        slope, intercept, r_value, p_value, std_err = linregress(x=data_high['Number'], y=data_high['Close'])
-        data['Resistance'] = slope * data['Number'] + intercept
-        """
-
-        while len(data_low) > points:
-            try:
-                slope, intercept, r_value, p_value, std_err = linregress(
-                    x=data_low["Number"], y=data_low["Low"]
-                )
-            except Exception as e:  # pragma: no cover
-                self.default_logger.debug(e, exc_info=True)
-                continue
-            data_low = data_low.loc[
-                data_low["Low"] < slope * data_low["Number"] + intercept
-            ]
-
-        slope, intercept, r_value, p_value, std_err = linregress(
-            x=data_low["Number"], y=data_low["Close"]
-        )
-        data["Support"] = slope * data["Number"] + intercept
-        now = data.tail(1)
-
-        limit_upper = now["Support"].iloc[0] + (now["Support"].iloc[0] * percentage)
-        limit_lower = now["Support"].iloc[0] - (now["Support"].iloc[0] * percentage)
+        # The resistance (the same fit over the highs) is ignored for
+        # long-term purposes
+        low = df["Low"].to_numpy(dtype=float)[::-1]
+        close = df["Close"].to_numpy(dtype=float)[::-1]
+        support = self.findTrendlineSupport(low, close)
+        if support is None:
+            return False
+        slope, intercept = support
+        now = slope * len(close) + intercept
+        limit_upper = now + (now * percentage)
+        limit_lower = now - (now * percentage)
         saved = self.findCurrentSavedValue(screenDict, saveDict, "Pattern")
-        if limit_lower < now["Close"].iloc[0] < limit_upper and slope > 0.15:
+        if limit_lower < close[-1] < limit_upper and slope > 0.15:
             screenDict["Pattern"] = (
                 saved[0] + colorText.BOLD + colorText.GREEN + "Trendline-Support" + colorText.END
             )
             saveDict["Pattern"] = saved[1] + "Trendline-Support"
             return True
-
-        """ Plots for debugging
-        import matplotlib.pyplot as plt
-        fig, ax1 = plt.subplots(figsize=(15,10))
-        color = 'tab:green'
-        xdate = [x.date() for x in data.index]
-        ax1.set_xlabel('Date', color=color)
-        ax1.plot(xdate, data.Close, label="close", color=color)
-        ax1.tick_params(axis='x', labelcolor=color)
-
-        ax2 = ax1.twiny() # ax2 and ax1 will have common y axis and different x axis, twiny
-        ax2.plot(data.Number, data.Resistance, label="Res")
-        ax2.plot(data.Number, data.Support, label="Sup")
-
-        plt.legend()
-        plt.grid()
-        plt.show()
-        """
         return False
 
+    # The support line (slope, intercept) of chronological lows and closes,
+    # with the bars numbered from 1: the lows are fitted again and again,
+    # keeping only those below the last fit, until no more than `points`
+    # remain, and the line is then fitted through the closes of those.
+    # Every pass shrinks the bars (to none if they all lie on the line), but
+    # the passes are capped anyway. None if no bars are left to fit.
+    def findTrendlineSupport(self, low, close, points=30, maxIterations=50):
+        number = np.arange(1, len(low) + 1, dtype=float)
+        bars = np.arange(len(low))
+        iterations = 0
+        while len(bars) > points and iterations < maxIterations:
+            slope, intercept = self.linearFit(number[bars], low[bars])
+            bars = bars[low[bars] < slope * number[bars] + intercept]
+            iterations += 1
+        if len(bars) == 0:
+            return None
+        return self.linearFit(number[bars], close[bars])
+
+    # The least-squares line (slope, intercept) through the points, computed
+    # as scipy.stats.linregress does (from the covariance matrix of the
+    # centered points) without its statistics or input checks
+    def linearFit(self, x, y):
+        points = np.array([x, y])
+        means = points.sum(axis=1) / len(x)
+        centered = points - means[:, None]
+        covariance = np.dot(centered, centered.T) * np.true_divide(1, len(x))
+        slope = covariance[0, 1] / covariance[0, 0] if covariance[0, 0] != 0 else np.nan
+        return slope, means[1] - slope * means[0]
+
     # @measure_time
     def findUptrend(self, df, screenDict, saveDict, testing, stock,onlyMF=False,hostData=None,exchangeName="INDIA",refreshMFAndFV=True,downloadOnly=False):
         # shouldProceed = True
@@ -2163,7 +2149,7 @@ class ScreeningStatistics:
         return result_df[::-1]
 
     # Preprocess the acquired data
-    def preprocessData(self, df, daysToLookback=None):
+    def preprocessData(self, df, daysToLookback=None, stock=None):
         assert isinstance(df, pd.DataFrame)
         data = df.copy()
         try:
@@ -2171,39 +2157,45 @@ class ScreeningStatistics:
             # self.default_logger.info(f"Preprocessing data:\n{data.head(1)}\n")
             if daysToLookback is None:
                 daysToLookback = self.configManager.daysToLookback
-            if self.configManager.useEMA:
-                sma = pktalib.EMA(data["Close"], timeperiod=50)
-                lma = pktalib.EMA(data["Close"], timeperiod=200)
-                ssma = pktalib.EMA(data["Close"], timeperiod=9)
-                ssma20 = pktalib.EMA(data["Close"], timeperiod=20)
-                data.insert(len(data.columns), "SMA", sma)
-                data.insert(len(data.columns), "LMA", lma)
-                data.insert(len(data.columns), "SSMA", ssma)
-                data.insert(len(data.columns), "SSMA20", ssma20)
+            precomputed = None
+            if stock is not None and self.indicatorEngine is not None:
+                precomputed = self.indicatorEngine.indicatorsFor(stock, data, useEMA=self.configManager.useEMA)
+            if precomputed is not None:
+                data = pd.concat([data, pd.DataFrame(np.array(precomputed), columns=self.indicatorEngine.INDICATORS, index=data.index)], axis=1)
             else:
-                sma = pktalib.SMA(data["Close"], timeperiod=50)
-                lma = pktalib.SMA(data["Close"], timeperiod=200)
-                ssma = pktalib.SMA(data["Close"], timeperiod=9)
-                ssma20 = pktalib.SMA(data["Close"], timeperiod=20)
-                data.insert(len(data.columns), "SMA", sma)
-                data.insert(len(data.columns), "LMA", lma)
-                data.insert(len(data.columns), "SSMA", ssma)
-                data.insert(len(data.columns), "SSMA20", ssma20)
-            vol = pktalib.SMA(data["Volume"], timeperiod=20)
-            rsi = pktalib.RSI(data["Close"], timeperiod=14)
-            data.insert(len(data.columns), "VolMA", vol)
-            data.insert(len(data.columns), "RSI", rsi)
-            cci = pktalib.CCI(data["High"], data["Low"], data["Close"], timeperiod=14)
-            data.insert(len(data.columns), "CCI", cci)
-            try:
-                fastk, fastd = pktalib.STOCHRSI(
-                    data["Close"], timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0
-                )
-                data.insert(len(data.columns), "FASTK", fastk)
-                data.insert(len(data.columns), "FASTD", fastd)
-            except Exception as e:
-                self.default_logger.debug(e, exc_info=True)
-                pass
+                if self.configManager.useEMA:
+                    sma = pktalib.EMA(data["Close"], timeperiod=50)
+                    lma = pktalib.EMA(data["Close"], timeperiod=200)
+                    ssma = pktalib.EMA(data["Close"], timeperiod=9)
+                    ssma20 = pktalib.EMA(data["Close"], timeperiod=20)
+                    data.insert(len(data.columns), "SMA", sma)
+                    data.insert(len(data.columns), "LMA", lma)
+                    data.insert(len(data.columns), "SSMA", ssma)
+                    data.insert(len(data.columns), "SSMA20", ssma20)
+                else:
+                    sma = pktalib.SMA(data["Close"], timeperiod=50)
+                    lma = pktalib.SMA(data["Close"], timeperiod=200)
+                    ssma = pktalib.SMA(data["Close"], timeperiod=9)
+                    ssma20 = pktalib.SMA(data["Close"], timeperiod=20)
+                    data.insert(len(data.columns), "SMA", sma)
+                    data.insert(len(data.columns), "LMA", lma)
+                    data.insert(len(data.columns), "SSMA", ssma)
+                    data.insert(len(data.columns), "SSMA20", ssma20)
+                vol = pktalib.SMA(data["Volume"], timeperiod=20)
+                rsi = pktalib.RSI(data["Close"], timeperiod=14)
+                data.insert(len(data.columns), "VolMA", vol)
+                data.insert(len(data.columns), "RSI", rsi)
+                cci = pktalib.CCI(data["High"], data["Low"], data["Close"], timeperiod=14)
+                data.insert(len(data.columns), "CCI", cci)
+                try:
+                    fastk, fastd = pktalib.STOCHRSI(
+                        data["Close"], timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0
+                    )
+                    data.insert(len(data.columns), "FASTK", fastk)
+                    data.insert(len(data.columns), "FASTD", fastd)
+                except Exception as e:
+                    self.default_logger.debug(e, exc_info=True)
+                    pass
         except Exception as e:
                 self.default_logger.debug(e, exc_info=True)
                 pass
@@ -2577,47 +2569,27 @@ class ScreeningStatistics:
     def validateLorentzian(self, df, screenDict, saveDict, lookFor=3):
         if df is None or len(df) == 0:
             return False
-        data = df.copy()
         # lookFor: 1-Buy, 2-Sell, 3-Any
-        data = data[::-1]  # Reverse the dataframe
-        data = data.rename(
-            columns={
-                "Open": "open",
-                "Close": "close",
-                "High": "high",
-                "Low": "low",
-                "Volume": "volume",
-            }
-        )
         try:
-            with SuppressOutput(suppress_stdout=True, suppress_stderr=True):
-                lc = ata.LorentzianClassification(data=data)
-            saved = self.findCurrentSavedValue(screenDict, saveDict, "Pattern")
-            if lc.df.iloc[-1]["isNewBuySignal"]:
-                screenDict["Pattern"] = (
-                    saved[0] + colorText.BOLD + colorText.GREEN + "Lorentzian-Buy" + colorText.END
-                )
-                saveDict["Pattern"] = saved[1] + "Lorentzian-Buy"
-                if lookFor != 2: # Not Sell
-                    return True
-            elif lc.df.iloc[-1]["isNewSellSignal"]:
-                screenDict["Pattern"] = (
-                    saved[0] + colorText.BOLD + colorText.FAIL + "Lorentzian-Sell" + colorText.END
-                )
-                saveDict["Pattern"] = saved[1] + "Lorentzian-Sell"
-                if lookFor != 1: # Not Buy
-                    return True
-        except Exception:  # pragma: no cover
-            # ValueError: operands could not be broadcast together with shapes (20,) (26,)
-            # File "/opt/homebrew/lib/python3.11/site-packages/advanced_ta/LorentzianClassification/Classifier.py", line 186, in __init__
-            # File "/opt/homebrew/lib/python3.11/site-packages/advanced_ta/LorentzianClassification/Classifier.py", line 395, in __classify
-            # File "/opt/homebrew/lib/python3.11/site-packages/pandas/core/ops/common.py", line 76, in new_method
-            # File "/opt/homebrew/lib/python3.11/site-packages/pandas/core/arraylike.py", line 70, in __and__
-            # File "/opt/homebrew/lib/python3.11/site-packages/pandas/core/series.py", line 5810, in _logical_method
-            # File "/opt/homebrew/lib/python3.11/site-packages/pandas/core/ops/array_ops.py", line 456, in logical_op
-            # File "/opt/homebrew/lib/python3.11/site-packages/pandas/core/ops/array_ops.py", line 364, in na_logical_op
-            # self.default_logger.debug(e, exc_info=True)
-            pass
+            signal = PKLorentzianClassifier.latestSignal(df)
+        except Exception as e:  # pragma: no cover
+            self.default_logger.debug(e, exc_info=True)
+            return False
+        saved = self.findCurrentSavedValue(screenDict, saveDict, "Pattern")
+        if signal == PKLorentzianClassifier.BUY:
+            screenDict["Pattern"] = (
+                saved[0] + colorText.BOLD + colorText.GREEN + "Lorentzian-Buy" + colorText.END
+            )
+            saveDict["Pattern"] = saved[1] + "Lorentzian-Buy"
+            if lookFor != 2: # Not Sell
+                return True
+        elif signal == PKLorentzianClassifier.SELL:
+            screenDict["Pattern"] = (
+                saved[0] + colorText.BOLD + colorText.FAIL + "Lorentzian-Sell" + colorText.END
+            )
+            saveDict["Pattern"] = saved[1] + "Lorentzian-Sell"
+            if lookFor != 1: # Not Buy
+                return True
         return False
 
     # validate if the stock has been having lower lows, lower highs
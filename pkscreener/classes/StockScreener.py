@@ -42,16 +42,29 @@ from PKDevTools.classes.SuppressOutput import SuppressOutput
 from PKDevTools.classes.PKDateUtilities import PKDateUtilities
 
 import pkscreener.classes.ScreeningStatistics as ScreeningStatistics
-from pkscreener import Imports
 from pkscreener.classes.CandlePatterns import CandlePatterns
+from pkscreener.classes.PKBenchmark import PKStageTimer
+from pkscreener.classes.PKResultCache import PKResultCache
 from PKDevTools.classes.OutputControls import OutputControls
 
+if PKStageTimer.enabled():
+    PKStageTimer.instrument(ScreeningStatistics.ScreeningStatistics, ["preprocess", "validate", "find", "compute", "get"])
+    PKStageTimer.instrument(CandlePatterns, ["findPattern"])
+
 class StockScreener:
     def __init__(self):
         self.isTradingTime = PKDateUtilities.isTradingTime()
         self.configManager = None
+        self.walkForwardData = None
+        self.fusedData = None
+        self.resultCache = PKResultCache()
+        self.screeningFailed = False
 
-    # @tracelog
+    # backtestDuration can also be the list of durations of a walk-forward
+    # backtest of the stock (see PKScanRunner.walkForwardItems). The stock's
+    # data is then pre-processed only once and the results of all the
+    # durations are returned as a list.
+    @PKStageTimer.timed("screenStocks", task=True)
     def screenStocks(
         self,
         menuOption,
@@ -78,12 +91,161 @@ class StockScreener:
         portfolio=False,
         testData = None,
         hostRef=None,
+    ):
+        if isinstance(executeOption, list):
+            return self.screenFusedStocks(executeOption, hostRef)
+        if not isinstance(backtestDuration, list):
+            resultKey = self.resultKeyFor(menuOption, exchangeName, executeOption, reversalOption, maLength, daysForLowestVolume, minRSI, maxRSI, respChartPattern, insideBarToLookback, shouldCache, stock, newlyListedOnly, downloadOnly, volumeRatio, userArgs, backtestDuration, backtestPeriodToLookback, portfolio, testData, hostRef)
+            if resultKey is not None:
+                isCached, result = self.resultCache.get(resultKey)
+                if isCached:
+                    self.countCachedResult(result, hostRef)
+                    return result
+            result = self.screenStockForDuration(
+                menuOption,
+                exchangeName,
+                executeOption,
+                reversalOption,
+                maLength,
+                daysForLowestVolume,
+                minRSI,
+                maxRSI,
+                respChartPattern,
+                insideBarToLookback,
+                totalSymbols,
+                shouldCache,
+                stock,
+                newlyListedOnly,
+                downloadOnly,
+                volumeRatio,
+                testbuild,
+                userArgs,
+                backtestDuration,
+                backtestPeriodToLookback,
+                logLevel,
+                portfolio,
+                testData,
+                hostRef,
+            )
+            if resultKey is not None and not self.screeningFailed:
+                self.resultCache.put(resultKey, result, menuOption)
+            return result
+        results = []
+        self.walkForwardData = {}
+        try:
+            for duration in backtestDuration:
+                result = self.screenStockForDuration(
+                    menuOption,
+                    exchangeName,
+                    executeOption,
+                    reversalOption,
+                    maLength,
+                    daysForLowestVolume,
+                    minRSI,
+                    maxRSI,
+                    respChartPattern,
+                    insideBarToLookback,
+                    totalSymbols,
+                    shouldCache,
+                    stock,
+                    newlyListedOnly,
+                    downloadOnly,
+                    volumeRatio,
+                    testbuild,
+                    userArgs,
+                    duration,
+                    backtestPeriodToLookback,
+                    logLevel,
+                    portfolio,
+                    testData,
+                    hostRef,
+                )
+                if result is not None:
+                    results.append(result)
+        finally:
+            self.walkForwardData = None
+        return results if len(results) > 0 else None
+
+    # The key of the result of the stock in the resultCache, or None if its
+    # result can't be reused: it isn't screened on the saved stock data, or
+    # it also depends on more than that.
+    def resultKeyFor(self, menuOption, exchangeName, executeOption, reversalOption, maLength, daysForLowestVolume, minRSI, maxRSI, respChartPattern, insideBarToLookback, shouldCache, stock, newlyListedOnly, downloadOnly, volumeRatio, userArgs, backtestDuration, backtestPeriodToLookback, portfolio, testData, hostRef):
+        if hostRef is None or not shouldCache or downloadOnly or testData is not None:
+            return None
+        if executeOption in PKResultCache.UNCACHEABLE_EXECUTE_OPTIONS:
+            return None
+        configManager = hostRef.configManager
+        lastBars = [PKResultCache.lastBarOf(hostRef.objectDictionaryPrimary, stock)]
+        if "RUNNER" not in os.environ.keys() and backtestDuration == 0 and not configManager.isIntradayConfig() and configManager.calculatersiintraday:
+            # The intraday RSI comes from the intraday candles
+            lastBars.append(PKResultCache.lastBarOf(hostRef.objectDictionarySecondary, stock))
+        if any(lastBar is None for lastBar in lastBars):
+            return None
+        isMonitoringDashboard = userArgs is not None and userArgs.monitor is not None and "~" in userArgs.monitor
+        options = (menuOption, exchangeName, executeOption, reversalOption, maLength, daysForLowestVolume, minRSI, maxRSI, respChartPattern, insideBarToLookback, newlyListedOnly, volumeRatio, backtestDuration, backtestPeriodToLookback, portfolio, isMonitoringDashboard)
+        return PKResultCache.keyFor(stock, tuple(lastBars), options, configManager)
+
+    # Keeps the progress counters the same as if the stock was screened
+    def countCachedResult(self, result, hostRef):
+        with hostRef.processingCounter.get_lock():
+            hostRef.processingCounter.value += 1
+        if result is not None:
+            with hostRef.processingResultsCounter.get_lock():
+                hostRef.processingResultsCounter.value += 1
+
+    # executeOption can also be the list of (scanIndex, sourceIndex, item) of
+    # the scans of a fused monitor run (see PKScanFusion). The stock's data is
+    # then pre-processed only once for all the scans, and a scan piped from
+    # another (sourceIndex) only runs if the stock is in the results of that
+    # one. Returns the results by scanIndex.
+    def screenFusedStocks(self, scans, hostRef):
+        results = {}
+        self.fusedData = {}
+        try:
+            for scanIndex, sourceIndex, item in scans:
+                if sourceIndex is not None and sourceIndex not in results:
+                    continue
+                result = self.screenStockForDuration(*item, hostRef=hostRef)
+                if result is not None:
+                    results[scanIndex] = result
+        finally:
+            self.fusedData = None
+        return results
+
+    # @tracelog
+    def screenStockForDuration(
+        self,
+        menuOption,
+        exchangeName,
+        executeOption,
+        reversalOption,
+        maLength,
+        daysForLowestVolume,
+        minRSI,
+        maxRSI,
+        respChartPattern,
+        insideBarToLookback,
+        totalSymbols,
+        shouldCache,
+        stock,
+        newlyListedOnly,
+        downloadOnly,
+        volumeRatio,
+        testbuild=False,
+        userArgs=None,
+        backtestDuration=0,
+        backtestPeriodToLookback=30,
+        logLevel=logging.NOTSET,
+        portfolio=False,
+        testData = None,
+        hostRef=None,
     ):
         assert (
             hostRef is not None
         ), "hostRef argument must not be None. It should be an instance of PKMultiProcessorClient"
         configManager = hostRef.configManager
         self.configManager = configManager
+        self.screeningFailed = False
         screeningDictionary, saveDictionary = self.initResultDictionaries()
         fullData = None
         processedData = None
@@ -174,7 +336,7 @@ class StockScreener:
                 else:
                     raise ScreeningStatistics.EligibilityConditionNotMet("Bid/Ask Eligibility Not met.")
             # hostRef.default_logger.info(f"Will pre-process data:\n{data.tail(10)}")
-            fullData, processedData, data = self.getCleanedDataForDuration(backtestDuration, portfolio, screeningDictionary, saveDictionary, configManager, screener, data)
+            fullData, processedData, data = self.getCleanedDataForDuration(backtestDuration, portfolio, screeningDictionary, saveDictionary, configManager, screener, data, stock=stock)
             if "RUNNER" not in os.environ.keys() and backtestDuration == 0 and configManager.calculatersiintraday:
                 if (intraday_data is not None and not intraday_data.empty):
                     intraday_fullData, intraday_processedData = screener.preprocessData(
@@ -358,15 +520,14 @@ class StockScreener:
                         if not isMaSupport:
                             return returnLegibleData(f"isMaSupport:{isMaSupport}")
                     elif reversalOption == 7:
-                        if sys.version_info >= (3, 11):
-                            isLorentzian = screener.validateLorentzian(
-                                fullData,
-                                screeningDictionary,
-                                saveDictionary,
-                                lookFor=maLength, # 1 =Buy, 2 =Sell, 3 = Any
-                            )
-                            if not isLorentzian:
-                                return returnLegibleData(f"isLorentzian:{isLorentzian}")
+                        isLorentzian = screener.validateLorentzian(
+                            fullData,
+                            screeningDictionary,
+                            saveDictionary,
+                            lookFor=maLength, # 1 =Buy, 2 =Sell, 3 = Any
+                        )
+                        if not isLorentzian:
+                            return returnLegibleData(f"isLorentzian:{isLorentzian}")
                 elif executeOption == 7:
                     if respChartPattern == 3:
                         isConfluence = screener.validateConfluence(
@@ -387,19 +548,18 @@ class StockScreener:
                         if not isVCP:
                             return returnLegibleData(f"isVCP:{isVCP}")
                     elif respChartPattern == 5:
-                        if Imports["scipy"]:
-                            isBuyingTrendline = screener.findTrendlines(
-                                fullData, screeningDictionary, saveDictionary
-                            )
-                            if not isBuyingTrendline:
-                                return returnLegibleData(f"isBuyingTrendline:{isBuyingTrendline}")
+                        isBuyingTrendline = screener.findTrendlines(
+                            fullData, screeningDictionary, saveDictionary
+                        )
+                        if not isBuyingTrendline:
+                            return returnLegibleData(f"isBuyingTrendline:{isBuyingTrendline}")
                     elif respChartPattern == 6:
                         hasBbandsSqz = screener.findBbandsSqueeze(fullData, screeningDictionary, saveDictionary, filter=(maLength if maLength > 0 else 4))
                         if not hasBbandsSqz:
                             return returnLegibleData(f"hasBbandsSqz:{hasBbandsSqz}")
                     elif respChartPattern == 7:
                         isCandlePattern = candlePatterns.findPattern(
-                        processedData, screeningDictionary, saveDictionary)
+                        processedData, screeningDictionary, saveDictionary, stock=stock)
                         if not isCandlePattern:
                             return returnLegibleData(f"isCandlePattern:{isCandlePattern}")
                     elif respChartPattern == 8:
@@ -431,7 +591,7 @@ class StockScreener:
                     # We can live with no-patterns if user has not installed ta-lib
                     # yet. If ta-lib is available, PKTalib will load it automatically.
                         isCandlePattern = candlePatterns.findPattern(
-                            processedData, screeningDictionary, saveDictionary
+                            processedData, screeningDictionary, saveDictionary, stock=stock
                         )
                 except Exception as e:  # pragma: no cover
                     hostRef.default_logger.debug(e, exc_info=True)
@@ -576,14 +736,12 @@ class StockScreener:
                         isNotMonitoringDashboard = userArgs.monitor is None or (userArgs.monitor is not None and "~" not in userArgs.monitor)
                         # Now screen for common ones to improve performance
                         if isNotMonitoringDashboard and not (executeOption == 6 and reversalOption == 7):
-                            if sys.version_info >= (3, 11):
-                                with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                                    screener.validateLorentzian(
-                                        fullData,
-                                        screeningDictionary,
-                                        saveDictionary,
-                                        lookFor=maLength, # 1 =Buy, 2 =Sell, 3 = Any
-                                    )
+                            screener.validateLorentzian(
+                                fullData,
+                                screeningDictionary,
+                                saveDictionary,
+                                lookFor=maLength, # 1 =Buy, 2 =Sell, 3 = Any
+                            )
                         if isNotMonitoringDashboard and not (executeOption in [1,2]):
                             screener.findBreakoutValue(
                                 processedData,
@@ -639,6 +797,7 @@ class StockScreener:
 
         except KeyboardInterrupt: # pragma: no cover
             # Capturing Ctr+C Here isn't a great idea
+            self.screeningFailed = True
             pass
         except StockDataEmptyException as e: # pragma: no cover
             # if data is None or (data is not None and not data.isnull().values.all(axis=0)[0]):
@@ -684,16 +843,19 @@ class StockScreener:
             #     hostRef.default_logger.debug(f"LTPNotInConfiguredRange:{stock}: {e}", exc_info=True)
             pass
         except KeyError as e: # pragma: no cover
+            self.screeningFailed = True
             # if userArgsLog:
             #     hostRef.default_logger.debug(f"KeyError:{stock}: {e}", exc_info=True)
             pass
         except OSError as e: # pragma: no cover
+            self.screeningFailed = True
             # if userArgsLog:
             #     hostRef.default_logger.debug(f"OSError:{stock}: {e}", exc_info=True)
             pass
         except Exception as e:  # pragma: no cover
             # if userArgsLog:
             #     hostRef.default_logger.debug(f"Exception:{stock}: {e}", exc_info=True)
+            self.screeningFailed = True
             if testbuild or printCounter:
                 # import traceback
                 # traceback.print_exc()
@@ -795,13 +957,11 @@ class StockScreener:
                 ) if executeOption != 26 else stock
         saveDictionary["Stock"] = stock
 
-    def getCleanedDataForDuration(self, backtestDuration, portfolio, screeningDictionary, saveDictionary, configManager, screener, data):
+    def getCleanedDataForDuration(self, backtestDuration, portfolio, screeningDictionary, saveDictionary, configManager, screener, data, stock=None):
         fullData = None
         processedData = None
         if backtestDuration == 0:
-            fullData, processedData = screener.preprocessData(
-                    data, daysToLookback=configManager.effectiveDaysToLookback
-                )
+            fullData, processedData = self.fusedSlice(screener, configManager, data, stock)
             if processedData.empty:
                 raise StockDataEmptyException(f"Empty processedData with data length ({len(data)})")
             if portfolio:
@@ -816,6 +976,7 @@ class StockScreener:
                     # date will be at the bottom
                     # We want to have the nth day treated as today when pre-processing where n = backtestDuration row from the bottom
                 inputData = data.head(len(data) - backtestDuration)
+                stockData = data
                     # imputData will have the last row as the date for which the entire calculation
                     # and prediction is being done
                 data = data.tail(
@@ -827,12 +988,47 @@ class StockScreener:
                             data, screeningDictionary, saveDictionary,requestedPeriod=backtestDuration
                         )
                     # data has the last row from inputData at the top.
-                fullData, processedData = screener.preprocessData(
-                        inputData, daysToLookback=configManager.daysToLookback
-                    )
+                if self.walkForwardData is not None:
+                    fullData, processedData = self.walkForwardSlice(screener, configManager, stockData, len(inputData), stock)
+                else:
+                    fullData, processedData = screener.preprocessData(
+                            inputData, daysToLookback=configManager.daysToLookback, stock=stock
+                        )
                 
         return fullData,processedData,data
 
+    # Same as screener.preprocessData(data), but the stock is pre-processed
+    # only once for all the scans of a fused run. Each of them gets its own
+    # copy to add its columns to.
+    def fusedSlice(self, screener, configManager, data, stock):
+        if self.fusedData is None:
+            return screener.preprocessData(data, daysToLookback=configManager.effectiveDaysToLookback, stock=stock)
+        key = (stock, configManager.effectiveDaysToLookback, len(data), data.index[-1])
+        preprocessed = self.fusedData.get(key)
+        if preprocessed is None:
+            preprocessed = screener.preprocessData(data, daysToLookback=configManager.effectiveDaysToLookback, stock=stock)
+            self.fusedData[key] = preprocessed
+        fullData, processedData = preprocessed
+        return fullData.copy(), processedData.copy()
+
+    # Same as screener.preprocessData(data.head(numRows)), but the indicators
+    # of the stock's whole history are calculated only once for all the
+    # durations of a walk-forward backtest. The indicators only look back, so
+    # they are the same for the head.
+    def walkForwardSlice(self, screener, configManager, data, numRows, stock):
+        history = self.walkForwardData.get(stock)
+        if history is None or not history[0].index.equals(data.index):
+            fullHistory, _ = screener.preprocessData(data, daysToLookback=configManager.daysToLookback, stock=stock)
+            # preprocessData drops the rows without any value
+            validRows = np.cumsum(~data.replace([np.inf, -np.inf], np.nan).isna().all(axis=1).to_numpy())
+            history = (data, fullHistory, validRows)
+            self.walkForwardData[stock] = history
+        _, fullHistory, validRows = history
+        numValidRows = int(validRows[numRows - 1]) if numRows > 0 else 0
+        fullData = fullHistory.iloc[len(fullHistory) - numValidRows:].copy()
+        return fullData, fullData.head(configManager.daysToLookback)
+
+    @PKStageTimer.timed("getRelevantDataForStock")
     def getRelevantDataForStock(self, totalSymbols, shouldCache, stock, downloadOnly, printCounter, backtestDuration, hostRef,objectDictionary, configManager, fetcher, period, duration, testData=None,exchangeName="INDIA"):
         hostData = objectDictionary.get(stock) if (objectDictionary is not None and len(objectDictionary) > 0) else None
         data = None
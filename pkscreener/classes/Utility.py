@@ -49,6 +49,7 @@ from PKDevTools.classes.ColorText import colorText
 from pkscreener import Imports
 
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 
 warnings.simplefilter("ignore", DeprecationWarning)
@@ -59,7 +60,6 @@ from PIL import Image, ImageDraw, ImageFont
 from PKDevTools.classes import Archiver
 from PKDevTools.classes.PKDateUtilities import PKDateUtilities
 from PKDevTools.classes.Committer import Committer
-from PKDevTools.classes.SuppressOutput import SuppressOutput
 from PKDevTools.classes.FunctionTimeouts import exit_after
 from PKDevTools.classes.MarketHours import MarketHours
 from tabulate import tabulate
@@ -69,9 +69,12 @@ import pkscreener.classes.Fetcher as Fetcher
 from pkscreener.classes import VERSION, Changelog
 from pkscreener.classes.MenuOptions import menus
 from PKNSETools.PKNSEStockDataFetcher import nseStockDataFetcher
-from pkscreener.classes.PKTask import PKTask
 from pkscreener.classes.MarketStatus import MarketStatus
-from pkscreener.classes.PKScheduler import PKScheduler
+from pkscreener.classes.PKBenchmark import PKStageTimer
+from pkscreener.classes.PKBulkDownloader import PKBulkDownloader
+from pkscreener.classes.PKDataSource import PKDataSource
+from pkscreener.classes.PKGlyphCache import PKGlyphCache
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
 from PKDevTools.classes.OutputControls import OutputControls
 from PKDevTools.classes.Utils import random_user_agent
 
@@ -116,6 +119,8 @@ lastScreened = os.path.join(
 # Class for managing misc and utility methods
 
 class tools:
+    reportRenderers = None
+
     def clearScreen(userArgs=None,clearAlways=False,forceTop=False):
         if "RUNNER" in os.environ.keys() or (userArgs is not None and userArgs.prodbuild):
             if userArgs is not None and userArgs.v:
@@ -390,8 +395,8 @@ class tools:
             pass
         return roundValue
     
-    def removeAllColorStyles(styledText):
-        styles = [
+    def colorStyles():
+        return [
             colorText.HEAD,
             colorText.END,
             colorText.BOLD,
@@ -402,11 +407,20 @@ class tools:
             colorText.FAIL,
             colorText.WHITE,
         ]
+
+    def removeAllColorStyles(styledText):
         cleanedUpStyledValue = str(styledText)
-        for style in styles:
+        for style in tools.colorStyles():
             cleanedUpStyledValue = cleanedUpStyledValue.replace(style, "")
         return cleanedUpStyledValue
 
+    # Same as removeAllColorStyles, but for all the values of a column at once
+    def removeAllColorStylesFromColumn(styledValues):
+        cleanedUpStyledValues = styledValues.astype(str)
+        for style in tools.colorStyles():
+            cleanedUpStyledValues = cleanedUpStyledValues.str.replace(style, "", regex=False)
+        return cleanedUpStyledValues
+
     def getCellColors(cellStyledValue="", defaultCellFillColor="black"):
         otherStyles = [colorText.HEAD, colorText.BOLD, colorText.UNDR]
         mainStyles = [
@@ -480,8 +494,8 @@ class tools:
         STD_FONT_SIZE = 60
         # First 4 lines are headers. Last 1 line is bottom grid line
         fontPath = tools.setupReportFont()
-        artfont = ImageFont.truetype(fontPath, ART_FONT_SIZE)
-        stdfont = ImageFont.truetype(fontPath, STD_FONT_SIZE)
+        artfont = PKGlyphCache.forFont(fontPath, ART_FONT_SIZE)
+        stdfont = PKGlyphCache.forFont(fontPath, STD_FONT_SIZE)
         
         bgColor, gridColor, artColor, menuColor = tools.getDefaultColors()
 
@@ -705,6 +719,14 @@ class tools:
         # if 'RUNNER' not in os.environ.keys() and 'PKDevTools_Default_Log_Level' in os.environ.keys():
         # im.show()
 
+    # The pool of threads that render the report images in the background, so
+    # that one report can be drawn while another is being resized, saved or
+    # sent. Returns the future of the tableToImage call.
+    def tableToImageInBackground(*args, **kwargs):
+        if tools.reportRenderers is None:
+            tools.reportRenderers = ThreadPoolExecutor(max_workers=max(2, os.cpu_count() or 1), thread_name_prefix="PKReport")
+        return tools.reportRenderers.submit(tools.tableToImage, *args, **kwargs)
+
     def wrapFitLegendText(table, backtestSummary, legendText):
         wrapper = textwrap.TextWrapper(
             width=2
@@ -818,9 +840,14 @@ class tools:
         cache_file = os.path.join(outputFolder, fileName)
         if not os.path.exists(cache_file) or forceSave or (loadCount >= 0 and len(stockDict) > (loadCount + 1)):
             try:
+                stockDataToSave = stockDict.copy()
                 with open(cache_file, "wb") as f:
-                    pickle.dump(stockDict.copy(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                    pickle.dump(stockDataToSave, f, protocol=pickle.HIGHEST_PROTOCOL)
                     OutputControls().printOutput(colorText.BOLD + colorText.GREEN + "=> Done." + colorText.END)
+                if not downloadOnly:
+                    # The pickle remains the format we exchange with the server.
+                    # Locally, we also keep the columnar/mmap copy for fast loads.
+                    tools.saveStockDataStore(stockDataToSave, cache_file)
                 if downloadOnly:
                     OutputControls().printOutput(colorText.BOLD + colorText.GREEN + f"=> {cache_file}" + colorText.END)
                     Committer.execOSCommand(f"git add {cache_file} -f >/dev/null 2>&1")
@@ -847,43 +874,93 @@ class tools:
                 OutputControls().printOutput(colorText.BOLD + colorText.GREEN + f"=> {cache_file}" + colorText.END)
         return cache_file
 
+    def saveStockDataStore(stockDict, cache_file):
+        try:
+            storePath = PKStockDataStore.storePathForCacheFile(cache_file)
+            PKStockDataStore.write(stockDict, storePath)
+            return storePath
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+        return None
+
+    # The most recently saved stock data, whatever its date
+    def loadLatestSavedStockData(configManager):
+        pattern = f"{'intraday_' if configManager.isIntradayConfig() else ''}stock_data_*.pkl"
+        outputFolder = Archiver.get_user_outputs_dir()
+        savedFiles = []
+        for folder in [outputFolder, outputFolder.replace("results","actions-data-download")]:
+            if os.path.isdir(folder):
+                savedFiles.extend([os.path.join(folder, f) for f in glob.glob(pattern, root_dir=folder)])
+        if len(savedFiles) == 0:
+            return {}
+        latestFile = max(savedFiles, key=os.path.getmtime)
+        try:
+            storePath = PKStockDataStore.storePathForCacheFile(latestFile)
+            if PKStockDataStore.isUpToDate(storePath, latestFile):
+                return PKStockDataStore(storePath)
+            with open(latestFile, "rb") as f:
+                stockData = pickle.load(f)
+            return stockData if isinstance(stockData, dict) else {}
+        except Exception as e:
+            default_logger().debug(e, exc_info=True)
+        return {}
+
+    # Stocks that we already have (or have saved earlier) only get the candles
+    # since their last completed one appended. The rest, and those whose
+    # candles don't line up with the new ones, get the whole period.
     def downloadLatestData(stockDict,configManager,stockCodes=[],exchangeSuffix=".NS",downloadOnly=False):
-        numStocksPerIteration = (int(len(stockCodes)/int(len(stockCodes)/10)) if len(stockCodes) >= 10 else len(stockCodes)) + 1
-        queueCounter = 0
-        iterations = int(len(stockCodes)/numStocksPerIteration) + 1
-        tasksList = []
-        while queueCounter < iterations:
-            stocks = []
-            if queueCounter < iterations:
-                stocks = stockCodes[numStocksPerIteration* queueCounter : numStocksPerIteration* (queueCounter + 1)]
-            else:
-                stocks = ["DUMMYStock"]#stockCodes[numStocksPerIteration* queueCounter :]
-            fn_args = (stocks, configManager.period, configManager.duration,exchangeSuffix)
-            task = PKTask(f"DataDownload-{queueCounter}",long_running_fn=fetcher.fetchStockDataWithArgs,long_running_fn_args=fn_args)
-            task.userData = stocks
-            if len(stocks) > 0:
-                tasksList.append(task)
-            queueCounter += 1
-        
+        if len(stockCodes) == 0:
+            return stockDict, []
+        histories = {}
+        if configManager.duration[-1] not in ["m","h"] and not PKDataSource.current().isOffline:
+            savedStockData = None
+            for stock in stockCodes:
+                history = stockDict.get(stock)
+                if history is None:
+                    if savedStockData is None:
+                        savedStockData = tools.loadLatestSavedStockData(configManager)
+                    history = savedStockData.get(stock)
+                if history is not None:
+                    histories[stock] = history
+        starts = PKBulkDownloader.deltaStarts(histories, configManager.duration)
+        dataSource = PKDataSource.current()
         processedStocks = []
-        if len(tasksList) > 0:
-            # Suppress any multiprocessing errors/warnings
-            with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                PKScheduler.scheduleTasks(tasksList=tasksList, 
-                                        label=f"Downloading latest data [{configManager.period},{configManager.duration}] (Total={len(stockCodes)} records in {len(tasksList)} batches){'Be Patient!' if len(stockCodes)> 2000 else ''}",
-                                        timeout=(5+2.5*configManager.longTimeout*(4 if downloadOnly else 1)), # 5 sec additional time for multiprocessing setup
-                                        minAcceptableCompletionPercentage=(100 if downloadOnly else 100))
-            for task in tasksList:
-                if task.result is not None:
-                    for stock in task.userData:
-                        taskResult = task.result.get(f"{stock}{exchangeSuffix}")
-                        if taskResult is not None:
-                            stockDict[stock] = taskResult.to_dict("split")
-                            processedStocks.append(stock)
+        stocksToDownload = stockCodes
+        while len(stocksToDownload) > 0:
+            results, _ = dataSource.download(
+                stocksToDownload,
+                configManager.period,
+                configManager.duration,
+                exchangeSuffix=exchangeSuffix,
+                deadline=(2.5*configManager.longTimeout*(4 if downloadOnly else 1) + len(stocksToDownload)/PKBulkDownloader.REQUESTS_PER_SECOND),
+                starts=starts,
+                timeout=configManager.generalTimeout,
+                proxies=fetcher.proxyServer,
+            )
+            misalignedStocks = []
+            for stock, data in results.items():
+                if stock in starts:
+                    try:
+                        merged = PKBulkDownloader.appendCandles(histories[stock], data, configManager.period)
+                    except Exception as e:
+                        default_logger().debug(e, exc_info=True)
+                        merged = None
+                    if merged is None:
+                        misalignedStocks.append(stock)
+                        continue
+                    existingData = stockDict.get(stock)
+                    # Keep the additional saved keys like MF/FII, if any
+                    stockDict[stock] = merged if existingData is None else (existingData | merged)
+                else:
+                    stockDict[stock] = data.to_dict("split")
+                processedStocks.append(stock)
+            stocksToDownload = misalignedStocks
+            starts = {}
         leftOutStocks = list(set(stockCodes)-set(processedStocks))
-        default_logger().debug(f"Attempted fresh download of {len(stockCodes)} stocks and downloaded {len(processedStocks)} stocks. {len(leftOutStocks)} stocks remaining.")
+        default_logger().debug(f"Attempted fresh download of {len(stockCodes)} stocks ({len(histories)} incremental) and downloaded {len(processedStocks)} stocks. {len(leftOutStocks)} stocks remaining.")
         return stockDict, leftOutStocks
 
+    @PKStageTimer.timed("loadStockData")
     def loadStockData(
         stockDict,
         configManager,
@@ -904,15 +981,17 @@ class tools:
         leftOutStocks = None
         recentDownloadFromOriginAttempted = False
         isTrading = PKDateUtilities.isTradingTime() and (PKDateUtilities.wasTradedOn() or not PKDateUtilities.isTodayHoliday()[0])
+        # Offline data sources are the only source of truth, like the market is during trading hours
+        isOffline = PKDataSource.current().isOffline
         # stockCodes is not None mandates that we start our work based on the downloaded data from yesterday
-        if (stockCodes is not None and len(stockCodes) > 0) and (isTrading or downloadOnly):
+        if (stockCodes is not None and len(stockCodes) > 0) and (isTrading or downloadOnly or isOffline):
             recentDownloadFromOriginAttempted = True
             stockDict, leftOutStocks = tools.downloadLatestData(stockDict,configManager,stockCodes,exchangeSuffix=exchangeSuffix,downloadOnly=downloadOnly)
             if len(leftOutStocks) > int(len(stockCodes)*0.05):
                 # More than 5 % of stocks are still remaining
                 stockDict, _ = tools.downloadLatestData(stockDict,configManager,leftOutStocks,exchangeSuffix=exchangeSuffix,downloadOnly=downloadOnly)
             # return stockDict
-        if downloadOnly or isTrading:
+        if downloadOnly or isTrading or isOffline:
             # We don't want to download from local stale pkl file or stale file at server
             return stockDict
         
@@ -924,6 +1003,12 @@ class tools:
         srcFilePath = os.path.join(Archiver.get_user_outputs_dir(), cache_file)
         if os.path.exists(copyFilePath):
             shutil.copy(copyFilePath,srcFilePath) # copy is the saved source of truth
+        storePath = PKStockDataStore.storePathForCacheFile(cache_file)
+        if not forceRedownload and PKStockDataStore.isUpToDate(storePath, srcFilePath):
+            stockDict, stockDataLoaded = tools.loadDataFromLocalStore(stockDict, downloadOnly, storePath)
+            if stockDataLoaded:
+                # Nothing new to save. The store already is the saved copy.
+                return stockDict
         if os.path.exists(srcFilePath) and not forceRedownload:
             stockDict, stockDataLoaded = tools.loadDataFromLocalPickle(stockDict,configManager, downloadOnly, defaultAnswer, exchangeSuffix, cache_file, isTrading)
         if (
@@ -949,6 +1034,30 @@ class tools:
             tools.saveStockData(stockDict,configManager,initialLoadCount,isIntraday,downloadOnly, forceSave=stockDataLoaded)
         return stockDict
 
+    def loadDataFromLocalStore(stockDict, downloadOnly, storePath):
+        stockDataLoaded = False
+        try:
+            store = PKStockDataStore(storePath)
+            if len(store) > 0:
+                if not downloadOnly:
+                    OutputControls().printOutput(
+                            colorText.BOLD
+                            + colorText.GREEN
+                            + f"[+] Automatically Using Cached Stock Data {'due to After-Market hours' if not PKDateUtilities.isTradingTime() else ''}!"
+                            + colorText.END
+                        )
+                if stockDict is not None and len(stockDict) > 0:
+                    # Keep whatever we already have (freshly downloaded prices)
+                    # and only fill in the additional saved keys from the store.
+                    for stock, existingPreLoadedData in stockDict.items():
+                        savedData = store.get(stock)
+                        store[stock] = existingPreLoadedData if savedData is None else (savedData | existingPreLoadedData)
+                stockDict = store
+                stockDataLoaded = True
+        except Exception as e:
+            default_logger().debug(e, exc_info=True)
+        return stockDict, stockDataLoaded
+
     def loadDataFromLocalPickle(stockDict, configManager, downloadOnly, defaultAnswer, exchangeSuffix, cache_file, isTrading):
         stockDataLoaded = False
         srcFilePath = os.path.join(Archiver.get_user_outputs_dir(), cache_file)
@@ -91,6 +91,9 @@ from pkscreener.classes.Portfolio import PortfolioCollection
 from pkscreener.classes.PKTask import PKTask
 from pkscreener.classes.PKScheduler import PKScheduler
 from pkscreener.classes.PKScanRunner import PKScanRunner
+from pkscreener.classes.PKBenchmark import PKStageTimer
+from pkscreener.classes.PKForwardReturns import PKForwardReturns
+from pkscreener.classes.PKScanRecord import PKScanRecord
 from pkscreener.classes.PKMarketOpenCloseAnalyser import PKMarketOpenCloseAnalyser
 
 if __name__ == '__main__':
@@ -735,7 +738,7 @@ def isInterrupted():
     return keyboardInterruptEventFired
 
 def refreshStockData(startupoptions=None):
-    global consumers,stockDictPrimary, loadedStockData, listStockCodes, stockDictSecondary
+    global stockDictPrimary, loadedStockData, listStockCodes, stockDictSecondary
     options = startupoptions.replace("|","").split(" ")[0].replace(":i","")
     loadedStockData = False
     options, menuOption, indexOption, executeOption = getTopLevelMenuChoices(
@@ -745,7 +748,7 @@ def refreshStockData(startupoptions=None):
         listStockCodes = handleRequestForSpecificStocks(options,indexOption=indexOption)
     listStockCodes = prepareStocksForScreening(testing=False, downloadOnly=False, listStockCodes=listStockCodes,indexOption=indexOption)
     stockDictPrimary,stockDictSecondary = loadDatabaseOrFetch(downloadOnly=False, listStockCodes=listStockCodes, menuOption=menuOption,indexOption=indexOption)
-    PKScanRunner.refreshDatabase(consumers,stockDictPrimary,stockDictSecondary)
+    PKScanRunner.refreshDatabase(stockDictPrimary,stockDictSecondary,userPassedArgs)
 
 def closeWorkersAndExit():
     global consumers, tasks_queue,userPassedArgs
@@ -769,8 +772,13 @@ def main(userArgs=None,optionalFinalOutcome_df=None):
     strategyFilter=[]
     if keyboardInterruptEventFired:
         return None, None
-    screenCounter = multiprocessing.Value("i", 1)
-    screenResultsCounter = multiprocessing.Value("i", 0)
+    if screenCounter is None:
+        # The workers are reused across scans and hold on to these
+        screenCounter = multiprocessing.Value("i", 1)
+        screenResultsCounter = multiprocessing.Value("i", 0)
+    else:
+        screenCounter.value = 1
+        screenResultsCounter.value = 0
     if mp_manager is None:
         mp_manager = multiprocessing.Manager()
         
@@ -1452,13 +1460,11 @@ def main(userArgs=None,optionalFinalOutcome_df=None):
                 if actualHistoricalDuration >= 0:
                     progressbar()
         sys.stdout.write(f"\x1b[1A") # Replace the download progress bar and start writing on the same line
+        if menuOption.upper() in ["B"]:
+            items = PKScanRunner.walkForwardItems(items)
         if not keyboardInterruptEventFired:
             global tasks_queue, results_queue, consumers, logging_queue
-            screenResults, saveResults, backtest_df, tasks_queue, results_queue, consumers,logging_queue = PKScanRunner.runScanWithParams(userPassedArgs,keyboardInterruptEvent,screenCounter,screenResultsCounter,stockDictPrimary,stockDictSecondary,testing, backtestPeriod, menuOption,executeOption, samplingDuration, items,screenResults, saveResults, backtest_df,scanningCb=runScanners,tasks_queue=tasks_queue, results_queue=results_queue, consumers=consumers,logging_queue=logging_queue)
-            if userPassedArgs is not None and (userPassedArgs.monitor is None and "|" not in userPassedArgs.options and not userPassedArgs.options.upper().startswith("C")):
-                tasks_queue = None
-                results_queue = None
-                consumers = None
+            screenResults, saveResults, backtest_df, tasks_queue, results_queue, consumers,logging_queue = PKScanRunner.runScanWithParams(userPassedArgs,keyboardInterruptEvent,screenCounter,screenResultsCounter,stockDictPrimary,stockDictSecondary,testing, backtestPeriod, menuOption,executeOption, samplingDuration, items,screenResults, saveResults, backtest_df,scanningCb=runScanners)
             if menuOption in ["C"]:
                 runOptionName = PKScanRunner.getFormattedChoices(userPassedArgs,selectedChoice)
                 PKMarketOpenCloseAnalyser.runOpenCloseAnalysis(stockDictPrimary,endOfdayCandles,screenResults, saveResults,runOptionName=runOptionName,filteredListOfStocks=listStockCodes)
@@ -1711,7 +1717,7 @@ def getLatestTradeDateTime(stockDictPrimary):
 
 def FinishBacktestDataCleanup(backtest_df, df_xray):
     showBacktestResults(df_xray, sortKey="Date", optionalName="Insights")
-    summary_df = backtestSummary(backtest_df)
+    summary_df = backtestSummary(backtest_df, isSellSignalBacktest())
     backtest_df.loc[:, "Date"] = backtest_df.loc[:, "Date"].apply(
                 lambda x: x.replace("-", "/")
             )
@@ -2227,6 +2233,24 @@ def printNotifySaveScreenedResults(
                     caption_results = Utility.tools.removeAllColorStyles(caption_results.replace("-E-----N-----E-----R","-E-----N----E---R").replace("=E=====N=====E=====R","=E=====N====E===R"))
                     caption = f"{caption}.Open attached image for more. Samples:<pre>{caption_results}</pre>{elapsed_text}{pipedTitle}" #<i>Author is <u><b>NOT</b> a SEBI registered financial advisor</u> and MUST NOT be deemed as one.</i>"
                 if not testing: # and not userPassedArgs.runintradayanalysis:
+                    backtestReport = None
+                    if user is not None:
+                        # The backtest report is rendered while the scan results are being sent
+                        (
+                            tabulated_backtest_summary,
+                            tabulated_backtest_detail,
+                        ) = tabulateBacktestResults(
+                            saveResultsTrimmed, maxAllowed=MAX_ALLOWED, force=True
+                        )
+                        if tabulated_backtest_summary is not None:
+                            backtestReport = Utility.tools.tableToImageInBackground(
+                                "",
+                                "",
+                                pngName + backtestExtension,
+                                menuChoiceHierarchy,
+                                backtestSummary=tabulated_backtest_summary,
+                                backtestDetail=tabulated_backtest_detail,
+                            )
                     sendQuickScanResult(
                         f"{reportTitle}{menuChoiceHierarchy}",
                         user,
@@ -2241,23 +2265,10 @@ def printNotifySaveScreenedResults(
                     # Let's send the backtest results now only if the user requested 1-on-1 for scan.
                     if user is not None:
                         # Now let's try and send backtest results
-                        (
-                            tabulated_backtest_summary,
-                            tabulated_backtest_detail,
-                        ) = tabulateBacktestResults(
-                            saveResultsTrimmed, maxAllowed=MAX_ALLOWED, force=True
-                        )
                         try:
                             # import traceback
-                            if tabulated_backtest_summary is not None:
-                                Utility.tools.tableToImage(
-                                    "",
-                                    "",
-                                    pngName + backtestExtension,
-                                    menuChoiceHierarchy,
-                                    backtestSummary=tabulated_backtest_summary,
-                                    backtestDetail=tabulated_backtest_detail,
-                                )
+                            if backtestReport is not None:
+                                backtestReport.result()
                                 caption = f"Backtest data for stocks listed in <b>{title}</b> scan results. See more past backtest data at https://pkjmesra.github.io/PKScreener/BacktestReports.html"
                                 sendMessageToTelegramChannel(
                                     message=None,
@@ -2605,6 +2616,8 @@ def runScanners(
                 return not ((testing and len(lstscreen) >= 1) or len(lstscreen) >= max_allowed), backtest_df
             otherArgs = (menuOption, backtestPeriod, result, lstscreen, lstsave)
             backtest_df, result =PKScanRunner.runScan(userPassedArgs,testing,numStocks,iterations,items,numStocksPerIteration,tasks_queue,results_queue,originalNumberOfStocks,backtest_df,*otherArgs,resultsReceivedCb=processResultsCallback)
+            if isinstance(backtest_df, PKForwardReturns):
+                backtest_df = backtest_df.toDataFrame()
 
         OutputControls().printOutput(f"\x1b[{3 if OutputControls().enableMultipleLineOutput else 1}A")
         if len(lstscreen) == 0 and userPassedArgs is not None and userPassedArgs.monitor is None:
@@ -2641,33 +2654,31 @@ def runScanners(
         PKScanRunner.terminateAllWorkers(userPassedArgs=userPassedArgs,consumers=consumers, tasks_queue=tasks_queue,testing=testing)
         logging.shutdown()
 
+    if isinstance(result, list) and len(result) > 0:
+        result = result[-1]
     if result is not None and len(result) >=3 and "Date" not in saveResults.columns:
-        temp_df = result[2].copy()
-        temp_df.reset_index(inplace=True)
-        temp_df = temp_df.tail(1)
-        temp_df.rename(columns={"index": "Date"}, inplace=True)
-        targetDate = (
-            temp_df["Date"].iloc[0]
-            if "Date" in temp_df.columns
-            else str(temp_df.iloc[:, 0][0])
-        )
-        saveResults["Date"] = str(targetDate).split(" ")[0]
+        targetDate = PKScanRecord.dateOf(result[2])
+        if targetDate is not None:
+            saveResults["Date"] = str(targetDate).split(" ")[0]
     return screenResults, saveResults, backtest_df
 
         
+@PKStageTimer.timed("processResults")
 def processResults(menuOption, backtestPeriod, result, lstscreen, lstsave, backtest_df):
-    if result is not None:
-        lstscreen.append(result[0])
-        lstsave.append(result[1])
-        sampleDays = result[4]
-        if menuOption == "B":
-            backtest_df = updateBacktestResults(
-                            backtestPeriod,
-                            start_time,
-                            result,
-                            sampleDays,
-                            backtest_df,
-                        )
+    # Walk-forward backtests return the results of all the days of the stock
+    for result in (result if isinstance(result, list) else [result]):
+        if result is not None:
+            lstscreen.append(result[0])
+            lstsave.append(result[1])
+            sampleDays = result[4]
+            if menuOption == "B":
+                backtest_df = updateBacktestResults(
+                                backtestPeriod,
+                                start_time,
+                                result,
+                                sampleDays,
+                                backtest_df,
+                            )
             
     return backtest_df
 
@@ -2702,9 +2713,8 @@ def updateBacktestResults(
     backtestPeriod, start_time, result, sampleDays, backtest_df
 ):
     global elapsed_time
-    sellSignal = (
-        str(selectedChoice["2"]) in ["6", "7"] and str(selectedChoice["3"]) in ["2"]
-    ) or selectedChoice["2"] in ["15", "16", "19", "25"]
+    if backtest_df is None:
+        backtest_df = PKForwardReturns(configManager.periodsRange)
     backtest_df = backtest(
         result[3],
         result[2],
@@ -2713,11 +2723,16 @@ def updateBacktestResults(
         backtestPeriod,
         sampleDays,
         backtest_df,
-        sellSignal,
+        isSellSignalBacktest(),
     )
     elapsed_time = time.time() - start_time
     return backtest_df
 
+def isSellSignalBacktest():
+    return (
+        str(selectedChoice["2"]) in ["6", "7"] and str(selectedChoice["3"]) in ["2"]
+    ) or selectedChoice["2"] in ["15", "16", "19", "25"]
+
 
 def saveDownloadedData(downloadOnly, testing, stockDictPrimary, configManager, loadCount):
     global userPassedArgs, keyboardInterruptEventFired, download_trials
@@ -2874,6 +2889,8 @@ def showBacktestResults(backtest_df, sortKey="Stock", optionalName="backtest_res
     if "Summary" not in optionalName:
         if sortKey is not None and len(sortKey) > 0:
             backtest_df.sort_values(by=[sortKey], ascending=False, inplace=True)
+        # The returns are kept numeric for sorting and are only colored here
+        backtest_df = PKForwardReturns.formatted(backtest_df, isSellSignalBacktest())
     else:
         lastRow = backtest_df.iloc[-1, :]
         if lastRow.iloc[0] == "SUMMARY":
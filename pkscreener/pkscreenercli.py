@@ -126,6 +126,14 @@ if __name__ == "__main__":
         help="Send global market barometer to telegram channel or a user",
         required=False,
     )
+    argParser.add_argument(
+        "--benchmark",
+        help="Benchmark a fixed set of scans against a synthetic universe of the given number of stocks (default 200), or the stocks of an offline --datasource, and print the stocks/sec of every scan and the calls/sec and p50/p99 latency of every stage as JSON",
+        nargs='?',
+        const=0,
+        type=int,
+        required=False,
+    )
     argParser.add_argument(
         "--bot",
         action="store_true",
@@ -218,6 +226,18 @@ if __name__ == "__main__":
         help="Simulate various conditions",
         required=False,
     )
+    argParser.add_argument(
+        "--datasource",
+        help="Where to get the stock prices from: yahoo (default), local:<directory with SYMBOL.csv/.parquet files> or replay:<saved stock data pickle>[?speed=<n>&start=<n>]",
+        required=False,
+    )
+    argParser.add_argument(
+        "--resultcache",
+        help="Save the result of every screened stock in the given directory (default: results_cache in the outputs directory) and reuse it for as long as the stock's latest candle and the scan options stay the same",
+        nargs='?',
+        const="",
+        required=False,
+    )
     argParser.add_argument(
         "--singlethread",
         action="store_true",
@@ -667,6 +687,17 @@ def pkscreenercli():
     try:
         OutputControls(enableMultipleLineOutput=(args is None or args.monitor is None)).printOutput("",end="\r")
         configManager.getConfig(ConfigManager.parser)
+        if args.benchmark is not None:
+            from PKDevTools.classes import Archiver
+            from pkscreener.classes.PKBenchmark import PKBenchmark
+            OutputControls().printOutput(
+                PKBenchmark.run(
+                    numStocks=args.benchmark if args.benchmark > 0 else PKBenchmark.DEFAULT_STOCKS,
+                    dataSource=args.datasource,
+                    outputFile=os.path.join(Archiver.get_user_outputs_dir(), "pkscreener-benchmark.json"),
+                )
+            )
+            return
         import atexit
         atexit.register(exitGracefully)
         # Set the trigger timestamp
@@ -697,6 +728,13 @@ def pkscreenercli():
             os.environ["simulation"] = json.dumps(args.simulate)
         elif "simulation" in os.environ.keys():
             del os.environ['simulation']
+        if args.datasource:
+            os.environ["PKSCREENER_DATA_SOURCE"] = args.datasource
+        if args.resultcache is not None:
+            from PKDevTools.classes import Archiver
+            from pkscreener.classes.PKResultCache import PKResultCache
+            os.environ[PKResultCache.ENVIRONMENT_KEY] = args.resultcache if len(args.resultcache) > 0 else os.path.join(Archiver.get_user_outputs_dir(), "results_cache")
+            PKResultCache.prune()
         # Import other dependency here because if we import them at the top
         # multiprocessing behaves in unpredictable ways
         import pkscreener.classes.Utility as Utility
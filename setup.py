@@ -46,7 +46,6 @@ with open("README.md", "r") as fh:
     long_description = fh.read()
 with open("requirements.txt", "r") as fh:
     install_requires = fh.read().splitlines()
-    install_requires.append("advanced_ta")
 
 if "Windows" in platform.system():
     install_requires = [
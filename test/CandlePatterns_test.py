@@ -22,11 +22,13 @@
     SOFTWARE.
 
 """
+import json
 import warnings
 from unittest.mock import patch
 
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -426,3 +428,51 @@ def test_findPattern_bearish_engulfing(candle_patterns):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mBearish Engulfing\033[0m"
     assert saveDict["Pattern"] == "Bearish Engulfing"
+
+
+def yahooStockDict():
+    with open("test/yahoo_response.txt") as f:
+        df = pd.DataFrame(json.load(f))
+    df.index = pd.to_datetime(df.index.astype(np.int64), unit="ms")
+    df = df[["Open", "High", "Low", "Close", "Volume"]].astype(float)
+    # Each stock ends on a different candle
+    return {f"STOCK{i}": df.head(100 + i).to_dict("split") for i in range(100)}
+
+
+def screenedData(splitDict):
+    df = pd.DataFrame(splitDict["data"], columns=splitDict["columns"], index=splitDict["index"])
+    return df[::-1]
+
+
+def test_precomputePatterns_matches_findPattern():
+    stockDict = yahooStockDict()
+    batch = CandlePatterns()
+    assert batch.precomputePatterns(stockDict) is True
+    hits = 0
+    for stock, splitDict in stockDict.items():
+        data = screenedData(splitDict)
+        assert batch.precomputedPatternsFor(stock, data) is not None
+        expected, expectedSave = {}, {}
+        actual, actualSave = {}, {}
+        expectedResult = CandlePatterns().findPattern(data, expected, expectedSave, stock=stock)
+        with patch.object(Pktalib.pktalib, "CDLENGULFING") as cdl_obj:
+            assert batch.findPattern(data, actual, actualSave, stock=stock) is expectedResult
+            cdl_obj.assert_not_called()
+        assert actual == expected
+        assert actualSave == expectedSave
+        hits += expectedResult
+    assert hits > 0
+
+
+def test_precomputedPatternsFor_ignores_other_candles():
+    stockDict = yahooStockDict()
+    batch = CandlePatterns()
+    batch.precomputePatterns(stockDict)
+    data = screenedData(stockDict["STOCK1"])
+    assert batch.precomputedPatternsFor("STOCK1", data) is not None
+    assert batch.precomputedPatternsFor("STOCK1", data.tail(len(data) - 1)) is None
+    assert batch.precomputedPatternsFor("STOCK1", data.head(3)) is None
+    assert batch.precomputedPatternsFor("UNKNOWN", data) is None
+    assert batch.precomputedPatternsFor(None, data) is None
+    assert batch.precomputePatterns({}) is False
+    assert batch.precomputedPatternsFor("STOCK1", data) is None
@@ -0,0 +1,86 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import re
+
+import pandas as pd
+import pytest
+from PKDevTools.classes.ColorText import colorText
+
+from pkscreener.classes.MarketMonitor import MarketMonitor
+
+MONITORS = ["X:12:9:2.5", "X:12:23", "X:12:2"]
+
+
+@pytest.fixture
+def monitor():
+    if hasattr(MarketMonitor, "__shared_instance__"):
+        del MarketMonitor.__shared_instance__
+    yield MarketMonitor(monitors=MONITORS, maxNumResultsPerRow=2, maxNumRowsInEachResult=4, pinnedIntervalWaitSeconds=0)
+    del MarketMonitor.__shared_instance__
+
+
+def results(stocks, ltp=100.0):
+    return pd.DataFrame(
+        [{"Stock": stock, "LTP": ltp, "%Chng": colorText.GREEN + "1.2% (1.2)" + colorText.END, "52Wk-H": 200.0, "RSI": 55, "Volume": 2.5} for stock in stocks]
+    ).set_index("Stock")
+
+
+def screenOf(monitor):
+    return "\n".join("".join(line) for line in monitor.previousFrame)
+
+
+def test_refresh_redraws_only_the_changed_cells(monitor, capsys):
+    for screenOptions in MONITORS:
+        monitor.refresh(screen_df=results(["SBIN", "TCS"]), screenOptions=screenOptions, chosenMenu="Menu")
+    capsys.readouterr()
+    monitor.refresh(screen_df=results(["SBIN", "TCS"], ltp=101.5), screenOptions=MONITORS[1], chosenMenu="Menu")
+    output = capsys.readouterr().out
+    # Only the cells of the widget (and the grid lines it highlights) are written
+    assert "101.5" in output and "X:12:23" in output
+    assert "X:12:9" not in output and "X:12:2|" not in output
+    assert len(output) < len(screenOf(monitor))
+    assert "101.5" in screenOf(monitor)
+
+
+def test_refresh_clears_the_rows_left_over_from_previous_results(monitor, capsys):
+    monitor.refresh(screen_df=results(["SBIN", "TCS", "INFY"]), screenOptions=MONITORS[0], chosenMenu="Menu")
+    monitor.refresh(screen_df=results(["HDFC"]), screenOptions=MONITORS[0], chosenMenu="Menu")
+    screen = re.sub(r"\x1b\[[0-9;]*m", "", screenOf(monitor))
+    assert "HDFC" in screen
+    assert "SBIN" not in screen and "INFY" not in screen
+    # The columns do not shrink back, so that the cells stay where they were
+    assert "|HDFC|" not in screen
+
+
+def test_dashboard_lays_out_only_the_rows_written(monitor, capsys):
+    for screenOptions in MONITORS:
+        monitor.refresh(screen_df=results(["SBIN", "TCS"]), screenOptions=screenOptions, chosenMenu="Menu")
+    # 2 widget rows of a header and 2 stocks each, without the unused 4th row
+    # of the blocks in between
+    contentLines = [line for line in monitor.previousFrame if line[0].startswith("|")]
+    assert len(contentLines) == 6
+    for line in contentLines:
+        assert any(cell.strip("|- ") != "" for cell in line)
+    assert len(monitor.previousFrame) == 2 * len(contentLines) + 1
@@ -0,0 +1,150 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+import pickle
+import subprocess
+
+import pytest
+
+from pkscreener.classes.PKBenchmark import PKBenchmark, PKStageTimer
+from pkscreener.classes.PKDataSource import PKLocalDataSource, PKReplayDataSource
+
+
+@pytest.fixture
+def timingsDirectory(tmp_path, monkeypatch):
+    monkeypatch.setenv(PKStageTimer.ENVIRONMENT_KEY, str(tmp_path))
+    monkeypatch.setattr(PKStageTimer, "_timings", {})
+    monkeypatch.setattr(PKStageTimer, "_lastTaskEnded", None)
+    return tmp_path
+
+
+class Scanner:
+    def validateSomething(self, value):
+        return value + 1
+
+    def findSomething(self):
+        return "found"
+
+    def other(self):
+        return "other"
+
+
+def test_timer_does_nothing_when_disabled(monkeypatch):
+    monkeypatch.delenv(PKStageTimer.ENVIRONMENT_KEY, raising=False)
+    monkeypatch.setattr(PKStageTimer, "_timings", {})
+    with PKStageTimer.stage("stage"):
+        pass
+    assert PKStageTimer.timed("function")(lambda x: x * 2)(2) == 4
+    assert PKStageTimer._timings == {}
+
+
+def test_timings_are_flushed_and_collected(timingsDirectory):
+    with PKStageTimer.stage("stage"):
+        pass
+    timedFunction = PKStageTimer.timed("function")(lambda x: x * 2)
+    assert timedFunction(2) == 4
+    assert timedFunction(3) == 6
+    PKStageTimer.flush()
+    assert PKStageTimer._timings == {}
+    assert os.path.isfile(timingsDirectory / f"timings-{os.getpid()}.jsonl")
+    timings = PKStageTimer.collect(str(timingsDirectory))
+    assert len(timings["stage"]) == 1
+    assert len(timings["function"]) == 2
+
+
+def test_task_records_queue_handoff_and_flushes(timingsDirectory):
+    task = PKStageTimer.timed("task", task=True)(lambda: None)
+    task()
+    task()
+    assert PKStageTimer._timings == {}
+    timings = PKStageTimer.collect(str(timingsDirectory))
+    assert len(timings["task"]) == 2
+    assert len(timings["queueHandoff"]) == 1
+
+
+def test_instrument_times_only_prefixed_methods(timingsDirectory):
+    PKStageTimer.instrument(Scanner, ["validate", "find"])
+    PKStageTimer.instrument(Scanner, ["validate", "find"])
+    scanner = Scanner()
+    assert scanner.validateSomething(1) == 2
+    assert scanner.findSomething() == "found"
+    assert scanner.other() == "other"
+    assert sorted(PKStageTimer._timings.keys()) == ["Scanner.findSomething", "Scanner.validateSomething"]
+    assert len(PKStageTimer._timings["Scanner.validateSomething"]) == 1
+
+
+def test_report():
+    timings = {"runScan": [2.0], "screenStocks": [0.1] * 99 + [1.0]}
+    report = PKBenchmark.report(timings, 100, 5.0)
+    assert report["stocksPerSecond"] == 50
+    assert report["wallSeconds"] == 5
+    stage = report["stages"]["screenStocks"]
+    assert stage["count"] == 100
+    assert stage["p50Ms"] == pytest.approx(100)
+    assert stage["p99Ms"] == pytest.approx(109)
+    assert stage["callsPerSecond"] == pytest.approx(100 / 10.9, abs=0.01)
+    assert not report["failed"] and report["returnCode"] == 0
+
+
+def test_report_of_failed_scans():
+    timings = {"runScan": [2.0], "screenStocks": [0.1] * 10}
+    for returnCode in [1, -11, None]:
+        report = PKBenchmark.report(timings, 100, 5.0, returnCode)
+        assert report["failed"]
+        assert report["returnCode"] == returnCode
+        assert report["timedOut"] == (returnCode is None)
+        assert report["stocksPerSecond"] is None
+        assert report["stages"]["screenStocks"]["count"] == 10
+
+
+def test_runScan_returns_the_return_code(monkeypatch, tmp_path):
+    completed = subprocess.CompletedProcess([], 3)
+    monkeypatch.setattr(subprocess, "run", lambda *args, **kwargs: completed)
+    wallSeconds, returnCode = PKBenchmark.runScan("0", ["SBIN"], str(tmp_path), {})
+    assert returnCode == 3 and wallSeconds >= 0
+
+    def timeout(*args, **kwargs):
+        raise subprocess.TimeoutExpired("pkscreener", 1)
+
+    monkeypatch.setattr(subprocess, "run", timeout)
+    assert PKBenchmark.runScan("0", ["SBIN"], str(tmp_path), {})[1] is None
+
+
+def test_syntheticUniverse_is_readable_by_local_data_source(tmp_path):
+    symbols = PKBenchmark.syntheticUniverse(str(tmp_path), 3, bars=50)
+    source = PKLocalDataSource(str(tmp_path))
+    assert source.symbols() == symbols
+    data = source.fetchStockData(symbols[0], "1y", "1d")
+    assert len(data) == 50
+    assert (data["High"] >= data[["Open", "Close"]].max(axis=1)).all()
+    assert (data["Low"] <= data[["Open", "Close"]].min(axis=1)).all()
+
+
+def test_replay_data_source_symbols(tmp_path):
+    session = {"SBIN": {"index": [], "data": [], "columns": []}, "MF": 1}
+    sessionFile = tmp_path / "session.pkl"
+    with open(sessionFile, "wb") as f:
+        pickle.dump(session, f)
+    assert PKReplayDataSource(str(sessionFile)).symbols() == ["SBIN"]
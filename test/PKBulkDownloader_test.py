@@ -0,0 +1,231 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes.PKBulkDownloader import PKBulkDownloader
+
+
+def chartResponse(symbol, closes):
+    timestamps = [1704076200 + 86400 * i for i in range(len(closes))]
+    return {
+        "chart": {
+            "result": [
+                {
+                    "meta": {"symbol": symbol, "exchangeTimezoneName": "Asia/Kolkata"},
+                    "timestamp": timestamps,
+                    "indicators": {
+                        "quote": [
+                            {
+                                "open": [c - 1 for c in closes],
+                                "high": [c + 1 for c in closes],
+                                "low": [c - 2 for c in closes],
+                                "close": closes,
+                                "volume": [1000 * (i + 1) for i in range(len(closes))],
+                            }
+                        ],
+                        "adjclose": [{"adjclose": closes}],
+                    },
+                }
+            ],
+            "error": None,
+        }
+    }
+
+
+class StubChartHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        symbol = url.path.split("/")[-1]
+        with server.lock:
+            server.requests.append((symbol, parse_qs(url.query), self.client_address))
+            failures = server.failures.get(symbol, 0)
+            if failures > 0:
+                server.failures[symbol] = failures - 1
+        if failures > 0:
+            status, body = 429, {"chart": {"result": None, "error": "Too Many Requests"}}
+        elif symbol in server.closes:
+            status, body = 200, chartResponse(symbol, server.closes[symbol])
+        else:
+            status, body = 404, {"chart": {"result": None, "error": {"code": "Not Found"}}}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stubServer():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubChartHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = {}
+    server.closes = {f"STOCK{i}.NS": [100.0 + i, 101.123, 99.5] for i in range(20)}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def downloader(server, **kwargs):
+    return PKBulkDownloader(baseUrl=f"http://127.0.0.1:{server.server_port}", **kwargs)
+
+
+def test_download_returns_frames_and_left_out_stocks(stubServer):
+    stockCodes = [f"STOCK{i}" for i in range(20)] + ["UNKNOWN"]
+    results, leftOutStocks = downloader(stubServer, maxConnections=4, backoff=0.01).download(stockCodes, "1y", "1d")
+    assert leftOutStocks == ["UNKNOWN"]
+    assert sorted(results.keys()) == sorted(stockCodes[:-1])
+    data = results["STOCK3"]
+    assert list(data.columns) == PKBulkDownloader.COLUMNS
+    assert data["Close"].tolist() == [103.0, 101.12, 99.5]
+    assert data["Volume"].tolist() == [1000, 2000, 3000]
+    assert str(data.index.tz) == "Asia/Kolkata"
+    assert (data.index == data.index.normalize()).all()
+    symbol, query, _ = stubServer.requests[0]
+    assert query["range"] == ["1y"] and query["interval"] == ["1d"]
+    # Unknown symbols are not retried
+    assert len(stubServer.requests) == len(stockCodes)
+
+
+def test_download_reuses_connections(stubServer):
+    stockCodes = [f"STOCK{i}" for i in range(20)]
+    downloader(stubServer, maxConnections=2, backoff=0.01).download(stockCodes, "1y", "1d")
+    clientPorts = set(clientAddress[1] for _, _, clientAddress in stubServer.requests)
+    assert len(clientPorts) <= 2
+
+
+def test_download_retries_throttled_stocks_with_backoff(stubServer):
+    stubServer.failures = {"STOCK1.NS": 2, "STOCK2.NS": 10}
+    start = time.monotonic()
+    results, leftOutStocks = downloader(stubServer, retries=3, backoff=0.05).download(["STOCK1", "STOCK2", "STOCK3"], "1y", "1d")
+    elapsed = time.monotonic() - start
+    assert "STOCK1" in results and "STOCK3" in results
+    assert leftOutStocks == ["STOCK2"]
+    assert [symbol for symbol, _, _ in stubServer.requests].count("STOCK2.NS") == 4
+    # 0.05 + 0.1 + 0.2
+    assert elapsed >= 0.35
+
+
+def test_download_stops_retrying_at_deadline(stubServer):
+    stubServer.failures = {"STOCK1.NS": 10}
+    results, leftOutStocks = downloader(stubServer, retries=5, backoff=1).download(["STOCK1", "STOCK2"], "1y", "1d", deadline=0.5)
+    assert list(results.keys()) == ["STOCK2"]
+    assert leftOutStocks == ["STOCK1"]
+
+
+def test_download_limits_requests_per_host(stubServer):
+    start = time.monotonic()
+    downloader(stubServer, requestsPerSecond=20).download([f"STOCK{i}" for i in range(10)], "1y", "1d")
+    assert time.monotonic() - start >= 9 / 20
+
+
+def test_toDataFrame_drops_empty_and_repeated_candles():
+    chart = chartResponse("SBIN.NS", [100.0, 101.0, 102.0])
+    result = chart["chart"]["result"][0]
+    result["timestamp"].append(result["timestamp"][-1] + 3600)
+    quote = result["indicators"]["quote"][0]
+    for key in ["open", "high", "low", "close"]:
+        quote[key][1] = None
+        quote[key].append(quote[key][-1] + 1)
+    quote["volume"][1] = None
+    quote["volume"].append(5000)
+    result["indicators"]["adjclose"][0]["adjclose"] = quote["close"]
+    data = PKBulkDownloader.toDataFrame(chart, "1d")
+    assert len(data) == 2
+    assert data["Close"].tolist() == [100.0, 103.0]
+    assert data["Volume"].dtype == np.int64
+    with pytest.raises(ValueError):
+        PKBulkDownloader.toDataFrame({"chart": {"result": [{"meta": {}, "indicators": {}}]}}, "1d")
+
+
+def test_download_requests_only_missing_candles(stubServer):
+    downloader(stubServer).download(["STOCK1", "STOCK2"], "1y", "1d", starts={"STOCK1": 1704000000})
+    queries = {symbol: query for symbol, query, _ in stubServer.requests}
+    assert queries["STOCK1.NS"]["period1"] == ["1704000000"]
+    assert "range" not in queries["STOCK1.NS"]
+    assert queries["STOCK2.NS"]["range"] == ["1y"]
+    assert "period1" not in queries["STOCK2.NS"]
+
+
+def historyAndDelta(closes, deltaCloses, deltaStart):
+    history = PKBulkDownloader.toDataFrame(chartResponse("SBIN.NS", closes), "1d")
+    delta = PKBulkDownloader.toDataFrame(chartResponse("SBIN.NS", [0.0] * deltaStart + deltaCloses), "1d").iloc[deltaStart:]
+    return history.to_dict("split"), delta
+
+
+def test_deltaStarts():
+    history, _ = historyAndDelta([100.0, 101.0, 102.0], [100.0], 0)
+    starts = PKBulkDownloader.deltaStarts({"SBIN": history, "NEW": {"index": [history["index"][0]]}}, "1d")
+    assert list(starts.keys()) == ["SBIN"]
+    assert starts["SBIN"] == history["index"][1].timestamp() - 86400
+    assert PKBulkDownloader.deltaStarts({"SBIN": history}, "1m") == {}
+
+
+def test_appendCandles():
+    # The last (live) candle gets replaced, 2 more are added
+    history, delta = historyAndDelta([100.0, 101.0, 102.0], [101.0, 102.5, 103.0, 104.0], 1)
+    merged = PKBulkDownloader.appendCandles(history, delta, "max")
+    assert merged["columns"] == PKBulkDownloader.COLUMNS
+    assert [row[3] for row in merged["data"]] == [100.0, 101.0, 102.5, 103.0, 104.0]
+    assert merged["index"][:2] == history["index"][:2]
+    assert len(set(merged["index"])) == 5
+    # Trimmed to the period
+    merged = PKBulkDownloader.appendCandles(history, delta, "3d")
+    assert [row[3] for row in merged["data"]] == [102.5, 103.0, 104.0]
+
+
+def test_appendCandles_rejects_misaligned_candles():
+    # Adjusted prices (e.g. after a split)
+    history, delta = historyAndDelta([100.0, 101.0, 102.0], [50.5, 51.0], 1)
+    assert PKBulkDownloader.appendCandles(history, delta, "1y") is None
+    # A gap after the last completed candle
+    history, delta = historyAndDelta([100.0, 101.0, 102.0], [102.0, 103.0], 2)
+    assert PKBulkDownloader.appendCandles(history, delta, "1y") is None
+    history, delta = historyAndDelta([100.0, 101.0, 102.0], [101.0, 102.0], 1)
+    assert PKBulkDownloader.appendCandles(history, delta.drop(columns=["Adj Close"]), "1y") is None
+
+
+def test_periodOffset():
+    assert PKBulkDownloader.periodOffset("1y") == pd.DateOffset(years=1)
+    assert PKBulkDownloader.periodOffset("6mo") == pd.DateOffset(months=6)
+    assert PKBulkDownloader.periodOffset("5d") == pd.DateOffset(days=5)
+    assert PKBulkDownloader.periodOffset("max") is None
@@ -0,0 +1,171 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+import pickle
+from unittest.mock import Mock, patch
+
+import pandas as pd
+import pytest
+
+from pkscreener.classes.Fetcher import screenerStockDataFetcher
+from pkscreener.classes.PKDataSource import (
+    PKDataSource,
+    PKLocalDataSource,
+    PKReplayDataSource,
+    PKYahooDataSource,
+)
+from pkscreener.classes.Utility import tools
+
+
+def prices(days=10, start="2024-01-01"):
+    index = pd.bdate_range(start, periods=days, name="Date")
+    closes = [100.0 + i for i in range(days)]
+    return pd.DataFrame(
+        {
+            "Open": [c - 1 for c in closes],
+            "High": [c + 1 for c in closes],
+            "Low": [c - 2 for c in closes],
+            "Close": closes,
+            "Volume": [1000 * (i + 1) for i in range(days)],
+        },
+        index=index,
+    )
+
+
+@pytest.fixture
+def localDirectory(tmp_path):
+    prices().to_csv(tmp_path / "SBIN.csv")
+    prices(days=5).to_csv(tmp_path / "TCS.NS.csv")
+    return tmp_path
+
+
+@pytest.fixture
+def dataSourceEnvironment():
+    previous = os.environ.get(PKDataSource.ENVIRONMENT_KEY)
+    yield
+    if previous is None:
+        os.environ.pop(PKDataSource.ENVIRONMENT_KEY, None)
+    else:
+        os.environ[PKDataSource.ENVIRONMENT_KEY] = previous
+
+
+def test_fromSpec(localDirectory, tmp_path):
+    assert isinstance(PKDataSource.fromSpec("yahoo"), PKYahooDataSource)
+    assert isinstance(PKDataSource.fromSpec(f"local:{localDirectory}"), PKLocalDataSource)
+    sessionFile = tmp_path / "session.pkl"
+    with open(sessionFile, "wb") as f:
+        pickle.dump({"SBIN": prices().to_dict("split")}, f)
+    replay = PKDataSource.fromSpec(f"replay:{sessionFile}?speed=60&start=3")
+    assert isinstance(replay, PKReplayDataSource)
+    assert replay.speed == 60 and replay.start == 3
+    with pytest.raises(ValueError):
+        PKDataSource.fromSpec("unknown:somewhere")
+    with pytest.raises(FileNotFoundError):
+        PKDataSource.fromSpec(f"local:{tmp_path / 'missing'}")
+
+
+def test_current_follows_the_environment(localDirectory, dataSourceEnvironment):
+    os.environ.pop(PKDataSource.ENVIRONMENT_KEY, None)
+    assert isinstance(PKDataSource.current(), PKYahooDataSource)
+    os.environ[PKDataSource.ENVIRONMENT_KEY] = f"local:{localDirectory}"
+    source = PKDataSource.current()
+    assert isinstance(source, PKLocalDataSource)
+    assert PKDataSource.current() is source
+
+
+def test_local_source_reads_csv(localDirectory):
+    source = PKLocalDataSource(str(localDirectory))
+    assert source.symbols() == ["SBIN", "TCS.NS"]
+    data = source.fetchStockData("SBIN.NS", "1y", "1d")
+    pd.testing.assert_frame_equal(data, prices(), check_freq=False, check_names=False)
+    assert source.fetchStockData("TCS.NS", "1y", "1d")["Close"].tolist() == [100.0, 101.0, 102.0, 103.0, 104.0]
+    assert source.fetchStockData("INFY", "1y", "1d") is None
+    # Trimmed to the period
+    assert len(source.fetchStockData("SBIN", "3d", "1d")) == 3
+    results, leftOutStocks = source.download(["SBIN", "TCS", "INFY"], "1y", "1d")
+    assert sorted(results.keys()) == ["SBIN", "TCS"]
+    assert leftOutStocks == ["INFY"]
+    frames = source.fetchStockData(["SBIN", "INFY"], "3d", "1d")
+    assert len(frames["SBIN"]) == 3 and frames["INFY"] is None
+
+
+def test_data_sources_implement_fetchSymbolData():
+    class PKIncompleteDataSource(PKDataSource):
+        pass
+
+    with pytest.raises(TypeError):
+        PKIncompleteDataSource()
+
+
+def test_local_source_reads_parquet(tmp_path):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        pytest.skip("pyarrow is not available")
+    prices().reset_index().to_parquet(tmp_path / "SBIN.parquet")
+    data = PKLocalDataSource(str(tmp_path)).fetchStockData("SBIN.NS", "1y", "1d")
+    pd.testing.assert_frame_equal(data, prices(), check_freq=False, check_names=False)
+
+
+def test_replay_source_serves_one_bar_per_download(tmp_path):
+    sessionFile = tmp_path / "session.pkl"
+    with open(sessionFile, "wb") as f:
+        pickle.dump({"SBIN": prices().to_dict("split")}, f)
+    source = PKReplayDataSource(str(sessionFile), start=2)
+    assert len(source.fetchStockData("SBIN.NS", "1y", "1d")) == 2
+    for bars in [2, 3, 4]:
+        results, _ = source.download(["SBIN"], "1y", "1d")
+        assert results["SBIN"]["Close"].tolist() == prices()["Close"].tolist()[:bars]
+    # Stocks that are not in the session don't move the replay
+    source.download(["INFY"], "1y", "1d")
+    assert len(source.fetchStockData("SBIN", "1y", "1d")) == 5
+
+
+def test_replay_source_with_speed(tmp_path):
+    sessionFile = tmp_path / "session.pkl"
+    with open(sessionFile, "wb") as f:
+        pickle.dump({"SBIN": prices().to_dict("split")}, f)
+    source = PKReplayDataSource(str(sessionFile), speed=60, start=1)
+    source.startedAt -= 180
+    # 3 minutes at 60x replay 3 hours of 1m bars, but only the first 3 days of 1d bars
+    assert len(source.fetchStockData("SBIN", "1y", "1m")) == 10
+    assert len(source.fetchStockData("SBIN", "1y", "1d")) == 1
+
+
+def test_fetcher_and_download_use_the_offline_source(localDirectory, dataSourceEnvironment):
+    os.environ[PKDataSource.ENVIRONMENT_KEY] = f"local:{localDirectory}"
+    configManager = Mock()
+    configManager.period = "1y"
+    configManager.duration = "1d"
+    configManager.generalTimeout = 2
+    configManager.longTimeout = 4
+    fetcher = screenerStockDataFetcher(configManager)
+    with patch("yfinance.download") as mock_download:
+        data = fetcher.fetchStockData("SBIN", "1y", "1d", exchangeSuffix=".NS")
+        stockDict, leftOutStocks = tools.downloadLatestData({}, configManager, ["SBIN", "TCS"])
+        mock_download.assert_not_called()
+    assert data["Close"].tolist() == prices()["Close"].tolist()
+    assert leftOutStocks == []
+    assert stockDict["TCS"]["data"][-1][3] == 104.0
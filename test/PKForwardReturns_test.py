@@ -0,0 +1,111 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from PKDevTools.classes.ColorText import colorText
+
+from pkscreener.classes.Backtest import backtest
+from pkscreener.classes.PKForwardReturns import PKForwardReturns
+
+
+@pytest.fixture
+def screened_dict():
+    return {
+        "Date": "2023-12-30",
+        "Volume": 1000,
+        "Trend": "Up",
+        "MA-Signal": "Buy",
+        "LTP": 100,
+        "52Wk-H": 100,
+        "52Wk-L": 10,
+        "Consol.": "Range: 5%",
+        "Breakout": "BO: 101 R: 115",
+        "RSI": 68,
+        "Pattern": "NR4",
+        "CCI": 201,
+        "LTP1": 110,
+        "Growth1": 1100,
+    }
+
+
+def test_returns_match_pct_change():
+    periods = [1, 2, 3, 5]
+    closes = pd.Series([100, 110, np.nan, 90, 120, 130, 140], dtype=float)
+    forwardReturns = PKForwardReturns(periods, capacity=1)
+    forwardReturns.add({"Stock": "A"}, closes.values)
+    forwardReturns.add({"Stock": "B"}, closes.values[:3])
+    forwardReturns.add({"Stock": "C"}, closes.values[2:])
+    returns = forwardReturns.returns()
+    assert returns.shape == (3, len(periods))
+    expected = [closes.pct_change(periods=prd).iloc[prd] * 100 for prd in periods]
+    np.testing.assert_allclose(returns[0], expected)
+    # Not enough candles after the signal for the longer periods
+    np.testing.assert_allclose(returns[1][:2], expected[:2])
+    assert np.isnan(returns[1][2:]).all()
+    # No close on the signal date
+    assert np.isnan(returns[2]).all()
+
+
+def test_toDataFrame_column_layout(screened_dict):
+    forwardReturns = PKForwardReturns([1, 2])
+    assert len(forwardReturns.toDataFrame()) == 0
+    forwardReturns.add({"Stock": "A", "LTP1": 110}, [100, 110, 121])
+    df = forwardReturns.toDataFrame()
+    assert list(df.columns) == [
+        "Stock", "Date", "Volume", "Trend", "MA-Signal", "LTP", "52Wk-H", "52Wk-L",
+        "1-Pd", "2-Pd", "Consol.", "Breakout", "RSI", "Pattern", "CCI",
+        "LTP1", "Growth1", "LTP2", "Growth2",
+    ]
+    assert df["1-Pd"].iloc[0] == pytest.approx(10)
+    assert df["2-Pd"].iloc[0] == pytest.approx(21)
+    assert df["Growth1"].iloc[0] == ""
+
+
+def test_formatted_colors_by_signal():
+    df = pd.DataFrame({"Stock": ["A", "B", "C"], "1-Pd": [1.5, -2.0, np.nan], "2-Pd": ["x", "y", "z"]})
+    formatted = PKForwardReturns.formatted(df)
+    assert list(formatted["1-Pd"]) == [
+        colorText.GREEN + "1.50%" + colorText.END,
+        colorText.FAIL + "-2.00%" + colorText.END,
+        "",
+    ]
+    assert list(formatted["2-Pd"]) == ["x", "y", "z"]
+    assert df["1-Pd"].iloc[0] == 1.5
+    sellFormatted = PKForwardReturns.formatted(df, sellSignal=True)
+    assert sellFormatted["1-Pd"].iloc[0].startswith(colorText.FAIL)
+    assert sellFormatted["1-Pd"].iloc[1].startswith(colorText.GREEN)
+
+
+def test_backtest_accumulates_into_forward_returns(screened_dict):
+    data = pd.DataFrame({"Close": [100.0 + i for i in range(40)]})
+    forwardReturns = PKForwardReturns([1, 2, 30])
+    for stock in ["A", "B", "C"]:
+        result = backtest(stock, data, screened_dict, screened_dict, backTestedData=forwardReturns)
+        assert result is forwardReturns
+    df = forwardReturns.toDataFrame()
+    assert list(df["Stock"]) == ["A", "B", "C"]
+    assert df["30-Pd"].tolist() == pytest.approx([30.0] * 3)
+    assert df["LTP1"].tolist() == [110] * 3
@@ -0,0 +1,67 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from pkscreener.classes.PKGlyphCache import PKGlyphCache
+
+FONT_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "pkscreener", "courbd.ttf")
+LINES = [
+    "P----------K-----S-----C------R------E---E",
+    "|SBIN      |Range:2.5%|BO: 561.2 R: 600.3|",
+    "[+] As of 02-01-24 10.00.00 IST > You chose X:12:9",
+    "T:▲ t:▼ © pkjmesra",
+    " ",
+    "",
+    "Multiple\nlines of\n\ntext",
+]
+
+
+@pytest.mark.parametrize("size", [30, 60])
+def test_glyphCache_measures_like_the_font(size):
+    font = ImageFont.truetype(FONT_PATH, size)
+    glyphCache = PKGlyphCache.forFont(FONT_PATH, size)
+    assert PKGlyphCache.forFont(FONT_PATH, size) is glyphCache
+    for text in LINES:
+        assert glyphCache.getsize_multiline(text) == font.getsize_multiline(text)
+        assert glyphCache.getbbox(text) == font.getbbox(text)
+        assert glyphCache.getlength(text) == font.getlength(text)
+    for text in LINES[:-1]:
+        assert glyphCache.getsize(text) == font.getsize(text)
+
+
+@pytest.mark.parametrize("size", [30, 60])
+def test_glyphCache_draws_like_the_font(size):
+    font = ImageFont.truetype(FONT_PATH, size)
+    glyphCache = PKGlyphCache.forFont(FONT_PATH, size)
+    for text in LINES:
+        images = []
+        for imageFont in [font, glyphCache]:
+            image = Image.new("RGB", (font.getsize_multiline(text)[0] + 20, 5 * size), "white")
+            ImageDraw.Draw(image).text((10, 10), text, font=imageFont, fill="darkgreen")
+            images.append(image.tobytes())
+        assert images[0] == images[1]
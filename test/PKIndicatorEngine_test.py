@@ -0,0 +1,165 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import json
+import pickle
+import warnings
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PKIndicatorEngine import PKIndicatorEngine
+from pkscreener.classes.ScreeningStatistics import ScreeningStatistics
+
+
+def yahooData():
+    with open("test/yahoo_response.txt") as f:
+        df = pd.DataFrame(json.load(f))
+    df.index = pd.to_datetime(df.index.astype(np.int64), unit="ms")
+    return df.astype(float)
+
+
+@pytest.fixture
+def stockDict():
+    df = yahooData()
+    return {
+        "SBIN": df.to_dict("split"),
+        # Shorter histories must be right-aligned, not date-aligned
+        "TCS": df.head(300).to_dict("split"),
+        "INFY": (df.tail(150) * 1.5).to_dict("split"),
+    }
+
+
+@pytest.fixture
+def screener():
+    return ScreeningStatistics(ConfigManager.tools(), dl())
+
+
+def frameFor(stockDict, symbol):
+    return pd.DataFrame(stockDict[symbol]["data"], columns=stockDict[symbol]["columns"], index=stockDict[symbol]["index"])
+
+
+@pytest.mark.parametrize("useEMA", [False, True])
+def test_indicators_match_preprocessData(stockDict, screener, useEMA):
+    screener.configManager.useEMA = useEMA
+    engine = PKIndicatorEngine.build(stockDict, useEMA=useEMA)
+    try:
+        for symbol in stockDict.keys():
+            expected, _ = screener.preprocessData(frameFor(stockDict, symbol), daysToLookback=10)
+            assert engine.indicatorsFor(symbol, frameFor(stockDict, symbol), useEMA=useEMA) is not None
+            screener.indicatorEngine = engine
+            actual, _ = screener.preprocessData(frameFor(stockDict, symbol), daysToLookback=10, stock=symbol)
+            screener.indicatorEngine = None
+            assert list(actual.columns) == list(expected.columns)
+            pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9)
+    finally:
+        engine.unlink()
+        screener.configManager.useEMA = False
+
+
+def test_prefix_rows_are_served_for_backtests(stockDict, screener):
+    engine = PKIndicatorEngine.build(stockDict)
+    try:
+        data = frameFor(stockDict, "SBIN").head(400)
+        expected, _ = screener.preprocessData(data, daysToLookback=10)
+        screener.indicatorEngine = engine
+        assert engine.indicatorsFor("SBIN", data) is not None
+        actual, _ = screener.preprocessData(data, daysToLookback=10, stock="SBIN")
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9)
+    finally:
+        engine.unlink()
+
+
+def test_refreshed_or_unknown_data_is_not_served(stockDict):
+    engine = PKIndicatorEngine.build(stockDict)
+    try:
+        data = frameFor(stockDict, "SBIN")
+        assert engine.indicatorsFor("SBIN", data, useEMA=True) is None
+        assert engine.indicatorsFor("UNKNOWN", data) is None
+        assert engine.indicatorsFor("TCS", data) is None
+        data.iloc[-1, data.columns.get_loc("Close")] += 1
+        assert engine.indicatorsFor("SBIN", data) is None
+    finally:
+        engine.unlink()
+
+
+def test_symbols_with_missing_values_are_skipped(stockDict):
+    df = frameFor(stockDict, "SBIN")
+    df.iloc[10, df.columns.get_loc("Close")] = np.nan
+    engine = PKIndicatorEngine.build({"SBIN": df.to_dict("split"), "TCS": stockDict["TCS"]})
+    try:
+        assert engine.symbols == ["TCS"]
+    finally:
+        engine.unlink()
+    assert PKIndicatorEngine.build({}) is None
+
+
+def test_pickled_engine_attaches_to_same_block(stockDict):
+    engine = PKIndicatorEngine.build(stockDict)
+    try:
+        restored = pickle.loads(pickle.dumps(engine))
+        data = frameFor(stockDict, "INFY")
+        np.testing.assert_array_equal(restored.indicatorsFor("INFY", data), engine.indicatorsFor("INFY", data))
+        restored.close()
+    finally:
+        engine.unlink()
+
+
+@pytest.mark.parametrize("useEMA", [False, True])
+def test_update_rolls_forward_like_a_full_build(useEMA):
+    df = yahooData()
+    live = df.head(401).copy()
+    live.iloc[-1, live.columns.get_loc("Close")] *= 0.99
+    engine = PKIndicatorEngine.build({"SBIN": df.head(400).to_dict("split"), "TCS": df.head(250).to_dict("split")}, useEMA=useEMA)
+    cycles = [
+        # The last candle is still forming
+        {"SBIN": df.head(400).to_dict("split"), "TCS": df.head(250).to_dict("split")},
+        # One more (live) candle, the previous one got completed
+        {"SBIN": live.to_dict("split"), "TCS": df.head(251).to_dict("split")},
+        # A few candles at once, a new symbol and history that got rewritten
+        {"SBIN": df.head(405).to_dict("split"), "TCS": (df.head(260) * 2).to_dict("split"), "INFY": df.tail(100).to_dict("split")},
+    ]
+    try:
+        for stockDict in cycles:
+            assert engine.update(stockDict) is engine
+            expected = PKIndicatorEngine.build(stockDict, useEMA=useEMA)
+            try:
+                assert engine.symbols == expected.symbols
+                for symbol in stockDict.keys():
+                    data = frameFor(stockDict, symbol)
+                    np.testing.assert_allclose(engine.indicatorsFor(symbol, data, useEMA), expected.indicatorsFor(symbol, data, useEMA), rtol=1e-9)
+            finally:
+                expected.unlink()
+        restored = pickle.loads(pickle.dumps(engine))
+        data = frameFor(cycles[-1], "SBIN")
+        np.testing.assert_array_equal(restored.indicatorsFor("SBIN", data, useEMA), engine.indicatorsFor("SBIN", data, useEMA))
+        restored.close()
+    finally:
+        engine.unlink()
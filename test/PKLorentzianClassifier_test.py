@@ -0,0 +1,80 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes.PKLorentzianClassifier import PKLorentzianClassifier
+
+
+# A random walk, with the latest bar first as the screeners get it
+def randomWalk(seed, bars=300):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    high = close * (1 + rng.uniform(0, 0.02, bars))
+    low = close * (1 - rng.uniform(0, 0.02, bars))
+    df = pd.DataFrame({
+        "Open": low + (high - low) * rng.uniform(0, 1, bars),
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Volume": rng.integers(10000, 1000000, bars),
+    })
+    return df[::-1]
+
+
+@pytest.mark.parametrize("seed,signal", [(0, 0), (35, PKLorentzianClassifier.BUY), (55, PKLorentzianClassifier.SELL)])
+def test_latestSignal(seed, signal):
+    assert PKLorentzianClassifier.latestSignal(randomWalk(seed)) == signal
+
+
+def test_latestSignal_needs_the_regime_period():
+    df = randomWalk(35)
+    assert PKLorentzianClassifier.latestSignal(df.head(PKLorentzianClassifier.REGIME_PERIOD - 1)) == 0
+    assert PKLorentzianClassifier.latestSignal(None) == 0
+
+
+def test_latestSignals_matches_latestSignal():
+    frames = {}
+    for seed in list(range(10)) + [35, 55]:
+        df = randomWalk(seed, bars=250 + 50 * (seed % 2))
+        frames[f"{seed}"] = df
+        frames[f"{seed}-1"] = df.tail(len(df) - 1)
+    frames["flat"] = pd.DataFrame({"Open": [10.0] * 250, "High": [10.0] * 250, "Low": [10.0] * 250, "Close": [10.0] * 250})
+    signals = PKLorentzianClassifier.latestSignals(frames)
+    assert signals == {symbol: PKLorentzianClassifier.latestSignal(df) for symbol, df in frames.items()}
+    assert signals["35"] == PKLorentzianClassifier.BUY
+    assert signals["55"] == PKLorentzianClassifier.SELL
+    assert signals["flat"] == 0
+
+
+@pytest.mark.parametrize("seed,bars", [(seed, 300) for seed in [0, 35, 55]] + [(7, 2100)])
+def test_latestSignal_matches_advanced_ta(seed, bars):
+    ata = pytest.importorskip("advanced_ta")
+    df = randomWalk(seed, bars)
+    data = df[::-1].rename(columns={"Open": "open", "Close": "close", "High": "high", "Low": "low", "Volume": "volume"})
+    latest = ata.LorentzianClassification(data=data).df.iloc[-1]
+    expected = PKLorentzianClassifier.BUY if latest["isNewBuySignal"] else (PKLorentzianClassifier.SELL if latest["isNewSellSignal"] else 0)
+    assert PKLorentzianClassifier.latestSignal(df) == expected
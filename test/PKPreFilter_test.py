@@ -0,0 +1,136 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import warnings
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PKIndicatorEngine import PKIndicatorEngine
+from pkscreener.classes.PKPreFilter import PKPreFilter
+from pkscreener.classes.PKScanRunner import PKScanRunner
+from pkscreener.classes.ScreeningStatistics import ScreeningStatistics
+from pkscreener.classes.StockScreener import StockScreener
+
+
+def candles(closes, volumes):
+    index = pd.bdate_range(end="2024-06-28", periods=len(closes))
+    closes = np.array(closes, dtype=float)
+    return pd.DataFrame(
+        {"Open": closes, "High": closes * 1.01, "Low": closes * 0.99, "Close": closes, "Volume": np.array(volumes, dtype=float)},
+        index=index,
+    )
+
+
+@pytest.fixture
+def stockDict():
+    rising = np.linspace(100, 300, 300)
+    return {
+        "CHEAP": candles([10, 10.5], [1e6, 1e6]).to_dict("split"),
+        "FLAT": candles([100] * 30, [1e6] * 30).to_dict("split"),
+        "UP": candles([100] * 29 + [102], [1e6] * 30).to_dict("split"),
+        "ILLIQUID": candles([100] * 29 + [102], [100] * 30).to_dict("split"),
+        "SPIKE": candles([100] * 29 + [102], [1e6] * 29 + [5e6]).to_dict("split"),
+        "STAGETWO": candles(rising, [1e6] * 300).to_dict("split"),
+        "FALLEN": candles(list(rising) + [120], [1e6] * 301).to_dict("split"),
+        "NEW": candles([150], [1e6]).to_dict("split"),
+    }
+
+
+@pytest.fixture
+def configManager():
+    configManager = ConfigManager.tools()
+    configManager.minLTP = 20
+    configManager.maxLTP = 50000
+    configManager.minimumChangePercentage = 0
+    configManager.stageTwo = False
+    configManager.minVolume = 10000
+    return configManager
+
+
+def workerRejects(stockDict, configManager, executeOption, volumeRatio=2.5):
+    screener = ScreeningStatistics(configManager, dl())
+    rejected = set()
+    for symbol, splitDict in stockDict.items():
+        data = pd.DataFrame(splitDict["data"], columns=splitDict["columns"], index=splitDict["index"])
+        fullData, processedData = screener.preprocessData(data, daysToLookback=10)
+        try:
+            StockScreener().performBasicLTPChecks(executeOption, {}, {"Stock": symbol}, fullData, configManager, screener, "INDIA")
+            StockScreener().performBasicVolumeChecks(executeOption, volumeRatio, {}, {}, processedData, configManager, screener)
+        except Exception:
+            rejected.add(symbol)
+    return rejected
+
+
+@pytest.mark.parametrize(
+    "minChange, stageTwo, executeOption, expected",
+    [
+        (0, False, 0, {"CHEAP"}),
+        (0, False, 1, {"CHEAP", "ILLIQUID"}),
+        (1, False, 1, {"CHEAP", "FLAT", "ILLIQUID", "STAGETWO", "FALLEN", "NEW"}),
+        (0, True, 1, {"CHEAP", "ILLIQUID", "FALLEN"}),
+        (0, False, 9, {"CHEAP", "FLAT", "UP", "ILLIQUID", "STAGETWO", "FALLEN", "NEW"}),
+    ],
+)
+def test_rejectedSymbols_match_the_worker_checks(stockDict, configManager, minChange, stageTwo, executeOption, expected):
+    configManager.minimumChangePercentage = minChange
+    configManager.stageTwo = stageTwo
+    engine = PKIndicatorEngine.build(stockDict)
+    try:
+        rejected = PKPreFilter.rejectedSymbols(engine, configManager, executeOption)
+        assert rejected == expected
+        assert rejected == workerRejects(stockDict, configManager, executeOption)
+    finally:
+        engine.unlink()
+
+
+def test_rejectedSymbols_without_engine(configManager):
+    assert PKPreFilter.rejectedSymbols(None, configManager, 1) == set()
+
+
+def test_preFilterItems(stockDict, configManager):
+    def item(stock, menuOption="X", backtestDuration=0):
+        item = [None] * 23
+        item[0], item[1], item[2], item[11], item[12] = menuOption, "INDIA", 1, True, stock
+        item[14], item[15], item[18] = False, 2.5, backtestDuration
+        return tuple(item)
+
+    items = [item("CHEAP"), item("UP"), item("ILLIQUID"), item("CHEAP", menuOption="B", backtestDuration=1), item("UNKNOWN")]
+    engine = PKIndicatorEngine.build(stockDict)
+    savedEngine, savedConfig = PKScanRunner.indicatorEngine, PKScanRunner.configManager
+    PKScanRunner.indicatorEngine, PKScanRunner.configManager = engine, configManager
+    try:
+        preFiltered = PKScanRunner.preFilterItems(items)
+        assert [(i[0], i[12]) for i in preFiltered] == [("X", "UP"), ("B", "CHEAP"), ("X", "UNKNOWN")]
+        PKScanRunner.indicatorEngine = None
+        assert PKScanRunner.preFilterItems(items) == items
+    finally:
+        PKScanRunner.indicatorEngine, PKScanRunner.configManager = savedEngine, savedConfig
+        engine.unlink()
@@ -0,0 +1,87 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PKResultCache import PKResultCache
+from pkscreener.classes.PKScanRecord import PKScanRecord
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
+
+
+@pytest.fixture
+def data():
+    close = 100 + np.arange(30.0)
+    return pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": np.full(30, 1000.0)},
+        index=pd.bdate_range("2023-01-02", periods=30),
+    )
+
+
+def test_lastBarOf_is_the_same_for_split_dicts_and_stores(data, tmp_path):
+    stockDict = {"SBIN": data.to_dict("split")}
+    store = PKStockDataStore(PKStockDataStore.write(stockDict, str(tmp_path / "store.pkcol")))
+    lastBar = PKResultCache.lastBarOf(stockDict, "SBIN")
+    assert lastBar == PKResultCache.lastBarOf(store, "SBIN")
+    assert lastBar[0] == 30 and lastBar[1] == data.index[-1].value
+    # Today's candle changes during the trading hours
+    data.iloc[-1, data.columns.get_loc("Close")] += 1
+    assert PKResultCache.lastBarOf({"SBIN": data.to_dict("split")}, "SBIN") != lastBar
+    assert PKResultCache.lastBarOf(stockDict, "TCS") is None
+    assert PKResultCache.lastBarOf(None, "SBIN") is None
+    assert PKResultCache.lastBarOf(MagicMock(), "SBIN") is None
+
+
+def test_least_recently_used_results_are_evicted(data):
+    configManager = ConfigManager.tools()
+    cache = PKResultCache(maxEntries=2)
+    keys = [PKResultCache.keyFor("SBIN", (30, 0, ()), ("X", executeOption), configManager) for executeOption in [1, 2, 3]]
+    assert len(set(keys)) == 3
+    cache.put(keys[0], ({"Stock": "SBIN"}, {"Stock": "SBIN"}, data, "SBIN", 0))
+    cache.put(keys[1], None)
+    isCached, result = cache.get(keys[0])
+    assert isCached and isinstance(result[2], PKScanRecord) and result[2].date == data.index[-1]
+    # Callers can change what they get
+    result[0]["Stock"] = "TCS"
+    assert cache.get(keys[0])[1][0]["Stock"] == "SBIN"
+    cache.put(keys[2], None)
+    assert cache.get(keys[1]) == (False, None)
+    assert cache.get(keys[0])[0] and cache.get(keys[2]) == (True, None)
+    assert len(cache) == 2
+
+
+def test_saved_results_are_shared_and_pruned(data, tmp_path, monkeypatch):
+    monkeypatch.setenv(PKResultCache.ENVIRONMENT_KEY, str(tmp_path))
+    key = PKResultCache.keyFor("SBIN", (30, 0, ()), ("B", 0), ConfigManager.tools())
+    PKResultCache().put(key, ({}, {}, data.tail(5), "SBIN", 4), menuOption="B")
+    isCached, result = PKResultCache().get(key)
+    assert isCached and result[3:] == ("SBIN", 4)
+    np.testing.assert_array_equal(result[2].closes, data["Close"].tail(5).values)
+    assert PKResultCache.prune(maxAgeDays=1) == 0
+    assert PKResultCache.prune(maxAgeDays=-1) == 1
+    assert PKResultCache().get(key) == (False, None)
@@ -0,0 +1,138 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import pytest
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PKScanFusion import PKScanFusion
+
+
+class Args:
+    monitor = "X:12:9~X:12:2"
+    download = False
+
+
+def item(stock, executeOption=9, menuOption="X", userArgs=None):
+    return (menuOption, "INDIA", executeOption, None, None, None, None, None, None, None, 3, True, stock, False, False, 2.5, False, userArgs, 0, 30, 0, True, None)
+
+
+@pytest.fixture
+def configManager():
+    PKScanFusion.reset()
+    yield ConfigManager.tools()
+    PKScanFusion.reset()
+
+
+def runCycle(configManager, scans):
+    for items, found, monitor in scans:
+        PKScanFusion.record(items, set(found), configManager, monitor)
+    PKScanFusion.newCycle()
+
+
+def test_isFusable():
+    args = Args()
+    assert PKScanFusion.isFusable([item("SBIN")], args)
+    assert not PKScanFusion.isFusable([], args)
+    assert not PKScanFusion.isFusable([item("SBIN", menuOption="B")], args)
+    assert not PKScanFusion.isFusable([item("SBIN", executeOption=29)], args)
+    assert not PKScanFusion.isFusable([item("SBIN", executeOption=[(0, None, item("SBIN"))])], args)
+    args.monitor = None
+    assert not PKScanFusion.isFusable([item("SBIN")], args)
+
+
+def test_recorded_scans_fuse_in_the_next_cycle(configManager):
+    stocks = ["SBIN", "TCS", "INFY"]
+    piped = ("1", "X:12:9:>|X:12:31:")
+    dashboard = [
+        ([item(stock, 9) for stock in stocks], ["SBIN", "TCS"], piped),
+        # Piped from the volume scan
+        ([item(stock, 31) for stock in ["SBIN", "TCS"]], ["TCS"], piped),
+        ([item(stock, 2) for stock in stocks + ["ITC"]], ["ITC"], ("2", "X:12:2:")),
+    ]
+    runCycle(configManager, dashboard)
+    assert [scan.source for scan in PKScanFusion.plannedScans] == [None, 0, None]
+    # Only for the scans of the monitors
+    assert PKScanFusion.scansToFuse([item("SBIN", 5)], configManager) == []
+    scans = PKScanFusion.scansToFuse(dashboard[0][0], configManager)
+    assert len(scans) == 3
+
+    fusedItems = PKScanFusion.fusedItems(scans)
+    assert [fusedItem[12] for fusedItem in fusedItems] == ["INFY", "SBIN", "TCS", "ITC"]
+    fusedScans = {fusedItem[12]: fusedItem[2] for fusedItem in fusedItems}
+    assert [(scanIndex, sourceIndex, scanItem[2]) for scanIndex, sourceIndex, scanItem in fusedScans["SBIN"]] == [(0, None, 9), (1, 0, 31), (2, None, 2)]
+    assert fusedScans["SBIN"][0][2] == item("SBIN", 9)
+    assert [scanIndex for scanIndex, _, _ in fusedScans["ITC"]] == [2]
+
+    result = lambda stock: ({}, {}, None, stock, 0)
+    answers = [{0: result("TCS"), 1: result("TCS")}, {}, {2: result("ITC")}, {0: result("SBIN")}]
+    PKScanFusion.keepResults(scans, answers)
+    assert PKScanFusion.scansToFuse(dashboard[0][0], configManager) == []
+    cached, remaining = PKScanFusion.cachedResults(dashboard[1][0], configManager)
+    assert cached == [None, result("TCS")] and remaining == []
+    # Stocks the fused scan didn't run on (for this scan) still have to run
+    cached, remaining = PKScanFusion.cachedResults([item("INFY", 31), item("ITC", 31)], configManager)
+    assert cached == [] and remaining == [item("INFY", 31), item("ITC", 31)]
+    cached, remaining = PKScanFusion.cachedResults([item("SBIN", 5)], configManager)
+    assert cached == [] and remaining == [item("SBIN", 5)]
+
+
+def test_only_scans_of_the_same_candles_fuse(configManager):
+    runCycle(configManager, [([item("SBIN", 9)], ["SBIN"], None), ([item("SBIN", 2)], [], None)])
+    duration = configManager.duration
+    try:
+        configManager.duration = "5m"
+        assert PKScanFusion.scansToFuse([item("SBIN", 9)], configManager) == []
+    finally:
+        configManager.duration = duration
+    assert len(PKScanFusion.scansToFuse([item("SBIN", 9)], configManager)) == 2
+    # The same scan recorded twice in a cycle is planned once
+    runCycle(configManager, [([item("SBIN", 9)], ["SBIN"], None), ([item("TCS", 9)], [], None), ([item("SBIN", 2)], [], None)])
+    assert [scan.universe for scan in PKScanFusion.plannedScans] == [{"SBIN", "TCS"}, {"SBIN"}]
+
+
+def test_only_piped_monitor_options_are_piped(configManager):
+    stocks = list("ABCDEFGHIJ")
+    runCycle(configManager, [
+        ([item(stock, 12) for stock in stocks], ["A", "B", "C"], ("1", "X:12:12:")),
+        # A watchlist of stocks that the first monitor happens to have found
+        ([item(stock, 9) for stock in ["A", "B"]], ["B"], ("2", "X:12:9:")),
+        ([item(stock, 2) for stock in ["A", "B", "C"]], ["C"], ("3", "|{1}X:0:2:")),
+        ([item(stock, 31) for stock in ["C"]], [], ("3", "|{1}X:0:2:>|X:0:31:")),
+        ([item(stock, 5) for stock in stocks], [], ("4", "X:12:5:>X:12:7:")),
+        ([item(stock, 7) for stock in stocks], [], ("4", "X:12:5:>X:12:7:")),
+    ])
+    assert [scan.source for scan in PKScanFusion.plannedScans] == [None, None, 0, 2, None, None]
+
+    scans = PKScanFusion.scansToFuse([item("A", 12)], configManager)
+    result = lambda stock: ({}, {}, None, stock, 0)
+    # The first monitor finds only C this time
+    answers = [{0: result("C"), 2: result("C")}] + [{} for _ in range(9)]
+    PKScanFusion.keepResults(scans, answers)
+    cached, remaining = PKScanFusion.cachedResults([item(stock, 9) for stock in ["A", "B"]], configManager)
+    assert cached == [None, None] and remaining == []
+    # The piped scans ran on C only
+    cached, remaining = PKScanFusion.cachedResults([item(stock, 2) for stock in ["A", "C"]], configManager)
+    assert cached == [result("C")] and remaining == [item("A", 2)]
+    cached, remaining = PKScanFusion.cachedResults([item("C", 31)], configManager)
+    assert cached == [None] and remaining == []
@@ -0,0 +1,77 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes.Backtest import backtest
+from pkscreener.classes.PKForwardReturns import PKForwardReturns
+from pkscreener.classes.PKScanRecord import PKScanRecord
+
+
+@pytest.fixture
+def data():
+    index = pd.date_range("2023-11-01", periods=40, freq="D")
+    return pd.DataFrame(
+        {col: np.arange(100.0, 140.0) for col in ["Open", "High", "Low", "Close", "Volume"]},
+        index=index,
+    )
+
+
+def test_compact_replaces_only_the_data(data):
+    screened, saved = {"Stock": "SBIN"}, {"Stock": "SBIN"}
+    result = (screened, saved, data, "SBIN", 5)
+    compacted = PKScanRecord.compact(result, window=31)
+    assert compacted[0] is screened and compacted[1] is saved and compacted[3:] == ("SBIN", 5)
+    record = compacted[2]
+    assert record.stock == "SBIN"
+    assert record.date == data.index[-1]
+    np.testing.assert_array_equal(record.closes, data["Close"].head(31).values)
+    assert PKScanRecord.compact(result)[2].closes is None
+    assert len(pickle.dumps(compacted)) < len(pickle.dumps(result)) / 4
+    # Walk-forward lists, empty answers and foreign tuples
+    assert [r[2].date for r in PKScanRecord.compact([result, result])] == [data.index[-1]] * 2
+    assert PKScanRecord.compact(None) is None
+    assert PKScanRecord.compact((1, "A", 2, 3)) == (1, "A", 2, 3)
+
+
+def test_dateOf_and_closesOf_agree_with_the_data(data):
+    record = PKScanRecord.fromData("SBIN", data, window=10)
+    assert PKScanRecord.dateOf(record) == PKScanRecord.dateOf(data)
+    np.testing.assert_array_equal(PKScanRecord.closesOf(record, 5), PKScanRecord.closesOf(data, 5))
+    assert len(PKScanRecord.closesOf(PKScanRecord.fromData("SBIN", data.head(0)), 5)) == 0
+
+
+def test_backtest_of_a_record_matches_its_data(data):
+    screenedDict = {col: 1 for col in ["Volume", "Trend", "MA-Signal", "LTP", "52Wk-H", "52Wk-L"] + PKForwardReturns.TRAILING_COLUMNS}
+    saveDict = {"Date": "2023-11-01"}
+    fromData = PKForwardReturns([1, 2, 30])
+    fromRecord = PKForwardReturns([1, 2, 30])
+    backtest("SBIN", data, saveDict, screenedDict, backTestedData=fromData)
+    backtest("SBIN", PKScanRecord.fromData("SBIN", data, fromRecord.window), saveDict, screenedDict, backTestedData=fromRecord)
+    np.testing.assert_allclose(fromRecord.returns(), fromData.returns())
+    pd.testing.assert_frame_equal(fromRecord.toDataFrame(), fromData.toDataFrame())
@@ -0,0 +1,161 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import warnings
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+import pytest
+
+from pkscreener.classes.PKSharedStockData import PKSharedStockData
+
+
+def sampleStockData(rows=5, symbols=("SBIN", "TCS")):
+    stockDict = {}
+    for i, symbol in enumerate(symbols):
+        df = pd.DataFrame(
+            {
+                "Open": np.arange(rows, dtype=float) + i,
+                "High": np.arange(rows, dtype=float) + 2 + i,
+                "Low": np.arange(rows, dtype=float) - 1 + i,
+                "Close": np.arange(rows, dtype=float) + 1 + i,
+                "Volume": np.arange(rows, dtype=float) * 1000 + i,
+            },
+            index=pd.date_range("2024-01-01", periods=rows, freq="D"),
+        )
+        stockDict[symbol] = df.to_dict("split")
+    return stockDict
+
+
+def readCloseInWorker(sharedData, symbol, results):
+    sharedData[f"{symbol}_NEW"] = {"MF": 1}
+    results.put(float(sharedData.dataFrame(symbol)["Close"].iloc[-1]))
+
+
+@pytest.fixture
+def sharedData():
+    stockDict = sampleStockData()
+    stockDict["SBIN"]["FII"] = 10
+    sharedData = PKSharedStockData.publish(stockDict)
+    yield sharedData
+    sharedData.unlink()
+
+
+def test_publish_and_read(sharedData):
+    stockDict = sampleStockData()
+    assert sorted(sharedData.keys()) == ["SBIN", "TCS"]
+    for symbol in ["SBIN", "TCS"]:
+        expected = pd.DataFrame(stockDict[symbol]["data"], columns=stockDict[symbol]["columns"], index=stockDict[symbol]["index"])
+        pd.testing.assert_frame_equal(sharedData.dataFrame(symbol), expected, check_freq=False)
+    assert sharedData.get("SBIN")["FII"] == 10
+    assert sharedData.get("UNKNOWN") is None
+
+
+def test_values_are_read_only(sharedData):
+    values = sharedData.get("TCS")["data"]
+    assert not values.flags.writeable
+    with pytest.raises(ValueError):
+        values[0, 0] = 0
+
+
+def test_publish_returns_none_without_data():
+    assert PKSharedStockData.publish({}) is None
+
+
+def test_pickled_copy_attaches_to_same_block(sharedData):
+    restored = pickle.loads(pickle.dumps(sharedData))
+    assert restored.blockName == sharedData.blockName
+    np.testing.assert_array_equal(restored.values("SBIN"), sharedData.values("SBIN"))
+    restored.close()
+
+
+def test_writes_are_forwarded_to_writeThrough():
+    writeThrough = {}
+    sharedData = PKSharedStockData.publish(sampleStockData(), writeThrough=writeThrough)
+    try:
+        sharedData["INFY"] = {"MF": 5}
+        assert sharedData.get("INFY") == {"MF": 5}
+        assert writeThrough == {"INFY": {"MF": 5}}
+    finally:
+        sharedData.unlink()
+
+
+def test_workers_attach_in_spawned_process():
+    manager = multiprocessing.Manager()
+    writeThrough = manager.dict()
+    sharedData = PKSharedStockData.publish(sampleStockData(), writeThrough=writeThrough)
+    try:
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        worker = context.Process(target=readCloseInWorker, args=(sharedData, "TCS", results))
+        worker.start()
+        assert results.get(timeout=60) == 6.0
+        worker.join(timeout=60)
+        assert "TCS_NEW" in writeThrough.keys()
+        # The block must survive the worker's exit
+        assert sharedData.dataFrame("TCS")["Close"].iloc[-1] == 6.0
+    finally:
+        sharedData.unlink()
+        manager.shutdown()
+
+
+FORKED_WORKER_SCRIPT = """
+import multiprocessing, os, pickle, sys
+sys.path.insert(0, {testDirectory!r})
+from PKSharedStockData_test import sampleStockData
+from pkscreener.classes.PKSharedStockData import PKSharedStockData
+
+def attachAndClose(pickled):
+    pickle.loads(pickled).close()
+
+if __name__ == "__main__":
+    sharedData = PKSharedStockData.publish(sampleStockData())
+    context = multiprocessing.get_context("fork")
+    worker = context.Process(target=attachAndClose, args=(pickle.dumps(sharedData),))
+    worker.start()
+    worker.join()
+    print(os.path.exists(os.path.join("/dev/shm", sharedData.blockName.lstrip("/"))))
+    sharedData.unlink()
+    print(os.path.exists(os.path.join("/dev/shm", sharedData.blockName.lstrip("/"))))
+"""
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm") or "fork" not in multiprocessing.get_all_start_methods(), reason="Needs fork and /dev/shm")
+def test_forked_workers_leave_the_block_to_its_owner():
+    # Forked workers share the parent's resource tracker, which must keep the
+    # block registered for the parent's unlink (without complaints on stderr).
+    script = FORKED_WORKER_SCRIPT.format(testDirectory=os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, PYTHONWARNINGS="ignore")
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=120, env=environment)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["True", "False"]
+    assert result.stderr == ""
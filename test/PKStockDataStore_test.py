@@ -0,0 +1,148 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+import pickle
+import warnings
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+import pytest
+
+from pkscreener.classes.PKStockDataStore import PKStockDataStore
+
+
+def sampleStockData(rows=5, symbols=("SBIN", "TCS")):
+    stockDict = {}
+    for i, symbol in enumerate(symbols):
+        df = pd.DataFrame(
+            {
+                "Open": np.arange(rows, dtype=float) + i,
+                "High": np.arange(rows, dtype=float) + 2 + i,
+                "Low": np.arange(rows, dtype=float) - 1 + i,
+                "Close": np.arange(rows, dtype=float) + 1 + i,
+                "Volume": np.arange(rows, dtype=float) * 1000 + i,
+            },
+            index=pd.date_range("2024-01-01", periods=rows, freq="D"),
+        )
+        stockDict[symbol] = df.to_dict("split")
+    return stockDict
+
+
+@pytest.fixture
+def storePath(tmp_path):
+    return str(tmp_path / "stock_data_010124.pkcol")
+
+
+def test_write_and_read_roundtrip(storePath):
+    stockDict = sampleStockData()
+    stockDict["SBIN"]["MF"] = 100
+    PKStockDataStore.write(stockDict, storePath)
+    store = PKStockDataStore(storePath)
+    assert len(store) == 2
+    assert sorted(store.keys()) == ["SBIN", "TCS"]
+    for symbol in ["SBIN", "TCS"]:
+        expected = pd.DataFrame(stockDict[symbol]["data"], columns=stockDict[symbol]["columns"], index=stockDict[symbol]["index"])
+        pd.testing.assert_frame_equal(store.dataFrame(symbol), expected, check_freq=False)
+    assert store.get("SBIN")["MF"] == 100
+    assert "MF" not in store.get("TCS").keys()
+    assert store.get("UNKNOWN") is None
+    with pytest.raises(KeyError):
+        store["UNKNOWN"]
+
+
+def test_values_are_zero_copy_views(storePath):
+    PKStockDataStore.write(sampleStockData(), storePath)
+    store = PKStockDataStore(storePath)
+    values = store.values("TCS")
+    assert isinstance(values, np.memmap)
+    assert not values.flags.writeable
+    df = store.dataFrame("TCS")
+    assert np.shares_memory(df["Close"].values, values)
+
+
+def test_overlay_writes_do_not_touch_the_store(storePath):
+    stockDict = sampleStockData()
+    PKStockDataStore.write(stockDict, storePath)
+    store = PKStockDataStore(storePath)
+    newData = sampleStockData(rows=2, symbols=("INFY",))["INFY"]
+    store["INFY"] = newData
+    store["SBIN"] = newData
+    assert len(store) == 3
+    assert store.get("SBIN") is newData
+    assert len(PKStockDataStore(storePath)) == 2
+
+
+def test_columnValues(storePath):
+    stockDict = sampleStockData()
+    PKStockDataStore.write(stockDict, storePath)
+    store = PKStockDataStore(storePath)
+    timestamps, values = store.columnValues("TCS", ["Close", "Volume"])
+    np.testing.assert_array_equal(timestamps, pd.DatetimeIndex(stockDict["TCS"]["index"]).asi8)
+    np.testing.assert_array_equal(values, np.asarray(stockDict["TCS"]["data"])[:, [3, 4]])
+    assert store.columnValues("TCS", ["Adj Close"]) is None
+    store["TCS"] = stockDict["TCS"]
+    assert store.columnValues("TCS", ["Close"]) is None
+
+
+def test_mixed_columns_and_timezones(storePath):
+    stockDict = sampleStockData()
+    df = pd.DataFrame(stockDict["TCS"]["data"], columns=stockDict["TCS"]["columns"], index=stockDict["TCS"]["index"])
+    df["Adj Close"] = df["Close"] * 0.9
+    df.index = df.index.tz_localize("Asia/Kolkata")
+    stockDict["TCS"] = df.to_dict("split")
+    stockDict["BAD"] = {"index": ["x"], "columns": ["Close"], "data": [["not a number"]]}
+    PKStockDataStore.write(stockDict, storePath)
+    store = PKStockDataStore(storePath)
+    pd.testing.assert_frame_equal(store.dataFrame("TCS"), df, check_freq=False)
+    assert list(store.get("SBIN")["columns"]) == ["Open", "High", "Low", "Close", "Volume"]
+    assert store.get("BAD") == stockDict["BAD"]
+
+
+def test_pickling_reopens_the_mapped_files(storePath):
+    PKStockDataStore.write(sampleStockData(), storePath)
+    store = PKStockDataStore(storePath)
+    store["INFY"] = sampleStockData(symbols=("INFY",))["INFY"]
+    restored = pickle.loads(pickle.dumps(store))
+    assert len(restored) == 3
+    assert np.array_equal(restored.values("SBIN"), store.values("SBIN"))
+    copied = store.copy()
+    assert isinstance(copied, dict)
+    assert not isinstance(copied["SBIN"]["data"], np.memmap)
+
+
+def test_convert_pickles(tmp_path):
+    pickleFilePath = os.path.join(tmp_path, "stock_data_010124.pkl")
+    with open(pickleFilePath, "wb") as f:
+        pickle.dump(sampleStockData(), f)
+    converted = PKStockDataStore.convertPickles(rootDir=str(tmp_path))
+    storePath = PKStockDataStore.storePathForCacheFile(pickleFilePath)
+    assert converted == [storePath]
+    assert PKStockDataStore.isUpToDate(storePath, pickleFilePath)
+    assert PKStockDataStore.convertPickles(rootDir=str(tmp_path)) == []
+    os.remove(pickleFilePath)
+    assert not PKStockDataStore.isUpToDate(storePath, pickleFilePath)
@@ -0,0 +1,158 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import multiprocessing
+import os
+import time
+
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PKSharedStockData import PKSharedStockData
+from pkscreener.classes.PKWorkerPool import PKScanJob, PKScanWorker, PKTaskBatches, PKWorkerPool
+
+
+def describeItem(stock, delay, hostRef=None):
+    time.sleep(delay)
+    return (os.getpid(), stock, hostRef.configManager.minLTP, stock in hostRef.objectDictionaryPrimary)
+
+
+@pytest.fixture
+def pool():
+    tasks_queue = multiprocessing.JoinableQueue()
+    results_queue = multiprocessing.Queue()
+    configManager = ConfigManager.tools()
+    workers = [
+        PKScanWorker(
+            describeItem,
+            tasks_queue,
+            results_queue,
+            multiprocessing.Queue(),
+            keyboardInterruptEvent=multiprocessing.Event(),
+            defaultLogger=dl(),
+            configManager=configManager,
+            jobQueue=PKWorkerPool.newJobQueue(),
+            activeJobId=PKWorkerPool.activeJobId,
+        )
+        for _ in range(2)
+    ]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    PKWorkerPool.register(workers, tasks_queue, results_queue, None)
+    minLTP = configManager.minLTP
+    yield configManager
+    configManager.minLTP = minLTP
+    for worker in workers:
+        worker.terminate()
+    PKWorkerPool.reset()
+
+
+def runJob(configManager, stockDict, stocks, delay=0, batchSize=1):
+    items = [(stock, delay) for stock in stocks]
+    PKWorkerPool.submit(PKScanJob(PKWorkerPool.nextJobId(), configManager, objectDictionaryPrimary=stockDict, itemTemplate=items[0]))
+    for start in range(0, len(items), batchSize):
+        PKWorkerPool.tasks_queue.put(PKWorkerPool.batch(items[start:start + batchSize]))
+
+
+def nextResults(count):
+    results = []
+    while len(results) < count:
+        results.extend(PKWorkerPool.nextResults(PKWorkerPool.results_queue))
+    return results
+
+
+def test_workers_are_reused_with_each_jobs_context(pool):
+    assert PKWorkerPool.isRunning(2)
+    assert not PKWorkerPool.isRunning(3)
+    assert not PKWorkerPool.isRunning(1, exactly=True)
+    pool.minLTP = 11
+    runJob(pool, {"SBIN": {}}, ["SBIN", "TCS"])
+    first = sorted(nextResults(2), key=lambda r: r[1])
+    assert [r[1:] for r in first] == [("SBIN", 11, True), ("TCS", 11, False)]
+
+    pool.minLTP = 22
+    shared = PKSharedStockData.publish({"TCS": {"columns": ["Close"], "index": [0], "data": [[1.0]]}})
+    try:
+        runJob(pool, shared, ["SBIN", "TCS", "INFY", "SBIN"], batchSize=3)
+        second = nextResults(4)
+    finally:
+        shared.unlink()
+    assert sorted(r[1:] for r in second) == [("INFY", 22, False), ("SBIN", 22, False), ("SBIN", 22, False), ("TCS", 22, True)]
+    workerIds = {worker.pid for worker in PKWorkerPool.workers}
+    assert {r[0] for r in first + second} <= workerIds
+
+
+def test_cancelled_job_results_are_dropped(pool):
+    runJob(pool, {}, ["A", "B", "C", "D", "E", "F"], delay=0.2, batchSize=2)
+    PKWorkerPool.cancel()
+    runJob(pool, {"X": {}}, ["X"])
+    assert [r[1:] for r in PKWorkerPool.nextResults(PKWorkerPool.results_queue)] == [("X", pool.minLTP, True)]
+
+
+def test_jobs_of_scans_without_items_do_not_pile_up(pool):
+    for _ in range(10):
+        PKWorkerPool.submit(PKScanJob(PKWorkerPool.nextJobId(), pool))
+        time.sleep(0.05)
+    assert all(worker.jobQueue.qsize() <= 2 for worker in PKWorkerPool.workers)
+    runJob(pool, {"X": {}}, ["X", "Y"])
+    assert sorted(r[1:] for r in nextResults(2)) == [("X", pool.minLTP, True), ("Y", pool.minLTP, False)]
+
+
+def test_batch_only_sends_what_differs_from_the_template():
+    userArgs = object()
+    template = ("X", 1, "SBIN", userArgs, 0)
+    items = [template, ("X", 1, "TCS", userArgs, 0), ("X", 1, "INFY", userArgs, [1, 2]), ("short",)]
+    PKWorkerPool.activeJobId = PKWorkerPool.activeJobId or multiprocessing.Value("i", 0)
+    PKWorkerPool.itemTemplate = template
+    try:
+        _, changes = PKWorkerPool.batch(items)
+        assert changes == [{}, {2: "TCS"}, {2: "INFY", 4: [1, 2]}, ("short",)]
+        assert [PKWorkerPool.itemFrom(change, template) for change in changes] == items
+    finally:
+        PKWorkerPool.itemTemplate = None
+
+
+def test_batches_adapt_to_the_time_per_stock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    batches = PKTaskBatches(list(range(10000)), 4)
+    assert len(batches.nextBatch()) == PKTaskBatches.INITIAL_SIZE
+    # 1ms per stock per worker: 0.2s worth of stocks per batch
+    now[0] += 0.001 * 2 / 4
+    batches.markCompleted(2)
+    assert len(batches.nextBatch()) == 200
+    # Slow stocks go out one at a time
+    now[0] += 10
+    batches.markCompleted(200)
+    assert len(batches.nextBatch()) == 1
+    # The last ones are shared out between the workers
+    batches = PKTaskBatches(list(range(20)), 4)
+    batches.nextBatch()
+    batches.markCompleted(2)
+    sizes = []
+    while batches.remaining() > 0:
+        sizes.append(len(batches.nextBatch()))
+    assert sum(sizes) == 18 and max(sizes) <= 3
@@ -315,76 +315,49 @@ def test_getBacktestDataFromCleanedData_no_df(args):
     saveResults = pd.DataFrame({"LTP": [11, 22, 33], "LTP1": [10, 20, 30], "Growth1": [0.1, 0.2, 0.3], "Pattern": ["A", "B", "C"]})
     period = 1
     
-    with patch('pkscreener.classes.PortfolioXRay.statScanCalculationForRSI') as mock_statScanCalculationForRSI, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForTrend') as mock_statScanCalculationForTrend, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForMA') as mock_statScanCalculationForMA, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForVol') as mock_statScanCalculationForVol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForConsol') as mock_statScanCalculationForConsol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForBO') as mock_statScanCalculationForBO, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationFor52Wk') as mock_statScanCalculationFor52Wk, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForCCI') as mock_statScanCalculationForCCI:
-
-        result = getBacktestDataFromCleanedData(args, saveResults, df=None, period=period)
-        
-        assert isinstance(result, pd.DataFrame)
-        assert len(result) == len(saveResults)+1
-        assert f"LTP{period}" not in result.columns
-        assert f"Growth{period}" not in result.columns
-        assert f"{period}Pd-%" in result.columns
-        assert f"{period}Pd-10k" in result.columns
-        assert "Pattern" not in result.columns
-        assert "ScanType" in result.columns
-        assert result["ScanType"].tolist() == ["[P]A", "[P]B", "[P]C", "NoFilter"]
+    result = getBacktestDataFromCleanedData(args, saveResults, df=None, period=period)
+    
+    assert isinstance(result, pd.DataFrame)
+    assert len(result) == len(saveResults)+1
+    assert f"LTP{period}" not in result.columns
+    assert f"Growth{period}" not in result.columns
+    assert f"{period}Pd-%" in result.columns
+    assert f"{period}Pd-10k" in result.columns
+    assert "Pattern" not in result.columns
+    assert "ScanType" in result.columns
+    assert result["ScanType"].tolist() == ["[P]A", "[P]B", "[P]C", "NoFilter"]
 
 def test_getBacktestDataFromCleanedData_with_df(args):
     saveResults = pd.DataFrame({"LTP": [11, 22, 33], "LTP1": [10, 20, 30], "Growth1": [0.1, 0.2, 0.3], "Pattern": ["A", "B", "C"]})
     period = 1
     df = pd.DataFrame({"Pattern": ["D", "E", "F"]})
-    with patch('pkscreener.classes.PortfolioXRay.statScanCalculationForRSI') as mock_statScanCalculationForRSI, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForTrend') as mock_statScanCalculationForTrend, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForMA') as mock_statScanCalculationForMA, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForVol') as mock_statScanCalculationForVol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForConsol') as mock_statScanCalculationForConsol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForBO') as mock_statScanCalculationForBO, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationFor52Wk') as mock_statScanCalculationFor52Wk, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForCCI') as mock_statScanCalculationForCCI:
-
-        result = getBacktestDataFromCleanedData(args, saveResults, df=df, period=period)
-    
-        assert isinstance(result, pd.DataFrame)
-        assert len(result) == len(saveResults)+1
-        assert f"LTP{period}" not in result.columns
-        assert f"Growth{period}" not in result.columns
-        assert f"{period}Pd-%" in result.columns
-        assert f"{period}Pd-10k" in result.columns
-        assert "Pattern" in result.columns
-        assert "ScanType" not in result.columns
-        assert result["Pattern"].tolist()[:-1] == ["D", "E", "F"]
+    result = getBacktestDataFromCleanedData(args, saveResults, df=df, period=period)
+
+    assert isinstance(result, pd.DataFrame)
+    assert len(result) == len(saveResults)+1
+    assert f"LTP{period}" not in result.columns
+    assert f"Growth{period}" not in result.columns
+    assert f"{period}Pd-%" in result.columns
+    assert f"{period}Pd-10k" in result.columns
+    assert "Pattern" in result.columns
+    assert "ScanType" not in result.columns
+    assert result["Pattern"].tolist()[:-1] == ["D", "E", "F"]
 
 def test_getBacktestDataFromCleanedData_no_pattern(args):
     saveResults = pd.DataFrame({"LTP": [11, 22, 33], "LTP1": [10, 20, 30], "Growth1": [0.1, 0.2, 0.3], "Pattern": [None, "", "C"]})
     period = 1
     
-    with patch('pkscreener.classes.PortfolioXRay.statScanCalculationForRSI') as mock_statScanCalculationForRSI, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForTrend') as mock_statScanCalculationForTrend, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForMA') as mock_statScanCalculationForMA, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForVol') as mock_statScanCalculationForVol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForConsol') as mock_statScanCalculationForConsol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForBO') as mock_statScanCalculationForBO, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationFor52Wk') as mock_statScanCalculationFor52Wk, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForCCI') as mock_statScanCalculationForCCI:
-
-        result = getBacktestDataFromCleanedData(args, saveResults, df=None, period=period)
-        
-        assert isinstance(result, pd.DataFrame)
-        assert len(result) == len(saveResults)
-        assert f"LTP{period}" not in result.columns
-        assert f"Growth{period}" not in result.columns
-        assert f"{period}Pd-%" in result.columns
-        assert f"{period}Pd-10k" in result.columns
-        assert "Pattern" not in result.columns
-        assert "ScanType" in result.columns
-        assert result["ScanType"].tolist() == ["[P]No Pattern", "[P]C", "NoFilter"]
+    result = getBacktestDataFromCleanedData(args, saveResults, df=None, period=period)
+    
+    assert isinstance(result, pd.DataFrame)
+    assert len(result) == len(saveResults)
+    assert f"LTP{period}" not in result.columns
+    assert f"Growth{period}" not in result.columns
+    assert f"{period}Pd-%" in result.columns
+    assert f"{period}Pd-10k" in result.columns
+    assert "Pattern" not in result.columns
+    assert "ScanType" in result.columns
+    assert result["ScanType"].tolist() == ["[P]No Pattern", "[P]C", "NoFilter"]
 
 @pytest.fixture
 def savedResults():
@@ -451,201 +424,52 @@ def saveResults():
     return None
 
 def test_statScanCalculations(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.statScanCalculationForRSI') as mock_statScanCalculationForRSI, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForTrend') as mock_statScanCalculationForTrend, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForMA') as mock_statScanCalculationForMA, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForVol') as mock_statScanCalculationForVol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForConsol') as mock_statScanCalculationForConsol, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForBO') as mock_statScanCalculationForBO, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationFor52Wk') as mock_statScanCalculationFor52Wk, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForCCI') as mock_statScanCalculationForCCI, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForPatterns') as mock_statScanCalculationForPatterns, \
-        patch('pkscreener.classes.PortfolioXRay.statScanCalculationForNoFilter') as mock_statScanCalculationForNoFilter:
-        
-        result = statScanCalculations(args, saveResults, period)
-        
-        assert result == scanResults
-        mock_statScanCalculationForRSI.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForTrend.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForMA.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForVol.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForConsol.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForBO.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationFor52Wk.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForCCI.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForPatterns.assert_called_once_with(args, saveResults, period, scanResults)
-        mock_statScanCalculationForNoFilter.assert_called_once_with(args, saveResults, period, scanResults)
-
-
-def test_statScanCalculationForCCI(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterCCIBelowMinus100') as mock_filterCCIBelowMinus100, \
-         patch('pkscreener.classes.PortfolioXRay.filterCCIBelow0') as mock_filterCCIBelow0, \
-         patch('pkscreener.classes.PortfolioXRay.filterCCI0To100') as mock_filterCCI0To100, \
-         patch('pkscreener.classes.PortfolioXRay.filterCCI100To200') as mock_filterCCI100To200, \
-         patch('pkscreener.classes.PortfolioXRay.filterCCIAbove200') as mock_filterCCIAbove200, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationForCCI(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterCCIBelowMinus100.assert_called_once_with(saveResults)
-        mock_filterCCIBelow0.assert_called_once_with(saveResults)
-        mock_filterCCI0To100.assert_called_once_with(saveResults)
-        mock_filterCCI100To200.assert_called_once_with(saveResults)
-        mock_filterCCIAbove200.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 5
-
-
-def test_statScanCalculationFor52Wk(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterLTPMoreOREqual52WkH') as mock_filterLTPMoreOREqual52WkH, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPWithin90Percent52WkH') as mock_filterLTPWithin90Percent52WkH, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPLess90Percent52WkH') as mock_filterLTPLess90Percent52WkH, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPMore52WkL') as mock_filterLTPMore52WkL, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPWithin90Percent52WkL') as mock_filterLTPWithin90Percent52WkL, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPLess52WkL') as mock_filterLTPLess52WkL, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationFor52Wk(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterLTPMoreOREqual52WkH.assert_called_once_with(saveResults)
-        mock_filterLTPWithin90Percent52WkH.assert_called_once_with(saveResults)
-        mock_filterLTPLess90Percent52WkH.assert_called_once_with(saveResults)
-        mock_filterLTPMore52WkL.assert_called_once_with(saveResults)
-        mock_filterLTPWithin90Percent52WkL.assert_called_once_with(saveResults)
-        mock_filterLTPLess52WkL.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 6
-
-
-def test_statScanCalculationForBO(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterLTPLessThanBreakout') as mock_filterLTPLessThanBreakout, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPMoreOREqualBreakout') as mock_filterLTPMoreOREqualBreakout, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPLessThanResistance') as mock_filterLTPLessThanResistance, \
-         patch('pkscreener.classes.PortfolioXRay.filterLTPMoreOREqualResistance') as mock_filterLTPMoreOREqualResistance, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationForBO(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterLTPLessThanBreakout.assert_called_once_with(saveResults)
-        mock_filterLTPMoreOREqualBreakout.assert_called_once_with(saveResults)
-        mock_filterLTPLessThanResistance.assert_called_once_with(saveResults)
-        mock_filterLTPMoreOREqualResistance.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 4
-
-
-def test_statScanCalculationForConsol(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterConsolidating10Percent') as mock_filterConsolidating10Percent, \
-         patch('pkscreener.classes.PortfolioXRay.filterConsolidatingMore10Percent') as mock_filterConsolidatingMore10Percent, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationForConsol(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterConsolidating10Percent.assert_called_once_with(saveResults)
-        mock_filterConsolidatingMore10Percent.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 2
-
-
-def test_statScanCalculationForVol(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterVolumeLessThan25') as mock_filterVolumeLessThan25, \
-         patch('pkscreener.classes.PortfolioXRay.filterVolumeMoreThan25') as mock_filterVolumeMoreThan25, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationForVol(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterVolumeLessThan25.assert_called_once_with(saveResults)
-        mock_filterVolumeMoreThan25.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 2
-
+    periods = [1, 2]
+    saveResults = pd.DataFrame({
+        "LTP": [100.0, 200.0, 300.0],
+        "LTP1": [110.0, 190.0, 0.0],
+        "Growth1": [10.0, -10.0, 0.0],
+        "LTP2": [120.0, np.nan, 0.0],
+        "Growth2": [20.0, np.nan, 0.0],
+        "RSI": [40.0, 55.0, 70.0],
+        f"Trend({tools().daysToLookback}Prds)": ["Strong Up", "Weak Down", "Sideways"],
+        "MA-Signal": ["Bullish", "BullCross-50", "50MA-Support"],
+        "Volume": [1.0, 3.0, 2.5],
+        "Consol.": [5.0, 15.0, 10.0],
+        "Breakout": [90.0, 250.0, 0.0],
+        "Resistance": [150.0, 150.0, 0.0],
+        "52Wk-H": [100.0, 210.0, 400.0],
+        "52Wk-L": [95.0, 100.0, 350.0],
+        "CCI": [-150.0, 50.0, 250.0],
+        "Pattern": ["", "NR4", "NR4"],
+    })
 
-def test_statScanCalculationForMA(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterMASignalBullish') as mock_filterMASignalBullish, \
-         patch('pkscreener.classes.PortfolioXRay.filterMASignalBearish') as mock_filterMASignalBearish, \
-         patch('pkscreener.classes.PortfolioXRay.filterMASignalNeutral') as mock_filterMASignalNeutral, \
-         patch('pkscreener.classes.PortfolioXRay.filterMASignalBullCross') as mock_filterMASignalBullCross, \
-         patch('pkscreener.classes.PortfolioXRay.filterMASignalBearCross') as mock_filterMASignalBearCross, \
-         patch('pkscreener.classes.PortfolioXRay.filterMASignalSupport') as mock_filterMASignalSupport, \
-         patch('pkscreener.classes.PortfolioXRay.filterMASignalResist') as mock_filterMASignalResist, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationForMA(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterMASignalBullish.assert_called_once_with(saveResults)
-        mock_filterMASignalBearish.assert_called_once_with(saveResults)
-        mock_filterMASignalNeutral.assert_called_once_with(saveResults)
-        mock_filterMASignalBullCross.assert_called_once_with(saveResults)
-        mock_filterMASignalBearCross.assert_called_once_with(saveResults)
-        mock_filterMASignalSupport.assert_called_once_with(saveResults)
-        mock_filterMASignalResist.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 7
-
-
-def test_statScanCalculationForTrend(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterTrendStrongUp') as mock_filterTrendStrongUp, \
-         patch('pkscreener.classes.PortfolioXRay.filterTrendWeakUp') as mock_filterTrendWeakUp, \
-         patch('pkscreener.classes.PortfolioXRay.filterTrendUp') as mock_filterTrendUp, \
-         patch('pkscreener.classes.PortfolioXRay.filterTrendStrongDown') as mock_filterTrendStrongDown, \
-         patch('pkscreener.classes.PortfolioXRay.filterTrendWeakDown') as mock_filterTrendWeakDown, \
-         patch('pkscreener.classes.PortfolioXRay.filterTrendSideways') as mock_filterTrendSideways, \
-         patch('pkscreener.classes.PortfolioXRay.filterTrendDown') as mock_filterTrendDown, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationForTrend(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterTrendStrongUp.assert_called_once_with(saveResults)
-        mock_filterTrendWeakUp.assert_called_once_with(saveResults)
-        mock_filterTrendUp.assert_called_once_with(saveResults)
-        mock_filterTrendStrongDown.assert_called_once_with(saveResults)
-        mock_filterTrendWeakDown.assert_called_once_with(saveResults)
-        mock_filterTrendSideways.assert_called_once_with(saveResults)
-        mock_filterTrendDown.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 7
-
-
-def test_statScanCalculationForRSI(args, saveResults):
-    period = 30
-    scanResults = []
-    
-    with patch('pkscreener.classes.PortfolioXRay.filterRSIAbove50') as mock_filterRSIAbove50, \
-         patch('pkscreener.classes.PortfolioXRay.filterRSI50To67') as mock_filterRSI50To67, \
-         patch('pkscreener.classes.PortfolioXRay.filterRSI68OrAbove') as mock_filterRSI68OrAbove, \
-         patch('pkscreener.classes.PortfolioXRay.getCalculatedValues') as mock_getCalculatedValues:
-        
-        result = statScanCalculationForRSI(args, saveResults, period, scanResults)
-        
-        assert result == scanResults
-        mock_filterRSIAbove50.assert_called_once_with(saveResults)
-        mock_filterRSI50To67.assert_called_once_with(saveResults)
-        mock_filterRSI68OrAbove.assert_called_once_with(saveResults)
-        assert mock_getCalculatedValues.call_count == 3
+    result = statScanCalculations(args, saveResults, periods)
+
+    # Every strategy gives the same numbers as filtering the results with it
+    # One row per strategy, with the "[P]" strategy once for each of the 2 patterns
+    assert len(result) == len(strategyDictionary()) - 1 + 2
+    for row in result:
+        key = row["ScanType"]
+        filtered = strategyForKey(key)(saveResults, key) if key.startswith("[P]") else strategyForKey(key)(saveResults)
+        assert row == getCalculatedValues(filtered, periods, key, args)
+    assert [row["ScanType"] for row in result][-3:] == ["[P]No Pattern", "[P]NR4", "NoFilter"]
+    noFilter = result[-1]
+    assert noFilter["1Pd-%"] == 0.0
+    assert noFilter["2Pd-%"] == round(100 * 20 / 600, 2)
+    assert noFilter["2Pd-10k"] == round(10000 * (1 + 0.01 * noFilter["2Pd-%"]), 2)
+    assert result[2]["ScanType"] == "[RSI]>=68"
+    assert result[2]["1Pd-%"] == 999999999
+
+
+def test_strategies_have_one_condition_each():
+    assert sorted(STRATEGY_CONDITIONS.keys()) == sorted(set(strategyDictionary().keys()) - {"NoFilter", "[P]"})
+    saveResults = pd.DataFrame({"RSI": [40.0, 55.0], "Pattern": ["NR4", None]})
+    masks = dict(strategyMasks(saveResults.assign(**{col: 0 for col in ["MA-Signal", "Volume", "Consol.", "LTP", "Breakout", "Resistance", "52Wk-H", "52Wk-L", "CCI", f"Trend({tools().daysToLookback}Prds)"]})))
+    assert masks["[RSI]>=50"].tolist() == [False, True]
+    assert masks["[P]NR4"].tolist() == [True, False]
+    assert filterPattern(saveResults, "[P]NR4").index.tolist() == [0]
+    assert filterPattern(saveResults, "[P]No Pattern") is None
 
 
 def test_formatGridOutput():
@@ -36,6 +36,7 @@ from PKDevTools.classes.ColorText import colorText
 import pkscreener.classes.ConfigManager as ConfigManager
 import pkscreener.classes.Utility as Utility
 from pkscreener.classes.ScreeningStatistics import ScreeningStatistics
+from pkscreener.classes.PKLorentzianClassifier import PKLorentzianClassifier
 from PKDevTools.classes.PKDateUtilities import PKDateUtilities
 @pytest.fixture
 def configManager():
@@ -1084,6 +1085,23 @@ def test_findTrend_tops_data(tools_instance):
     with patch("pkscreener.classes.Pktalib.pktalib.argrelextrema",side_effect=[([0,1,2],)]):
         tools_instance.findTrend(df, {}, {}) == 'Unknown'
 
+# The trends of many symbols at once are the same as one at a time
+def test_findTrends_matches_findTrend(tools_instance):
+    rng = np.random.default_rng(0)
+    lookback = 22
+    closes = np.full((lookback, 50), np.nan)
+    frames = []
+    for column in range(50):
+        bars = lookback if column % 5 else 2 + column % lookback
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.05, bars)))
+        closes[lookback - bars:, column] = close
+        frames.append(pd.DataFrame({"Close": close[::-1]}))
+    trends = tools_instance.findTrends(closes)
+    assert list(trends) == [tools_instance.findTrend(df, {}, {}, daysToLookback=lookback) for df in frames]
+    assert set(trends) > {"Sideways", "Weak Up", "Strong Down"}
+    flat = tools_instance.findTrends(np.array([[10.0, 10.0], [10.0, 12.0], [10.0, 11.0]]))
+    assert list(flat) == ["Unknown", "Unknown"]
+
 # Positive test case for findTrendlines function
 def test_findTrendlines_positive(tools_instance):
     # Mocking the data
@@ -1206,6 +1224,30 @@ def test_findTrendlines_positive(tools_instance):
     assert tools_instance.findTrendlines(data, {}, {}) == True
 
 
+# The support line is fitted as the repeated scipy linregress over the lows did
+def test_findTrendlineSupport_matches_linregress(tools_instance):
+    from scipy.stats import linregress
+    rng = np.random.default_rng(0)
+    for bars in [20, 250, 1000]:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+        low = close * (1 - rng.uniform(0, 0.02, bars))
+        number = np.arange(1, bars + 1)
+        bars_low = np.arange(bars)
+        while len(bars_low) > 30:
+            slope, intercept, _, _, _ = linregress(x=number[bars_low], y=low[bars_low])
+            bars_low = bars_low[low[bars_low] < slope * number[bars_low] + intercept]
+        slope, intercept, _, _, _ = linregress(x=number[bars_low], y=close[bars_low])
+        assert tools_instance.findTrendlineSupport(low, close) == (slope, intercept)
+
+def test_findTrendlineSupport_degenerate(tools_instance):
+    # No lows below a line through all of them
+    low = np.full(100, 10.0)
+    assert tools_instance.findTrendlineSupport(low, low) is None
+    assert tools_instance.findTrendlines(pd.DataFrame({"Low": low, "Close": low}), {}, {}) == False
+    slope, intercept = tools_instance.findTrendlineSupport(np.arange(100.0), np.arange(100.0) * 2, maxIterations=0)
+    assert slope == pytest.approx(2) and intercept == pytest.approx(-2)
+
+
 # Positive test case for getCandleType function
 def test_getCandleType_positive(tools_instance):
     # Mocking the dailyData
@@ -2096,10 +2138,8 @@ def test_validateLorentzian_buy_signal(tools_instance):
     # Call the validateLorentzian function with the sample DataFrame and lookFor=1 (Buy)
     screenDict = {}
     saveDict = {}
-    mock_lc = MagicMock()
-    with patch("advanced_ta.LorentzianClassification") as mock_lc:
-        mock_lc.return_value = mock_lc
-        mock_lc.df = pd.DataFrame([{"isNewSellSignal":False,"isNewBuySignal":True}])
+    with patch("pkscreener.classes.PKLorentzianClassifier.PKLorentzianClassifier.latestSignal") as mock_lc:
+        mock_lc.return_value = PKLorentzianClassifier.BUY
         result = tools_instance.validateLorentzian(df, screenDict, saveDict, lookFor=1)
         # Assert that the function returns True and sets the appropriate screenDict and saveDict values
         assert result == True
@@ -2118,17 +2158,15 @@ def test_validateLorentzian_sell_signal(tools_instance):
     # Call the validateLorentzian function with the sample DataFrame and lookFor=2 (Sell)
     screenDict = {}
     saveDict = {}
-    mock_lc = MagicMock()
-    with patch("advanced_ta.LorentzianClassification") as mock_lc:
-        mock_lc.return_value = mock_lc
-        mock_lc.df = pd.DataFrame([{"isNewSellSignal":True,"isNewBuySignal":False}])
+    with patch("pkscreener.classes.PKLorentzianClassifier.PKLorentzianClassifier.latestSignal") as mock_lc:
+        mock_lc.return_value = PKLorentzianClassifier.SELL
         result = tools_instance.validateLorentzian(df, screenDict, saveDict, lookFor=2)
         # Assert that the function returns True and sets the appropriate screenDict and saveDict values
         assert result == True
         assert screenDict["Pattern"] == (colorText.BOLD + colorText.FAIL + "Lorentzian-Sell" + colorText.END)
         assert saveDict["Pattern"] == "Lorentzian-Sell"
         assert tools_instance.validateLorentzian(df, screenDict, saveDict, lookFor=1) == False
-        mock_lc.df = pd.DataFrame([{"isNewSellSignal":False,"isNewBuySignal":False}])
+        mock_lc.return_value = 0
         assert tools_instance.validateLorentzian(df, screenDict, saveDict, lookFor=1) == False
 
 def test_validateLorentzian_no_signal(tools_instance):
@@ -3019,4 +3057,39 @@ def test_validateVolumeSpreadAnalysis_spread0_lessthan_spread1(mock_data, mock_s
     mock_data.loc[1, "Volume"] = mock_data["Volume"].iloc[0] -1000
     assert tools_instance.validateVolumeSpreadAnalysis(mock_data, mock_screen_dict, mock_save_dict) == True
     assert mock_screen_dict.get("Pattern") == colorText.BOLD + colorText.GREEN + "Demand Rise" + colorText.END 
-    assert mock_save_dict.get("Pattern") == 'Demand Rise'
\ No newline at end of file
+    assert mock_save_dict.get("Pattern") == 'Demand Rise'
+
+def atrTrailingStopInputs():
+    import json
+    from pkscreener.classes.Pktalib import pktalib
+    with open("test/yahoo_response.txt") as f:
+        data = pd.DataFrame(json.load(f))
+    data["xATR"] = pktalib.ATR(data["High"], data["Low"], data["Close"], timeperiod=10)
+    data["nLoss"] = 1 * data["xATR"]
+    return data.dropna().reset_index()
+
+
+def referenceATRTrailingStops(tools_instance, data):
+    # The original row by row implementation
+    data = data.copy()
+    data["ATRTrailingStop"] = [0.0] + [np.nan for i in range(len(data) - 1)]
+    for i in range(1, len(data)):
+        data.loc[i, "ATRTrailingStop"] = tools_instance.xATRTrailingStop_func(
+            data.loc[i, "Close"],
+            data.loc[i - 1, "Close"],
+            data.loc[i - 1, "ATRTrailingStop"],
+            data.loc[i, "nLoss"],
+        )
+    return data["ATRTrailingStop"].to_numpy()
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_atrTrailingStops_matches_row_by_row_implementation(tools_instance, compiled):
+    import pkscreener.classes.ScreeningStatistics as ScreeningStatisticsModule
+    data = atrTrailingStopInputs()
+    expected = referenceATRTrailingStops(tools_instance, data)
+    kernel = ScreeningStatisticsModule._compiledATRTrailingStopsKernel if compiled else None
+    with patch("pkscreener.classes.ScreeningStatistics._compiledATRTrailingStopsKernel", kernel):
+        actual = ScreeningStatisticsModule.atrTrailingStops(data["Close"].to_numpy(), data["nLoss"].to_numpy())
+    np.testing.assert_array_equal(actual, expected)
+    assert len(ScreeningStatisticsModule.atrTrailingStops([], [])) == 0
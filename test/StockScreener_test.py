@@ -24,9 +24,14 @@
 """
 import pytest
 import logging
+import numpy as np
 import pandas as pd
 from unittest.mock import MagicMock, patch
 
+from PKDevTools.classes.log import default_logger
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PKScanRunner import PKScanRunner
+from pkscreener.classes.ScreeningStatistics import ScreeningStatistics
 from pkscreener.classes.StockScreener import StockScreener
 
 @pytest.fixture
@@ -172,3 +177,117 @@ def test_screenStocks(stock_consumer):
                 assert called_values[executeOption]
             else:
                 assert result is None
+
+
+def test_walkForwardSlice_matches_preprocessData(stock_consumer):
+    configManager = ConfigManager.tools()
+    screener = ScreeningStatistics(configManager, default_logger())
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, 300))
+    data = pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": rng.integers(1000, 5000, 300).astype(float)},
+        index=pd.bdate_range("2023-01-02", periods=300),
+    )
+    # A row without any values is dropped by preprocessData
+    data.iloc[200] = np.nan
+    stock_consumer.walkForwardData = {}
+    for backtestDuration in [120, 99, 50, 1]:
+        inputData = data.head(len(data) - backtestDuration)
+        fullData, processedData = stock_consumer.walkForwardSlice(screener, configManager, data, len(inputData), "SBIN")
+        expectedFullData, expectedProcessedData = screener.preprocessData(inputData, daysToLookback=configManager.daysToLookback, stock="SBIN")
+        pd.testing.assert_frame_equal(fullData, expectedFullData, check_freq=False)
+        pd.testing.assert_frame_equal(processedData, expectedProcessedData, check_freq=False)
+    assert len(stock_consumer.walkForwardData) == 1
+
+
+def test_screenStocks_walks_forward_over_backtest_durations(stock_consumer):
+    walkingForward = []
+    def screenStockForDuration(*args):
+        backtestDuration = args[18]
+        walkingForward.append(stock_consumer.walkForwardData is not None)
+        return None if backtestDuration == 2 else ({}, {}, None, args[12], backtestDuration)
+
+    with patch.object(stock_consumer, "screenStockForDuration", side_effect=screenStockForDuration):
+        results = stock_consumer.screenStocks("B", "INDIA", 0, None, None, None, None, None, None, None, 1, True, "SBIN", False, False, 2.5, backtestDuration=[3, 2, 1], hostRef=MagicMock())
+        assert [result[4] for result in results] == [3, 1]
+        assert stock_consumer.walkForwardData is None
+        assert stock_consumer.screenStocks("X", "INDIA", 0, None, None, None, None, None, None, None, 1, True, "SBIN", False, False, 2.5, backtestDuration=0, hostRef=MagicMock())[4] == 0
+        assert walkingForward == [True, True, True, False]
+
+
+def test_walkForwardItems():
+    def item(stock, backtestDuration):
+        return ("B", "INDIA", 0, None, None, None, None, None, None, None, 2, True, stock, False, False, 2.5, False, None, backtestDuration, 30, 0, True, None)
+
+    items = [item("SBIN", 3), item("TCS", 3), item("SBIN", 2), item("SBIN", 1), item("TCS", 1)]
+    walkForwardItems = PKScanRunner.walkForwardItems(items)
+    assert walkForwardItems == [item("SBIN", [3, 2, 1]), item("TCS", [3, 1])]
+
+
+def test_screenFusedStocks_runs_piped_scans_only_on_source_results(stock_consumer):
+    def item(executeOption):
+        return ("X", "INDIA", executeOption, None, None, None, None, None, None, None, 2, True, "SBIN", False, False, 2.5, False, None, 0, 30, 0, True, None)
+
+    ran = []
+    def screenStockForDuration(*args, hostRef=None):
+        ran.append(args[2])
+        assert stock_consumer.fusedData is not None
+        return None if args[2] == 2 else ({}, {}, None, args[12], 0)
+
+    scans = [(0, None, item(1)), (1, 0, item(3)), (2, None, item(2)), (3, 2, item(4)), (4, 1, item(5))]
+    with patch.object(stock_consumer, "screenStockForDuration", side_effect=screenStockForDuration):
+        results = stock_consumer.screenStocks("X", "INDIA", scans, None, None, None, None, None, None, None, 1, True, "SBIN", False, False, 2.5, hostRef=MagicMock())
+    assert ran == [1, 3, 2, 5]
+    assert sorted(results.keys()) == [0, 1, 4]
+    assert stock_consumer.fusedData is None
+
+
+def test_fusedSlice_preprocesses_once_per_stock(stock_consumer):
+    configManager = ConfigManager.tools()
+    screener = ScreeningStatistics(configManager, default_logger())
+    close = 100 + np.arange(300.0)
+    data = pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": np.full(300, 1000.0)},
+        index=pd.bdate_range("2023-01-02", periods=300),
+    )
+    expectedFullData, expectedProcessedData = screener.preprocessData(data, daysToLookback=configManager.effectiveDaysToLookback, stock="SBIN")
+    stock_consumer.fusedData = {}
+    with patch.object(screener, "preprocessData", wraps=screener.preprocessData) as preprocessData:
+        for _ in range(3):
+            fullData, processedData = stock_consumer.fusedSlice(screener, configManager, data, "SBIN")
+            pd.testing.assert_frame_equal(fullData, expectedFullData)
+            pd.testing.assert_frame_equal(processedData, expectedProcessedData)
+            # Each scan adds its own columns
+            processedData.insert(len(processedData.columns), "RSIi", np.nan)
+        stock_consumer.fusedSlice(screener, configManager, data.head(299), "SBIN")
+    assert preprocessData.call_count == 2
+
+
+def test_screenStocks_reuses_results_while_the_candle_is_unchanged(stock_consumer):
+    close = 100 + np.arange(30.0)
+    data = pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": np.full(30, 1000.0)},
+        index=pd.bdate_range("2023-01-02", periods=30),
+    )
+    hostRef = MagicMock()
+    hostRef.configManager = ConfigManager.tools()
+    hostRef.objectDictionaryPrimary = {"SBIN": data.to_dict("split")}
+    hostRef.processingCounter.value = 0
+    hostRef.processingResultsCounter.value = 0
+    def screenStockForDuration(*args):
+        return ({"Stock": args[12]}, {"Stock": args[12]}, data, args[12], 0) if args[2] == 2 else None
+
+    def screenStocks(executeOption):
+        return stock_consumer.screenStocks("X", "INDIA", executeOption, None, None, None, None, None, None, None, 1, True, "SBIN", False, False, 2.5, hostRef=hostRef)
+
+    with patch.object(stock_consumer, "screenStockForDuration", side_effect=screenStockForDuration) as screened:
+        for executeOption in [2, 3, 2, 3, 29, 29]:
+            screenStocks(executeOption)
+        assert screened.call_count == 4
+        assert screenStocks(2)[3] == "SBIN" and screenStocks(3) is None
+        assert screened.call_count == 4
+        assert hostRef.processingCounter.value == 4 and hostRef.processingResultsCounter.value == 2
+        data.iloc[-1, data.columns.get_loc("Close")] += 1
+        hostRef.objectDictionaryPrimary = {"SBIN": data.to_dict("split")}
+        screenStocks(2)
+        assert screened.call_count == 5
@@ -31,7 +31,7 @@ import pandas as pd
 import pytest
 
 from pkscreener.classes import Utility
-from pkscreener.classes.Backtest import backtest, backtestSummary
+from pkscreener.classes.Backtest import backtest, backtestStatistics, backtestSummary
 
 @pytest.fixture
 def sample_data():
@@ -368,3 +368,28 @@ def test_backtestSummary_2row_summary():
 
     assert isinstance(result, pd.DataFrame)
     assert len(result) == 2
+
+def test_backtestStatistics_numeric_returns():
+    df = pd.DataFrame({
+        "Stock": ["AAPL", "AAPL", "AAPL", "TCS"],
+        "Date": ["1", "2", "3", "1"],
+        "1-Pd": [2.0, -1.0, 4.0, float("nan")],
+        "2-Pd": [-3.0, 1.0, 0.0, 5.0],
+    })
+    stats = backtestStatistics(df)
+    assert stats.loc[("AAPL", "1-Pd"), "Count"] == 3
+    assert stats.loc[("AAPL", "1-Pd"), "Wins"] == 2
+    assert stats.loc[("AAPL", "1-Pd"), "Median"] == 2.0
+    assert stats.loc[("AAPL", "2-Pd"), "MaxDrawdown"] == -3.0
+    assert stats.loc[("AAPL", "Overall"), "Count"] == 6
+    assert stats.loc[("SUMMARY", "2-Pd"), "Mean"] == 0.75
+    assert stats.loc[("SUMMARY", "Overall"), "WinRate"] == pytest.approx(5 * 100 / 7)
+    sellStats = backtestStatistics(df, sellSignal=True)
+    assert sellStats.loc[("AAPL", "1-Pd"), "Wins"] == 1
+    assert sellStats.loc[("AAPL", "1-Pd"), "MaxDrawdown"] == -4.0
+
+    summary_df = backtestSummary(df)
+    assert summary_df["Stock"].tolist() == ["AAPL", "TCS", "SUMMARY"]
+    assert summary_df.columns.tolist() == ["Stock", "1-Pd", "2-Pd", "Overall"]
+    assert summary_df["1-Pd"].tolist()[1] == "-"
+    assert summary_df["2-Pd"].tolist()[2] == f"{Utility.tools.formattedBacktestOutput(75)} of (4)"